@@ -0,0 +1,344 @@
+"""
+Streaming analyzer for the booking logs.
+
+Reads ``logs/booking_*.log`` files line by line (plain or gzip-compressed,
+JSON lines or the older text format), rebuilds each booking from its
+booking_id (or each bulk plan from its batch id) and reports save latency
+percentiles, retry distribution, error código breakdown and failure rates per
+supplier, with bulk plans also counted on their own:
+
+    python analyze_logs.py
+    python analyze_logs.py logs/booking_2025*.log.gz --supplier ACME --json
+"""
+import argparse
+import glob
+import gzip
+import json
+import math
+import os
+import re
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
+
+DEFAULT_PATTERN = os.path.join("logs", "booking_*.log*")
+
+# Bookings still open at the end of the stream are reported as incomplete;
+# beyond this many open bookings the oldest are closed early to bound memory
+MAX_OPEN_BOOKINGS = 10000
+
+# "2025-07-14 19:39:00,123 - INFO - SAVE_START: ..." (current console format)
+_TEXT_LINE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})[,.]?\d* - \w+ - (?:\[[^\]]+\] )?([A-Z_]+): (.*)$")
+# "... [2025-07-14 19:39:00] SAVE_START: ..." (original log_booking_attempt format)
+_BRACKET_LINE = re.compile(r"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] ([A-Z_]+): (.*)$")
+_SUPPLIER_FROM_ID = re.compile(r"^(.*)_(\d{4}-\d{2}-\d{2})")
+# "<supplier>_bulk_<deliveries>_<YYYYmmddHHMMSS>" (save_bookings_batch)
+_SUPPLIER_FROM_BATCH_ID = re.compile(r"^(.*)_bulk_\d+_\d{14}$")
+_BULK_DELIVERIES = re.compile(r", (\d+) deliveries$")
+
+# Actions that open a trace: one booking, or one bulk plan saved with a single write
+_START_ACTIONS = {"SAVE_START", "BULK_SAVE_START"}
+
+# Where each action carries the booking id in its details (text logs only)
+_ID_IN_DETAILS = {
+    "SAVE_START": re.compile(r"^Booking ID: (.*)$"),
+    "BULK_SAVE_START": re.compile(r"^Booking ID: (.*), \d+ deliveries$"),
+    "SAVE_ATTEMPT": re.compile(r"^Attempt (\d+)/\d+ for (.*)$"),
+    "APPEND_REQUESTED": re.compile(r"^Updated rows? [\d-]+ for (.*)$"),
+    "BOOKING_SAVE_SUCCESS": re.compile(r"^(.*) successfully saved and verified$"),
+    "SAVE_COMPLETE": re.compile(r"^(.*) successfully saved and verified$"),
+    "BOOKING_VERIFICATION_FAILED": re.compile(r"^(.*?)(?: save failed - content not found|: \d+ rows not found$)"),
+    "BULK_SAVE_PARTIAL": re.compile(r"^(.*): \d+ of \d+ saved and verified$"),
+    "SLOT_AVAILABLE": re.compile(r"^Slot confirmed available for (.*?)(?: on dock \d+)?$"),
+}
+_ID_IS_DETAILS = {"SLOT_TAKEN", "DATA_LOAD_FAILED", "SHEETS_CONNECTION_FAILED", "INITIAL_COUNT_FAILED",
+                  "SAVE_ATTEMPT_ERROR", "SAVE_FAILED_FINAL", "SAVE_EXCEPTION", "BULK_PLAN_REJECTED"}
+
+# Terminal actions -> outcome ("saved", "conflict", "partial" or an error código)
+_FINAL_OUTCOMES = {
+    "SAVE_COMPLETE": "saved",
+    "SLOT_TAKEN": "conflict",
+    "BULK_PLAN_REJECTED": "conflict",
+    "BULK_SAVE_PARTIAL": "partial",
+    "DATA_LOAD_FAILED": "1",
+    "SHEETS_CONNECTION_FAILED": "1",
+    "INITIAL_COUNT_FAILED": "2",
+    "SAVE_EXCEPTION": "2",
+}
+
+
+class StreamingHistogram:
+    """Log-scale histogram (about 2% relative error) for percentiles in constant memory"""
+
+    def __init__(self, growth=1.02, min_value=0.001):
+        self.log_growth = math.log(growth)
+        self.min_value = min_value
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, value):
+        value = max(value, self.min_value)
+        self.buckets[int(math.log(value / self.min_value) / self.log_growth)] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.min_value * math.exp((index + 0.5) * self.log_growth), self.maximum)
+        return self.maximum
+
+
+# Outcomes that are not an error código
+_NOT_ERRORS = ("saved", "conflict", "partial")
+
+
+class BookingTrace:
+    __slots__ = ("supplier", "started", "attempts", "verify_misses", "deliveries")
+
+    def __init__(self, supplier, started, deliveries=None):
+        self.supplier = supplier
+        self.started = started
+        self.attempts = 0
+        self.verify_misses = 0
+        self.deliveries = deliveries  # None for a single booking, else the bulk plan's size
+
+
+class LogAnalyzer:
+    """Consumes log events one at a time and keeps only aggregates plus open bookings"""
+
+    def __init__(self, supplier_filter=None):
+        self.supplier_filter = supplier_filter
+        self.open = OrderedDict()
+        self.latency = StreamingHistogram()
+        self.retries = Counter()
+        self.outcomes = Counter()
+        self.per_supplier = defaultdict(Counter)
+        self.bulk_outcomes = Counter()
+        self.bulk_deliveries = 0
+        self.lines = 0
+        self.unparsed = 0
+        self.incomplete = 0
+
+    def feed_line(self, line):
+        self.lines += 1
+        event = parse_line(line)
+        if event is None:
+            self.unparsed += 1
+            return
+        self.feed_event(*event)
+
+    def feed_event(self, timestamp, action, details, error, booking_id, supplier):
+        if booking_id is None:
+            booking_id = booking_id_from_details(action, details)
+        if booking_id is None:
+            return
+        supplier = supplier or supplier_from_booking_id(booking_id)
+        if self.supplier_filter and supplier != self.supplier_filter:
+            return
+
+        if action in _START_ACTIONS:
+            deliveries = None
+            if action == "BULK_SAVE_START":
+                match = _BULK_DELIVERIES.search(details)
+                deliveries = int(match.group(1)) if match else 0
+            self.open[booking_id] = BookingTrace(supplier, timestamp, deliveries)
+            if len(self.open) > MAX_OPEN_BOOKINGS:
+                self.open.popitem(last=False)
+                self.incomplete += 1
+            return
+
+        trace = self.open.get(booking_id)
+        if trace is None:
+            return
+        if action == "SAVE_ATTEMPT":
+            trace.attempts += 1
+        elif action == "BOOKING_VERIFICATION_FAILED":
+            trace.verify_misses += 1
+
+        if action == "SAVE_FAILED_FINAL":
+            outcome = "4" if "BOOKING_VERIFICATION_FAILED" in (error or "") else "2"
+        else:
+            outcome = _FINAL_OUTCOMES.get(action)
+        if outcome is not None:
+            self._close(booking_id, trace, timestamp, outcome)
+
+    def _close(self, booking_id, trace, finished, outcome):
+        del self.open[booking_id]
+        self.outcomes[outcome] += 1
+        self.per_supplier[trace.supplier][outcome] += 1
+        if trace.attempts:
+            self.retries[trace.attempts - 1] += 1
+        if trace.deliveries is not None:
+            self.bulk_outcomes[outcome] += 1
+            self.bulk_deliveries += trace.deliveries
+        if outcome == "saved" and trace.started and finished:
+            self.latency.add((finished - trace.started).total_seconds())
+
+    def report(self):
+        total = sum(self.outcomes.values())
+        error_codes = {code: count for code, count in self.outcomes.items() if code not in _NOT_ERRORS}
+        suppliers = {}
+        for supplier, outcomes in self.per_supplier.items():
+            supplier_total = sum(outcomes.values())
+            failed = sum(count for code, count in outcomes.items() if code not in _NOT_ERRORS)
+            suppliers[supplier] = {
+                "bookings": supplier_total,
+                "saved": outcomes["saved"],
+                "conflicts": outcomes["conflict"],
+                "partial": outcomes["partial"],
+                "failed": failed,
+                "failure_rate": round(failed / supplier_total, 3) if supplier_total else 0.0,
+            }
+        return {
+            "lines_read": self.lines,
+            "unparsed_lines": self.unparsed,
+            "bookings": total,
+            "saved": self.outcomes["saved"],
+            "conflicts": self.outcomes["conflict"],
+            "partial": self.outcomes["partial"],
+            "incomplete": self.incomplete + len(self.open),
+            "bulk_plans": {
+                "plans": sum(self.bulk_outcomes.values()),
+                "deliveries": self.bulk_deliveries,
+                "saved": self.bulk_outcomes["saved"],
+                "partial": self.bulk_outcomes["partial"],
+                "conflicts": self.bulk_outcomes["conflict"],
+                "failed": sum(count for code, count in self.bulk_outcomes.items() if code not in _NOT_ERRORS),
+            },
+            "save_latency_seconds": {
+                f"p{p}": _round(self.latency.percentile(p)) for p in (50, 90, 95, 99)
+            } | {"max": _round(self.latency.maximum if self.latency.count else None),
+                 "mean": _round(self.latency.total / self.latency.count if self.latency.count else None)},
+            "retry_distribution": {str(retries): count for retries, count in sorted(self.retries.items())},
+            "error_codes": dict(sorted(error_codes.items())),
+            "suppliers": dict(sorted(suppliers.items(), key=lambda item: -item[1]["failure_rate"])),
+        }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def _parse_timestamp(text):
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_line(line):
+    """(timestamp, action, details, error, booking_id, supplier) or None"""
+    line = line.strip()
+    if not line:
+        return None
+
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if "action" not in record:
+            return None
+        return (_parse_timestamp(record.get("ts", "")), record["action"], str(record.get("details", "")),
+                record.get("error"), record.get("booking_id"), record.get("supplier"))
+
+    match = _TEXT_LINE.search(line) or _BRACKET_LINE.search(line)
+    if not match:
+        return None
+    timestamp, action, rest = match.groups()
+    error = None
+    if " | Error: " in rest:
+        rest, error = rest.split(" | Error: ", 1)
+    rest = rest.split(" | Success: ", 1)[0]
+    return _parse_timestamp(timestamp), action, rest, error, None, None
+
+
+def booking_id_from_details(action, details):
+    if action in _ID_IS_DETAILS:
+        return details.strip() or None
+    pattern = _ID_IN_DETAILS.get(action)
+    if pattern is None:
+        return None
+    match = pattern.match(details)
+    return match.group(match.lastindex) if match else None
+
+
+def supplier_from_booking_id(booking_id):
+    match = _SUPPLIER_FROM_BATCH_ID.match(booking_id) or _SUPPLIER_FROM_ID.match(booking_id)
+    return match.group(1) if match else booking_id
+
+
+def iter_lines(paths):
+    """Yield lines from each file in order without loading any file in memory"""
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            yield from f
+
+
+def resolve_paths(patterns):
+    paths = set()
+    for pattern in patterns:
+        paths.update(glob.glob(pattern))
+    # Oldest first so bookings that span a rotation are reconstructed in order
+    return sorted(paths, key=lambda path: (os.path.getmtime(path), path))
+
+
+def print_report(report):
+    print(f"Lines read: {report['lines_read']} (unparsed: {report['unparsed_lines']})")
+    print(f"Bookings: {report['bookings']}  saved: {report['saved']}  "
+          f"conflicts: {report['conflicts']}  partial: {report['partial']}  incomplete: {report['incomplete']}")
+    bulk = report["bulk_plans"]
+    print(f"  of which bulk plans: {bulk['plans']} ({bulk['deliveries']} deliveries)  saved: {bulk['saved']}  "
+          f"partial: {bulk['partial']}  conflicts: {bulk['conflicts']}  failed: {bulk['failed']}")
+    print()
+    print("Save latency (s): " + ", ".join(f"{k}={v}" for k, v in report["save_latency_seconds"].items()))
+    print()
+    print("Retries per booking:")
+    for retries, count in report["retry_distribution"].items():
+        print(f"  {retries:>2} retries: {count}")
+    print()
+    print("Error códigos:")
+    for code, count in report["error_codes"].items() or [("-", 0)]:
+        print(f"  Error código {code}: {count}")
+    print()
+    print("Suppliers by failure rate:")
+    for supplier, stats in list(report["suppliers"].items())[:20]:
+        print(f"  {supplier:<30} {stats['failed']:>4}/{stats['bookings']:<4} failed "
+              f"({stats['failure_rate']:.1%}), conflicts: {stats['conflicts']}, partial: {stats['partial']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze booking logs")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_PATTERN], help="Log files or glob patterns")
+    parser.add_argument("--supplier", help="Only report bookings of this supplier")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    paths = resolve_paths(args.paths)
+    if not paths:
+        parser.error(f"No log files match: {' '.join(args.paths)}")
+
+    analyzer = LogAnalyzer(supplier_filter=args.supplier)
+    for line in iter_lines(paths):
+        analyzer.feed_line(line)
+
+    report = analyzer.report()
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Headless JSON API for availability and booking, alongside the Streamlit UI.
+
+Serves the ERP with the same cache, slot logic and confirmation pipeline as
+app.py (bookings run on the shared confirmation job pool, so they are
+re-checked, saved, verified and emailed exactly like a booking made in the UI):
+
+    GET  /health
+    GET  /availability?date=2025-07-14&bultos=5
+    POST /bookings        {"date": "2025-07-14", "slot": "9:20", "numero_bultos": 5, "orders": ["OC-1"]}
+    GET  /bookings/<job_id>
+
+Every call except /health authenticates with HTTP Basic using the supplier's
+usuario and password from proveedor_credencial. Requests are parsed on an
+asyncio server and the blocking work runs on a bounded thread pool; when more
+than --max-pending requests are in flight the server answers 503.
+
+    python api_server.py --port 8600
+    python api_server.py --fake    # in-memory spreadsheet, Proveedor_000 / secret
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+MAX_BODY_BYTES = 64 * 1024
+READ_TIMEOUT_SECONDS = 30
+
+REASONS = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 422: "Unprocessable Entity",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class ApiError(Exception):
+    """Error answered to the client as {"error": message} with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").date()
+    except ValueError:
+        raise ApiError(400, "date must be YYYY-MM-DD")
+
+
+def parse_bultos(value):
+    try:
+        numero_bultos = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, "numero_bultos must be an integer")
+    if numero_bultos <= 0:
+        raise ApiError(422, "numero_bultos must be positive")
+    return numero_bultos
+
+
+class BookingApi:
+    """Route handlers; each runs on the worker pool and returns (status, payload)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def authenticate(self, headers):
+        """Supplier record for the request's HTTP Basic credentials"""
+        scheme, _, encoded = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "basic":
+            raise ApiError(401, "HTTP Basic authentication required")
+        try:
+            usuario, _, password = base64.b64decode(encoded).decode("utf-8").partition(":")
+        except (binascii.Error, UnicodeDecodeError):
+            raise ApiError(401, "Malformed credentials")
+        authenticated, message, email, cc_emails = self.app.authenticate_user(usuario, password)
+        if not authenticated:
+            raise ApiError(401, message)
+        return SimpleNamespace(name=usuario.strip(), email=email, cc_emails=cc_emails)
+
+    def load_reservas(self):
+        _, reservas_df, _ = self.app.download_sheets_to_memory()
+        if reservas_df is None:
+            raise ApiError(503, "Reservations could not be loaded, try again in a few minutes")
+        return reservas_df
+
+    def availability(self, supplier, query):
+        selected_date = parse_date(query.get("date", ""))
+        numero_bultos = parse_bultos(query.get("bultos"))
+        today = datetime.now().date()
+        if not (today <= selected_date <= today + timedelta(days=30)):
+            raise ApiError(422, "date must be within the next 30 days")
+
+        slots_needed = self.app.get_slots_needed(numero_bultos)
+        display_slots = self.app.get_display_slots(self.load_reservas(), selected_date, numero_bultos)
+        return 200, {
+            "date": selected_date.isoformat(),
+            "numero_bultos": numero_bultos,
+            "duration_minutes": slots_needed * 20,
+            "slots": [{"slot": slot, "available": available} for slot, available in display_slots],
+        }
+
+    def create_booking(self, supplier, body):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise ApiError(400, "Body must be JSON")
+        if not isinstance(request, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        orders = request.get("orders") or []
+        if isinstance(orders, str):
+            orders = [orders]
+        item = {
+            "date": parse_date(request.get("date", "")),
+            "slot": str(request.get("slot", "")).strip(),
+            "numero_bultos": parse_bultos(request.get("numero_bultos")),
+            "orders": [str(order).strip() for order in orders if str(order).strip()],
+        }
+
+        # Early rejection against the cached snapshot; the job re-checks with fresh data
+        [(_, error)] = self.app.validate_booking_plan([item], self.load_reservas(), supplier.name)
+        if error:
+            raise ApiError(409 if error == "Horario ocupado" else 422, error)
+
+        job = self.app.ConfirmationJob(supplier.name, summary=[f"API {item['date']} {item['slot']}"])
+        self.app.get_confirmation_jobs().submit(
+            job,
+            self.app.enhanced_confirmation_process,
+            item["date"],
+            item["slot"],
+            item["numero_bultos"],
+            item["orders"],
+            supplier.name,
+            supplier.email,
+            supplier.cc_emails
+        )
+        return 202, {"job_id": job.id, "state": job.state, "status_url": f"/bookings/{job.id}"}
+
+    def booking_status(self, supplier, job_id):
+        job = self.app.get_confirmation_jobs().get(job_id)
+        if job is None or job.supplier_name != supplier.name:
+            raise ApiError(404, "Unknown booking job")
+        view = job.view()
+        return 200, {
+            "job_id": job.id,
+            "state": view["state"],
+            "steps": view["steps"],
+            "messages": [{"kind": kind, "text": text} for kind, text in view["messages"]],
+            "suggestions": [
+                {"date": day.isoformat(), "slot": slot}
+                for day, slot in (job.suggestions["options"] if job.done and job.suggestions else [])
+            ],
+        }
+
+    def handle(self, method, path, query, headers, body):
+        """Authenticate and dispatch one request (blocking; runs on the pool)"""
+        parts = [part for part in path.split("/") if part]
+        if parts == ["availability"]:
+            route, allowed = "availability", "GET"
+        elif parts == ["bookings"]:
+            route, allowed = "create_booking", "POST"
+        elif len(parts) == 2 and parts[0] == "bookings":
+            route, allowed = "booking_status", "GET"
+        else:
+            raise ApiError(404, "Not found")
+        if method != allowed:
+            raise ApiError(405, f"Use {allowed}")
+
+        with self.app.timed_stage(f"api.{route}"):
+            supplier = self.authenticate(headers)
+            if route == "availability":
+                return self.availability(supplier, query)
+            if route == "create_booking":
+                return self.create_booking(supplier, body)
+            return self.booking_status(supplier, parts[1])
+
+
+class ApiServer:
+    """asyncio HTTP/1.1 front end (one request per connection) over a bounded worker pool"""
+
+    def __init__(self, api, workers, max_pending):
+        self.api = api
+        self.max_pending = max_pending
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dismac-api")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            status, payload = await asyncio.wait_for(self.read_and_dispatch(reader), READ_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            status, payload = 400, {"error": "Request timed out"}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            "Connection: close",
+        ]
+        if status == 401:
+            head.append('WWW-Authenticate: Basic realm="dismac"')
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def read_and_dispatch(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            return 400, {"error": "Malformed request line"}
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return 400, {"error": "Invalid Content-Length"}
+        if length > MAX_BODY_BYTES:
+            return 413, {"error": f"Body larger than {MAX_BODY_BYTES} bytes"}
+        body = await reader.readexactly(length) if length else b""
+
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok", "pending": self.pending}
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return await self.dispatch(method.upper(), url.path, query, headers, body)
+
+    async def dispatch(self, method, path, query, headers, body):
+        if self.pending >= self.max_pending:
+            self.api.app.count_event("api_rejected_busy")
+            return 503, {"error": "Server busy, retry shortly"}
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.api.handle, method, path, query, headers, body)
+        except ApiError as e:
+            return e.status, {"error": e.message}
+        except Exception as e:
+            self.api.app.log_booking_attempt("API_ERROR", f"{method} {path}", success=False, error=str(e))
+            return 500, {"error": "Internal error"}
+        finally:
+            self.pending -= 1
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        self.api.app.log_booking_attempt("API_SERVER_STARTED", f"http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def load_app(fake):
+    """Import app.py headless (settings are read at import time), optionally on the fake spreadsheet"""
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    if not fake:
+        import app
+        return app
+
+    import load_test
+    os.environ.update({key: value for key, value in load_test.IMPORT_ENV.items() if key not in os.environ})
+    os.environ.setdefault("LOG_DIR", "")
+    import app
+    app.use_sheets_client(load_test.build_fake(SimpleNamespace(sessions=3, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=1)))
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless JSON API for availability and booking")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", 8600)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", 4)),
+                        help="Threads running the blocking Sheets work")
+    parser.add_argument("--max-pending", type=int, default=int(os.getenv("API_MAX_PENDING", 32)),
+                        help="Requests in flight before answering 503")
+    parser.add_argument("--fake", action="store_true",
+                        help="Serve an in-memory spreadsheet (suppliers Proveedor_000-002, password 'secret')")
+    args = parser.parse_args()
+
+    app = load_app(args.fake)
+    app.start_prewarm()
+    app.start_metrics_server()
+    app.start_email_digest_scheduler()
+    server = ApiServer(BookingApi(app), args.workers, args.max_pending)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
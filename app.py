@@ -1,22 +1,50 @@
+import time
+
+_SCRIPT_START = time.perf_counter()
+
 import streamlit as st
-import gspread
-import pandas as pd
-from google.oauth2.service_account import Credentials
-from datetime import datetime, timedelta, time
-import requests
-import io
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from string import Template
+import bisect
+import functools
+import hashlib
+import heapq
+import hmac
+import importlib
+import json
 import os
-from googleapiclient.discovery import build
-
-import time
+import random
+import re
+import sys
+import threading
+import uuid
 import logging
 
-import time
-import logging
+from booking_logging import booking_context, dropped_record_count, setup_booking_logging
+
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+class _LazyModule:
+    """Module proxy that defers the real import until the first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# Heavy dependencies are only needed once data is loaded or a mail is sent,
+# so they are imported on first use instead of on every cold start
+gspread = _LazyModule("gspread")
+pd = _LazyModule("pandas")
+requests = _LazyModule("requests")
 
 st.set_page_config(page_title="Dismac: Reserva de Entrega de Mercadería", layout="wide")
 
@@ -32,13 +60,234 @@ except KeyError as e:
     st.error(f"🔒 Falta configuración: {e}")
     st.stop()
 
+def get_setting(name, default=None):
+    """Read an optional setting from the environment first, then from Streamlit secrets"""
+    value = os.getenv(name)
+    if value is not None:
+        return value
+    try:
+        return st.secrets.get(name, default)
+    except Exception:
+        # No secrets.toml available (e.g. command-line tools importing this module)
+        return default
+
+# Google Sheets API budget (Sheets read quota is per minute per service account)
+SHEETS_REQUESTS_PER_MINUTE = int(get_setting("SHEETS_REQUESTS_PER_MINUTE", 60))
+SHEETS_BOOKING_RESERVE = int(get_setting("SHEETS_BOOKING_RESERVE", 10))
+# Pause between writing a booking and reading it back for verification
+SHEETS_PROCESSING_WAIT_SECONDS = float(get_setting("SHEETS_PROCESSING_WAIT_SECONDS", 5))
+# A snapshot whose spreadsheet revision is unchanged is still re-downloaded after this long
+SNAPSHOT_MAX_AGE_SECONDS = float(get_setting("SNAPSHOT_MAX_AGE_SECONDS", 600))
+# ...and after this long for the final availability check and the save, which must see other writes
+FRESH_SNAPSHOT_MAX_AGE_SECONDS = float(get_setting("FRESH_SNAPSHOT_MAX_AGE_SECONDS", 10))
+
+# Logging: JSON lines under LOG_DIR (empty = console only), rotated by size and age
+logger = setup_booking_logging(
+    log_dir=get_setting("LOG_DIR", "logs") or None,
+    max_bytes=int(get_setting("LOG_MAX_MB", 10)) * 1024 * 1024,
+    max_age_seconds=int(get_setting("LOG_MAX_AGE_HOURS", 24)) * 3600,
+    backup_count=int(get_setting("LOG_BACKUP_COUNT", 30)),
+)
+
+# Receiving docks: each 20-minute slot can hold one delivery per dock
+NUM_DOCKS = max(1, int(get_setting("NUM_DOCKS", 1)))
+ALL_DOCKS_MASK = (1 << NUM_DOCKS) - 1
+# Single-dock installs keep the original A-E layout; the 'Anden' column F is written only with several docks
+RESERVAS_WRITE_COLUMNS = 6 if NUM_DOCKS > 1 else 5
+RESERVAS_LAST_COLUMN = "ABCDEF"[RESERVAS_WRITE_COLUMNS - 1]
+
+# Local metrics endpoint for dashboards (disabled unless a port is configured)
+METRICS_HOST = get_setting("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(get_setting("METRICS_PORT", 0))
+
+# On-demand profiling: open the app with ?profile=<PROFILE_TOKEN> (admins only)
+PROFILE_TOKEN = get_setting("PROFILE_TOKEN")
+PROFILE_DIR = get_setting("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(get_setting("PROFILE_SAMPLE_RATE", 1.0))
+PROFILE_INTERVAL_MS = float(get_setting("PROFILE_INTERVAL_MS", 5))
+
+# Usuarios (comma-separated) that also see the KPI dashboard
+ADMIN_USERS = {user.strip() for user in str(get_setting("ADMIN_USERS", "")).split(",") if user.strip()}
+
+# Warehouse check-in: usuarios of the dock staff, local spool of unsynced events, flush period
+STAFF_USERS = {user.strip() for user in str(get_setting("STAFF_USERS", "")).split(",") if user.strip()}
+GESTION_SPOOL_PATH = get_setting("GESTION_SPOOL_PATH", "gestion_pending.jsonl")
+GESTION_FLUSH_SECONDS = float(get_setting("GESTION_FLUSH_SECONDS", 60))
+
+# Internal recipients of every booking: a copy of each confirmation ('immediate') or one
+# summary per day at EMAIL_DIGEST_TIME ('digest'), queued in a local file until sent
+INTERNAL_EMAILS = [email.strip() for email in str(get_setting("INTERNAL_EMAILS", "ljbyon@dismac.com.bo,marketplace@dismac.com.bo")).split(",") if email.strip()]
+INTERNAL_EMAIL_MODE = str(get_setting("INTERNAL_EMAIL_MODE", "immediate")).strip().lower()
+EMAIL_DIGEST_TIME = datetime.strptime(str(get_setting("EMAIL_DIGEST_TIME", "18:30")).strip(), "%H:%M").time()
+EMAIL_DIGEST_PATH = get_setting("EMAIL_DIGEST_PATH", "email_digest_pending.jsonl")
+
+# Hora cells are written as comma-joined slots (legacy) or 'H:MM+minutes' (compact); both are read.
+# Switch to compact only after the migration has run (see migrate_hora.py)
+HORA_FORMAT = str(get_setting("HORA_FORMAT", "legacy")).strip().lower()
+
+# Availability of neighbouring dates is computed ahead on a small pool into an LRU of date grids
+PREFETCH_WORKERS = int(get_setting("PREFETCH_WORKERS", 2))
+PREFETCH_CACHE_SIZE = int(get_setting("PREFETCH_CACHE_SIZE", 128))
+
+# Booking confirmations run on a background pool; sessions poll their job
+CONFIRMATION_WORKERS = int(get_setting("CONFIRMATION_WORKERS", 4))
+CONFIRMATION_POLL_SECONDS = float(get_setting("CONFIRMATION_POLL_SECONDS", 1))
+CONFIRMATION_JOB_TTL_SECONDS = int(get_setting("CONFIRMATION_JOB_TTL_SECONDS", 3600))
+
 # ─────────────────────────────────────────────────────────────
 # 2. Google Sheets Functions - MIGRATED FROM SHAREPOINT
 # ─────────────────────────────────────────────────────────────
+PRIORITY_BOOKING = "booking"        # availability re-checks, saves and verification
+PRIORITY_BACKGROUND = "background"  # cache refreshes while browsing
+
+_sheets_priority = ContextVar("sheets_priority", default=PRIORITY_BACKGROUND)
+
+
+class SheetsQuotaExceeded(Exception):
+    """Raised when a Sheets call cannot get a token from the budget in time"""
+
+
+class SheetsQuotaManager:
+    """Token-bucket budget and per-operation accounting for Google Sheets API calls.
+
+    Background reads may not spend the last ``booking_reserve`` tokens and yield
+    to any booking call that is waiting, so booking writes keep working at peak.
+    """
+
+    def __init__(self, requests_per_minute, booking_reserve):
+        self.capacity = float(requests_per_minute)
+        self.refill_per_second = requests_per_minute / 60.0
+        self.booking_reserve = max(0, min(booking_reserve, requests_per_minute - 1))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.booking_waiting = 0
+        self.calls = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.wait_seconds = defaultdict(float)
+        self.errors = defaultdict(int)
+        self.quota_errors = defaultdict(int)
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def acquire(self, operation, priority=PRIORITY_BACKGROUND, timeout=60):
+        """Block until the call may proceed; raises SheetsQuotaExceeded after timeout"""
+        is_booking = priority == PRIORITY_BOOKING
+        floor = 0 if is_booking else self.booking_reserve
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._condition:
+            if is_booking:
+                self.booking_waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    if self.tokens >= floor + 1 and (is_booking or self.booking_waiting == 0):
+                        self.tokens -= 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.throttled[operation] += 1
+                        raise SheetsQuotaExceeded(f"No Sheets quota for {operation} after {timeout}s")
+                    refill_wait = (floor + 1 - self.tokens) / self.refill_per_second
+                    self._condition.wait(min(remaining, max(refill_wait, 0.05)))
+            finally:
+                if is_booking:
+                    self.booking_waiting -= 1
+                    self._condition.notify_all()
+
+            self.calls[operation] += 1
+            waited = time.monotonic() - started
+            if waited > 0.01:
+                self.throttled[operation] += 1
+                self.wait_seconds[operation] += waited
+
+    def record_error(self, operation, error):
+        with self._condition:
+            self.errors[operation] += 1
+            if getattr(error, "code", None) == 429:
+                self.quota_errors[operation] += 1
+
+    def snapshot(self):
+        """Counters per operation plus the current budget state"""
+        with self._condition:
+            self._refill()
+            operations = sorted(set(self.calls) | set(self.errors) | set(self.throttled))
+            return {
+                "budget_per_minute": int(self.capacity),
+                "booking_reserve": self.booking_reserve,
+                "tokens_available": round(self.tokens, 1),
+                "total_calls": sum(self.calls.values()),
+                "operations": {
+                    op: {
+                        "calls": self.calls[op],
+                        "errors": self.errors[op],
+                        "quota_errors": self.quota_errors[op],
+                        "throttled": self.throttled[op],
+                        "wait_seconds": round(self.wait_seconds[op], 2),
+                    }
+                    for op in operations
+                },
+            }
+
+@st.cache_resource(show_spinner=False)
+def get_sheets_quota():
+    """Single quota manager shared by every session of this server process"""
+    return SheetsQuotaManager(SHEETS_REQUESTS_PER_MINUTE, SHEETS_BOOKING_RESERVE)
+
+@contextmanager
+def booking_priority():
+    """Mark the Sheets calls made inside this block as booking-critical"""
+    token = _sheets_priority.set(PRIORITY_BOOKING)
+    try:
+        yield
+    finally:
+        _sheets_priority.reset(token)
+
+def log_sheets_quota_usage():
+    """Log the Sheets call counters so quota-heavy paths show up in the server logs"""
+    usage = get_sheets_quota().snapshot()
+    top_operations = sorted(usage["operations"].items(), key=lambda item: item[1]["calls"], reverse=True)[:5]
+    summary = ", ".join(f"{op}={stats['calls']}" for op, stats in top_operations)
+    log_booking_attempt(
+        "SHEETS_QUOTA",
+        f"Total calls: {usage['total_calls']}, tokens left: {usage['tokens_available']}/{usage['budget_per_minute']}, top: {summary}"
+    )
+
+# gspread methods that modify the spreadsheet
+_SHEETS_WRITE_METHODS = {"update", "batch_update", "append_row", "append_rows", "add_worksheet"}
+
+def sheets_call(operation, func, *args, **kwargs):
+    """Run one Google Sheets API call through the shared quota budget"""
+    quota = get_sheets_quota()
+    quota.acquire(operation, _sheets_priority.get())
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        quota.record_error(operation, e)
+        raise
+    finally:
+        if getattr(func, "__name__", "") in _SHEETS_WRITE_METHODS:
+            get_sheet_snapshots().note_write()
+
+def open_spreadsheet(gc, operation="open_spreadsheet"):
+    """Open the booking spreadsheet by name (one Drive lookup)"""
+    return sheets_call(operation, gc.open, get_setting("GOOGLE_SHEET_NAME") or st.secrets["GOOGLE_SHEET_NAME"])
+
+def get_worksheet(spreadsheet, title, operation):
+    """Look up a worksheet by title (one metadata fetch)"""
+    return sheets_call(operation, spreadsheet.worksheet, title)
+
 @st.cache_resource
 def setup_google_sheets():
     """Configurar conexión a Google Sheets"""
     try:
+        from google.oauth2.service_account import Credentials
+
         credentials_info = dict(st.secrets["google_service_account"])
         scopes = [
             "https://www.googleapis.com/auth/spreadsheets",
@@ -51,113 +300,413 @@ def setup_google_sheets():
         st.error(f"❌ Error conectando: {str(e)}")
         return None
 
-@st.cache_data(ttl=60, show_spinner=False)  # Reduced TTL for real-time booking
-def download_sheets_to_memory():
-    """Download all sheets from Google Sheets - REPLACES SharePoint Excel download"""
-    try:
-        gc = setup_google_sheets()
-        if not gc:
-            return None, None, None
-        
-        spreadsheet = gc.open(st.secrets["GOOGLE_SHEET_NAME"])
-        
-        # Load credentials sheet
+# Stand-in client installed by tools (e.g. sheets_fake.FakeSheetsClient in load_test.py)
+_sheets_client_override = None
+
+def use_sheets_client(client):
+    """Route every Sheets call of this process to ``client`` instead of Google (None = Google)"""
+    global _sheets_client_override
+    _sheets_client_override = client
+
+def get_sheets_client():
+    """The stand-in client when one is installed, otherwise the cached Google connection"""
+    if _sheets_client_override is not None:
+        return _sheets_client_override
+    return setup_google_sheets()
+
+class SheetSnapshotStore:
+    """Last full download of the spreadsheet plus the Drive revision it was taken at.
+
+    A refresh first asks Drive for the spreadsheet's modifiedTime (one light call)
+    and reuses the stored snapshot while it is unchanged, nothing was written by
+    this process since the download started (modifiedTime can lag behind a write)
+    and the snapshot is younger than SNAPSHOT_MAX_AGE_SECONDS (or the ``max_age``
+    of the call).
+    """
+
+    def __init__(self, max_age_seconds):
+        self.max_age_seconds = max_age_seconds
+        self.snapshot = None
+        self.revision = None
+        self.downloaded_at = 0.0
+        self.last_write_at = 0.0
+        self.client = None
+        self.spreadsheet = None
+        self.worksheets = {}
+        self._lock = threading.Lock()
+
+    def note_write(self):
+        self.last_write_at = time.monotonic()
+
+    def worksheet(self, title):
+        """Worksheet handle, looked up once per spreadsheet handle"""
+        if title not in self.worksheets:
+            self.worksheets[title] = get_worksheet(self.spreadsheet, title, "download.worksheet")
+        return self.worksheets[title]
+
+    def load(self, gc, max_age=None):
+        max_age = self.max_age_seconds if max_age is None else max_age
+        with self._lock:
+            started = time.monotonic()
+            if gc is not self.client:
+                self.client, self.spreadsheet, self.worksheets, self.snapshot = gc, None, {}, None
+            try:
+                if self.spreadsheet is None:
+                    self.spreadsheet = open_spreadsheet(gc, "download.open_spreadsheet")
+                revision = self._revision()
+                if (revision is not None and revision == self.revision and self.snapshot is not None
+                        and self.last_write_at < self.downloaded_at
+                        and started - self.downloaded_at < max_age):
+                    count_event("snapshot_reused")
+                    return self.snapshot
+                snapshot = _download_all_sheets(self)
+            except Exception:
+                # Handles may be stale (e.g. a worksheet was recreated): look them up again next time
+                self.spreadsheet, self.worksheets = None, {}
+                raise
+            # Derived caches key on this instead of hashing the frames on every rerun
+            download_id = uuid.uuid4().hex
+            for title, df in zip(("credenciales", "reservas", "gestion"), snapshot):
+                df.attrs[SNAPSHOT_KEY_ATTR] = (download_id, title)
+            self.snapshot, self.revision, self.downloaded_at = snapshot, revision, started
+            count_event("snapshot_downloads")
+            return snapshot
+
+    def _revision(self):
         try:
-            credentials_ws = spreadsheet.worksheet("proveedor_credencial")
-            credentials_data = credentials_ws.get_all_records()
-            if credentials_data:
-                credentials_df = pd.DataFrame(credentials_data)
-                # Ensure all columns are strings for consistency
-                for col in credentials_df.columns:
-                    credentials_df[col] = credentials_df[col].astype(str)
+            return sheets_call("download.revision", self.spreadsheet.get_lastUpdateTime)
+        except Exception as e:
+            log_booking_attempt("REVISION_CHECK_FAILED", "Falling back to a full download", error=str(e))
+            return None
+
+@st.cache_resource(show_spinner=False)
+def get_sheet_snapshots():
+    """Snapshot store shared by every session of this server process"""
+    return SheetSnapshotStore(SNAPSHOT_MAX_AGE_SECONDS)
+
+def _download_all_sheets(store):
+    """Full download of the three worksheets as DataFrames"""
+    # Load credentials sheet
+    try:
+        credentials_ws = store.worksheet("proveedor_credencial")
+        credentials_data = sheets_call("download.credenciales.get_all_records", credentials_ws.get_all_records)
+        if credentials_data:
+            # Values are normalized to strings when the supplier directory is compiled
+            credentials_df = pd.DataFrame(credentials_data)
+        else:
+            # Fallback to raw values
+            all_values = sheets_call("download.credenciales.get_all_values", credentials_ws.get_all_values)
+            if all_values and len(all_values) > 1:
+                credentials_df = pd.DataFrame(all_values[1:], columns=all_values[0])
             else:
-                # Fallback to raw values
-                all_values = credentials_ws.get_all_values()
-                if all_values and len(all_values) > 1:
-                    credentials_df = pd.DataFrame(all_values[1:], columns=all_values[0])
-                else:
-                    credentials_df = pd.DataFrame(columns=['usuario', 'password', 'Email', 'cc'])
-        except gspread.WorksheetNotFound:
-            credentials_df = pd.DataFrame(columns=['usuario', 'password', 'Email', 'cc'])
-        
-        # Load reservas sheet
-        try:
-            reservas_ws = spreadsheet.worksheet("proveedor_reservas")
-            reservas_data = reservas_ws.get_all_records()
-            if reservas_data:
-                reservas_df = pd.DataFrame(reservas_data)
+                credentials_df = pd.DataFrame(columns=['usuario', 'password', 'Email', 'cc'])
+    except gspread.WorksheetNotFound:
+        credentials_df = pd.DataFrame(columns=['usuario', 'password', 'Email', 'cc'])
+    
+    # Load reservas sheet
+    try:
+        reservas_ws = store.worksheet("proveedor_reservas")
+        reservas_data = sheets_call("download.reservas.get_all_records", reservas_ws.get_all_records)
+        if reservas_data:
+            reservas_df = pd.DataFrame(reservas_data)
+        else:
+            # Fallback to raw values
+            all_values = sheets_call("download.reservas.get_all_values", reservas_ws.get_all_values)
+            if all_values and len(all_values) > 1:
+                reservas_df = pd.DataFrame(all_values[1:], columns=all_values[0])
             else:
-                # Fallback to raw values
-                all_values = reservas_ws.get_all_values()
-                if all_values and len(all_values) > 1:
-                    reservas_df = pd.DataFrame(all_values[1:], columns=all_values[0])
-                else:
-                    reservas_df = pd.DataFrame(columns=['Fecha', 'Hora', 'Proveedor', 'Numero_de_bultos', 'Orden_de_compra'])
-        except gspread.WorksheetNotFound:
-            reservas_df = pd.DataFrame(columns=['Fecha', 'Hora', 'Proveedor', 'Numero_de_bultos', 'Orden_de_compra'])
-        
-        # Load or create gestion sheet
-        try:
-            gestion_ws = spreadsheet.worksheet("proveedor_gestion")
-            gestion_data = gestion_ws.get_all_records()
-            if gestion_data:
-                gestion_df = pd.DataFrame(gestion_data)
+                reservas_df = pd.DataFrame(columns=['Fecha', 'Hora', 'Proveedor', 'Numero_de_bultos', 'Orden_de_compra', 'Anden'])
+    except gspread.WorksheetNotFound:
+        reservas_df = pd.DataFrame(columns=['Fecha', 'Hora', 'Proveedor', 'Numero_de_bultos', 'Orden_de_compra', 'Anden'])
+    
+    # Load or create gestion sheet
+    try:
+        gestion_ws = store.worksheet("proveedor_gestion")
+        gestion_data = sheets_call("download.gestion.get_all_records", gestion_ws.get_all_records)
+        if gestion_data:
+            gestion_df = pd.DataFrame(gestion_data)
+        else:
+            # Fallback to raw values
+            all_values = sheets_call("download.gestion.get_all_values", gestion_ws.get_all_values)
+            if all_values and len(all_values) > 1:
+                gestion_df = pd.DataFrame(all_values[1:], columns=all_values[0])
             else:
-                # Fallback to raw values
-                all_values = gestion_ws.get_all_values()
-                if all_values and len(all_values) > 1:
-                    gestion_df = pd.DataFrame(all_values[1:], columns=all_values[0])
-                else:
-                    gestion_df = pd.DataFrame(columns=[
-                        'Orden_de_compra', 'Proveedor', 'Numero_de_bultos',
-                        'Hora_llegada', 'Hora_inicio_atencion', 'Hora_fin_atencion',
-                        'Tiempo_espera', 'Tiempo_atencion', 'Tiempo_total', 'Tiempo_retraso',
-                        'numero_de_semana', 'hora_de_reserva'
-                    ])
-        except gspread.WorksheetNotFound:
-            # Create gestion sheet if it doesn't exist
-            try:
-                gestion_ws = spreadsheet.add_worksheet("proveedor_gestion", rows=100, cols=12)
-                # Add headers
-                headers = [
-                    'Orden_de_compra', 'Proveedor', 'Numero_de_bultos',
-                    'Hora_llegada', 'Hora_inicio_atencion', 'Hora_fin_atencion',
-                    'Tiempo_espera', 'Tiempo_atencion', 'Tiempo_total', 'Tiempo_retraso',
-                    'numero_de_semana', 'hora_de_reserva'
-                ]
-                gestion_ws.update('A1:L1', [headers])
-                gestion_df = pd.DataFrame(columns=headers)
-            except Exception as e:
-                st.warning(f"No se pudo crear hoja de gestión: {e}")
                 gestion_df = pd.DataFrame(columns=[
                     'Orden_de_compra', 'Proveedor', 'Numero_de_bultos',
                     'Hora_llegada', 'Hora_inicio_atencion', 'Hora_fin_atencion',
                     'Tiempo_espera', 'Tiempo_atencion', 'Tiempo_total', 'Tiempo_retraso',
                     'numero_de_semana', 'hora_de_reserva'
                 ])
+    except gspread.WorksheetNotFound:
+        # Create gestion sheet if it doesn't exist
+        try:
+            gestion_ws = sheets_call("download.gestion.add_worksheet", store.spreadsheet.add_worksheet,
+                                     "proveedor_gestion", rows=100, cols=12)
+            # Add headers
+            headers = [
+                'Orden_de_compra', 'Proveedor', 'Numero_de_bultos',
+                'Hora_llegada', 'Hora_inicio_atencion', 'Hora_fin_atencion',
+                'Tiempo_espera', 'Tiempo_atencion', 'Tiempo_total', 'Tiempo_retraso',
+                'numero_de_semana', 'hora_de_reserva'
+            ]
+            sheets_call("download.gestion.update", gestion_ws.update, 'A1:L1', [headers])
+            gestion_df = pd.DataFrame(columns=headers)
+        except Exception as e:
+            st.warning(f"No se pudo crear hoja de gestión: {e}")
+            gestion_df = pd.DataFrame(columns=[
+                'Orden_de_compra', 'Proveedor', 'Numero_de_bultos',
+                'Hora_llegada', 'Hora_inicio_atencion', 'Hora_fin_atencion',
+                'Tiempo_espera', 'Tiempo_atencion', 'Tiempo_total', 'Tiempo_retraso',
+                'numero_de_semana', 'hora_de_reserva'
+            ])
+    
+    return credentials_df, reservas_df, gestion_df
+
+@st.cache_data(ttl=60, show_spinner=False)  # Reduced TTL for real-time booking
+def download_sheets_to_memory():
+    """Download all sheets from Google Sheets - REPLACES SharePoint Excel download
+
+    Skips the download when the spreadsheet revision is unchanged (see SheetSnapshotStore).
+    """
+    try:
+        gc = get_sheets_client()
+        if not gc:
+            return None, None, None
         
-        return credentials_df, reservas_df, gestion_df
+        return get_sheet_snapshots().load(gc)
         
     except Exception as e:
         st.error(f"Error descargando datos: {str(e)}")
         return None, None, None
 
+def download_fresh_sheets():
+    """Sheets for a forced refresh: a snapshot is reused only up to FRESH_SNAPSHOT_MAX_AGE_SECONDS old"""
+    download_sheets_to_memory.clear()
+    try:
+        gc = get_sheets_client()
+        if not gc:
+            return None, None, None
+
+        return get_sheet_snapshots().load(gc, max_age=FRESH_SNAPSHOT_MAX_AGE_SECONDS)
+
+    except Exception as e:
+        st.error(f"Error descargando datos: {str(e)}")
+        return None, None, None
+
+def dataframe_fingerprint(df):
+    """Cheap content hash of a sheet snapshot, used to key structures derived from it"""
+    if df is None:
+        return None
+    content_hash = int(pd.util.hash_pandas_object(df, index=False).sum()) if len(df) else 0
+    return (tuple(df.columns), len(df), content_hash)
+
+# DataFrame.attrs entry set by SheetSnapshotStore on every frame it downloads
+SNAPSHOT_KEY_ATTR = "dismac_snapshot"
+
+def snapshot_key(df):
+    """O(1) key of a downloaded snapshot frame (content hash for frames built elsewhere).
+
+    attrs survive st.cache_data copies and carry over to filtered frames, so the
+    row count and columns are part of the key.
+    """
+    if df is None:
+        return None
+    download = df.attrs.get(SNAPSHOT_KEY_ATTR)
+    if download is None:
+        return dataframe_fingerprint(df)
+    return (download, tuple(df.columns), len(df))
 
 def log_booking_attempt(action, details, success=None, error=None):
     """Centralized logging for booking operations - SERVER SIDE ONLY"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_message = f"[{timestamp}] {action}: {details}"
-    
-    if success is not None:
-        log_message += f" | Success: {success}"
-    if error:
-        log_message += f" | Error: {error}"
+    level = logging.ERROR if success is False or error else logging.INFO
     
-    # Log to console/server logs only - NOT visible to users
-    if success is False or error:
-        logger.error(log_message)
-    else:
-        logger.info(log_message)
+    # Log to console/server logs only - NOT visible to users. Formatting and
+    # timestamps are handled by the logging listener thread, not the request thread.
+    logger.log(level, "%s: %s", action, details,
+               extra={"action": action, "details": details, "success": success, "error": error})
+
+def make_booking_id(booking):
+    """Identifier used to correlate the log lines of one booking"""
+    return f"{booking['Proveedor']}_{booking['Fecha']}_{booking['Hora']}"
+
+def with_booking_log_context(func):
+    """Tag every log record of a save call with the booking id and supplier"""
+    @functools.wraps(func)
+    def wrapper(new_booking, *args, **kwargs):
+        with booking_context(booking_id=make_booking_id(new_booking), supplier=new_booking['Proveedor']):
+            return func(new_booking, *args, **kwargs)
+    return wrapper
+
+@st.cache_resource(show_spinner=False)
+def get_startup_timings():
+    """Cold-start milestones, shared by every rerun and session of this process"""
+    return {"origin": _SCRIPT_START, "milestones": {}}
+
+def record_startup_timing(milestone):
+    """Record seconds since the first script run for a cold-start milestone"""
+    timings = get_startup_timings()
+    if milestone not in timings["milestones"]:
+        elapsed = round(time.perf_counter() - timings["origin"], 3)
+        timings["milestones"][milestone] = elapsed
+        log_booking_attempt("STARTUP_TIMING", f"{milestone}: {elapsed}s")
+
+def _prewarm_worker():
+    """Import heavy modules, authorize and fill the sheet cache off the render path"""
+    try:
+        for module_name in ("pandas", "gspread", "requests"):
+            importlib.import_module(module_name)
+        record_startup_timing("imports_ready")
+
+        if get_sheets_client() is None:
+            log_booking_attempt("PREWARM_FAILED", "Could not authorize Google Sheets", success=False)
+            return
+        record_startup_timing("credentials_ready")
+
+        download_sheets_to_memory()
+        record_startup_timing("sheets_cached")
+    except Exception as e:
+        log_booking_attempt("PREWARM_ERROR", "", error=str(e))
+
+@st.cache_resource(show_spinner=False)
+def start_prewarm():
+    """Start the background warm-up once per server process"""
+    if os.getenv("DISMAC_PREWARM", "1") == "0":
+        return None
+    thread = threading.Thread(target=_prewarm_worker, name="dismac-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+class BookingMetrics:
+    """Latency histograms per pipeline stage plus event counters, shared by all sessions"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.histograms = {}
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+            histogram["counts"][index] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "buckets": list(self.buckets),
+                "stages": {stage: {"counts": list(h["counts"]), "sum": round(h["sum"], 3), "count": h["count"]}
+                           for stage, h in self.histograms.items()},
+                "counters": dict(self.counters),
+            }
+
+    def render_prometheus(self):
+        """Prometheus text exposition of the histograms, counters, Sheets quota usage and dropped log records"""
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP dismac_stage_seconds Booking pipeline stage latency",
+            "# TYPE dismac_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(snapshot["stages"].items()):
+            cumulative = 0
+            for bound, count in zip(snapshot["buckets"] + ["+Inf"], histogram["counts"]):
+                cumulative += count
+                lines.append(f'dismac_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'dismac_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'dismac_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+        lines += ["# HELP dismac_events_total Booking pipeline events", "# TYPE dismac_events_total counter"]
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f'dismac_events_total{{event="{name}"}} {value}')
+
+        quota = get_sheets_quota().snapshot()
+        lines += ["# HELP dismac_sheets_calls_total Google Sheets API calls", "# TYPE dismac_sheets_calls_total counter"]
+        for operation, stats in sorted(quota["operations"].items()):
+            lines.append(f'dismac_sheets_calls_total{{operation="{operation}"}} {stats["calls"]}')
+        lines += ["# HELP dismac_sheets_errors_total Failed Google Sheets API calls", "# TYPE dismac_sheets_errors_total counter"]
+        for operation, stats in sorted(quota["operations"].items()):
+            lines.append(f'dismac_sheets_errors_total{{operation="{operation}"}} {stats["errors"]}')
+        lines += ["# TYPE dismac_sheets_tokens_available gauge", f'dismac_sheets_tokens_available {quota["tokens_available"]}']
+        lines += [
+            "# HELP dismac_log_records_dropped_total Log records dropped because the logging queue was full",
+            "# TYPE dismac_log_records_dropped_total counter",
+            f"dismac_log_records_dropped_total {dropped_record_count()}",
+        ]
+        return "\n".join(lines) + "\n"
+
+@st.cache_resource(show_spinner=False)
+def get_booking_metrics():
+    """Metrics registry shared by every session of this server process"""
+    return BookingMetrics()
+
+def record_stage(stage, started):
+    """Add the time since ``started`` (time.perf_counter()) to the stage histogram"""
+    elapsed = time.perf_counter() - started
+    get_booking_metrics().observe(stage, elapsed)
+    log_booking_attempt("STAGE_TIMING", f"{stage}: {elapsed:.3f}s")
+    return elapsed
+
+@contextmanager
+def timed_stage(stage):
+    """Time the enclosed block as one pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, started)
+
+def count_event(name, amount=1):
+    """Increment a pipeline counter (retries, verification misses, slot conflicts...)"""
+    get_booking_metrics().increment(name, amount)
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_server():
+    """Serve /metrics (Prometheus) and /metrics.json on METRICS_HOST:METRICS_PORT"""
+    if not METRICS_PORT:
+        return None
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = get_booking_metrics().render_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                payload = {"booking": get_booking_metrics().snapshot(), "sheets_quota": get_sheets_quota().snapshot()}
+                body = json.dumps(payload).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # keep scrapes out of the booking logs
+
+    try:
+        server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), MetricsHandler)
+    except OSError as e:
+        log_booking_attempt("METRICS_SERVER_FAILED", f"{METRICS_HOST}:{METRICS_PORT}", error=str(e))
+        return None
+    threading.Thread(target=server.serve_forever, name="dismac-metrics", daemon=True).start()
+    log_booking_attempt("METRICS_SERVER_STARTED", f"http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return server
 
 def verify_booking_saved(spreadsheet, booking_data, max_retries=3):
     """Verify that booking was actually saved to Google Sheets"""
@@ -166,8 +715,8 @@ def verify_booking_saved(spreadsheet, booking_data, max_retries=3):
             log_booking_attempt("VERIFY_ATTEMPT", f"Attempt {attempt + 1}/{max_retries}")
             
             # Get fresh data from sheets
-            reservas_ws = spreadsheet.worksheet("proveedor_reservas")
-            all_data = reservas_ws.get_all_values()
+            reservas_ws = get_worksheet(spreadsheet, "proveedor_reservas", "verify.worksheet")
+            all_data = sheets_call("verify.get_all_values", reservas_ws.get_all_values)
             
             if len(all_data) <= 1:  # Only headers
                 log_booking_attempt("VERIFY_FAILED", "No data found in sheet")
@@ -183,7 +732,8 @@ def verify_booking_saved(spreadsheet, booking_data, max_retries=3):
                         row[1] == booking_data['Hora'] and 
                         row[2] == booking_data['Proveedor'] and 
                         row[3] == str(booking_data['Numero_de_bultos']) and 
-                        row[4] == booking_data['Orden_de_compra']):
+                        row[4] == booking_data['Orden_de_compra'] and
+                        (NUM_DOCKS == 1 or 'Anden' not in booking_data or row[5:6] == [str(booking_data['Anden'])])):
                         
                         log_booking_attempt("VERIFY_SUCCESS", f"Booking found in row {i + 1}")
                         return True, f"Booking verified in row {i + 1}"
@@ -191,6 +741,7 @@ def verify_booking_saved(spreadsheet, booking_data, max_retries=3):
             # If not found, wait and retry
             if attempt < max_retries - 1:
                 log_booking_attempt("VERIFY_RETRY", f"Booking not found, waiting {attempt + 1} seconds")
+                count_event("verify_retries")
                 time.sleep(attempt + 1)  # Progressive delay
         
         return False, "Booking not found after verification attempts"
@@ -200,10 +751,19 @@ def verify_booking_saved(spreadsheet, booking_data, max_retries=3):
         log_booking_attempt("VERIFY_ERROR", "", error=error_msg)
         return False, error_msg
 
+def ensure_dock_header(reservas_ws, all_values):
+    """Add the 'Anden' header to proveedor_reservas the first time a dock is written"""
+    if NUM_DOCKS == 1:
+        return
+    header = all_values[0] if all_values else []
+    if len(header) < 6 or header[5] != 'Anden':
+        sheets_call("save.header", reservas_ws.update, range_name='F1', values=[['Anden']])
+        log_booking_attempt("DOCK_HEADER_ADDED", "Added 'Anden' column to proveedor_reservas")
+
 def get_sheet_row_count(worksheet):
     """Get the current number of rows in the worksheet"""
     try:
-        all_values = worksheet.get_all_values()
+        all_values = sheets_call("save.row_count", worksheet.get_all_values)
         # Subtract 1 for header row to get actual data rows
         data_rows = len(all_values) - 1 if all_values else 0
         return max(0, data_rows)
@@ -212,7 +772,10 @@ def get_sheet_row_count(worksheet):
         log_booking_attempt("ROW_COUNT_ERROR", "", error=f"Failed to get row count: {str(e)}")
         return -1
 
-def save_booking_to_sheets_enhanced(new_booking):
+@booking_priority()
+@with_booking_log_context
+@timed_stage("save.total")
+def save_booking_to_sheets_enhanced(new_booking, notify_error=st.error, on_progress=None, on_saved=None):
     """
     Enhanced save function with row count and specific booking verification
     
@@ -221,21 +784,27 @@ def save_booking_to_sheets_enhanced(new_booking):
     - Error código 2: API failures (Google Sheets API calls fail, general exceptions)
     - Error código 3: Row count verification failures (row count doesn't increase as expected)
     - Error código 4: Booking verification failures (can't find specific booking after saving)
+    
+    ``notify_error`` shows those messages to the user (st.error by default; background
+    confirmation jobs collect them instead) and ``on_progress`` receives step updates.
+    ``new_booking`` is not modified; ``on_saved`` receives the booking as written (with its dock).
     """
-    booking_id = f"{new_booking['Proveedor']}_{new_booking['Fecha']}_{new_booking['Hora']}"
+    on_progress = on_progress or (lambda text: None)
+    new_booking = dict(new_booking)
+    booking_id = make_booking_id(new_booking)
     
     try:
         log_booking_attempt("SAVE_START", f"Booking ID: {booking_id}")
         
         # Step 1: Clear cache and get fresh data
         log_booking_attempt("CACHE_CLEAR", "Clearing cached data")
-        download_sheets_to_memory.clear()
-        credentials_df, reservas_df, gestion_df = download_sheets_to_memory()
+        with timed_stage("save.load_snapshot"):
+            credentials_df, reservas_df, gestion_df = download_fresh_sheets()
         
         if reservas_df is None:
             error_msg = "Failed to load data from Google Sheets"
             log_booking_attempt("DATA_LOAD_FAILED", booking_id, success=False, error=error_msg)
-            st.error("❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código 1)")
+            notify_error("❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código 1)")
             return False, error_msg
 
         log_booking_attempt("DATA_LOADED", f"Loaded {len(reservas_df)} existing reservations")
@@ -246,87 +815,107 @@ def save_booking_to_sheets_enhanced(new_booking):
         
         log_booking_attempt("AVAILABILITY_CHECK", f"Date: {fecha_reserva}, Time: {hora_reserva}")
         
-        existing_booking = reservas_df[
-            (reservas_df['Fecha'].astype(str).str.contains(fecha_reserva.split(' ')[0], na=False)) & 
-            (reservas_df['Hora'].astype(str) == hora_reserva)
-        ]
+        booking_fecha = fecha_reserva.split(' ')[0]
+        intervals = booking_intervals(hora_reserva)
+        dock = interval_index_from_df(reservas_df, {booking_fecha})[booking_fecha].free_dock(intervals)
         
-        if not existing_booking.empty:
+        if dock is None:
             error_msg = "Slot already booked by another provider"
             log_booking_attempt("SLOT_TAKEN", booking_id, success=False, error=error_msg)
-            st.error("❌ Otro proveedor acaba de reservar este horario")
+            count_event("slot_conflicts")
+            notify_error("❌ Otro proveedor acaba de reservar este horario")
             download_sheets_to_memory.clear()
             return False, error_msg
 
-        log_booking_attempt("SLOT_AVAILABLE", f"Slot confirmed available for {booking_id}")
+        new_booking['Anden'] = dock
+        log_booking_attempt("SLOT_AVAILABLE", f"Slot confirmed available for {booking_id} on dock {dock}")
 
         # Step 3: Get Google Sheets connection
         log_booking_attempt("SHEETS_CONNECT", "Establishing Google Sheets connection")
-        gc = setup_google_sheets()
+        connect_started = time.perf_counter()
+        gc = get_sheets_client()
         if not gc:
             error_msg = "Failed to connect to Google Sheets"
             log_booking_attempt("SHEETS_CONNECTION_FAILED", booking_id, success=False, error=error_msg)
-            st.error("❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código 1)")
+            notify_error("❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código 1)")
             return False, error_msg
 
-        spreadsheet = gc.open(st.secrets["GOOGLE_SHEET_NAME"])
-        reservas_ws = spreadsheet.worksheet("proveedor_reservas")
+        spreadsheet = open_spreadsheet(gc, "save.open_spreadsheet")
+        reservas_ws = get_worksheet(spreadsheet, "proveedor_reservas", "save.worksheet")
+        record_stage("save.connect", connect_started)
         
         log_booking_attempt("WORKSHEET_ACCESSED", "proveedor_reservas worksheet accessed")
 
         # Step 4: Get initial row count BEFORE saving
-        initial_row_count = get_sheet_row_count(reservas_ws)
+        with timed_stage("save.row_count"):
+            initial_row_count = get_sheet_row_count(reservas_ws)
         if initial_row_count == -1:
             error_msg = "Failed to get initial row count"
             log_booking_attempt("INITIAL_COUNT_FAILED", booking_id, success=False, error=error_msg)
-            st.error("❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código 2)")
+            notify_error("❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código 2)")
             return False, error_msg
         
         log_booking_attempt("INITIAL_ROW_COUNT", f"Rows before save: {initial_row_count}")
 
         # Step 5: Prepare data for saving
-        new_row_data = [
-            new_booking['Fecha'],
-            new_booking['Hora'],
-            new_booking['Proveedor'],
-            str(new_booking['Numero_de_bultos']),
-            new_booking['Orden_de_compra']
-        ]
+        new_row_data = _booking_row(new_booking)
     
         log_booking_attempt("DATA_PREPARED", f"Row data: {new_row_data}")
 
         # Attempt to save with retry logic
         max_save_attempts = 10
         save_success = False
+        slot_taken = False
         last_error = None
         
         for attempt in range(max_save_attempts):
             try:
                 log_booking_attempt("SAVE_ATTEMPT", f"Attempt {attempt + 1}/{max_save_attempts} for {booking_id}")
+                if attempt > 0:
+                    count_event("save_retries")
+                write_started = time.perf_counter()
+                on_progress(f"Guardando reserva (intento {attempt + 1})...")
                 
                 # Save to sheets
                 #reservas_ws.append_row(new_row_data, value_input_option='RAW')
                 #log_booking_attempt("APPEND_REQUESTED", f"append_row() request sent for {booking_id}")
                 
                 #new append starts
-                all_values = reservas_ws.get_all_values()
-                next_row = len(all_values) + 1
-                col_range = f'A{next_row}:E{next_row}'
-                reservas_ws.update(
-                    range_name=col_range,
-                    values=[new_row_data],
-                    value_input_option='RAW'
-                )                
-                log_booking_attempt("APPEND_REQUESTED", f"Updated row {next_row} for {booking_id}")
+                all_values = sheets_call("save.get_all_values", reservas_ws.get_all_values)
+                if attempt > 0 and new_row_data in [row[:RESERVAS_WRITE_COLUMNS] for row in all_values[1:]]:
+                    # An earlier attempt landed after its verification gave up: don't append it twice
+                    log_booking_attempt("ALREADY_WRITTEN", f"{booking_id} found before rewriting")
+                else:
+                    # Conflict check against the rows we are about to append after
+                    if claim_docks([new_booking], all_values):
+                        slot_taken = True
+                        break
+                    new_row_data = _booking_row(new_booking)
+                    
+                    ensure_dock_header(reservas_ws, all_values)
+                    next_row = len(all_values) + 1
+                    col_range = f'A{next_row}:{RESERVAS_LAST_COLUMN}{next_row}'
+                    sheets_call(
+                        "save.update",
+                        reservas_ws.update,
+                        range_name=col_range,
+                        values=[new_row_data],
+                        value_input_option='RAW'
+                    )                
+                    log_booking_attempt("APPEND_REQUESTED", f"Updated row {next_row} for {booking_id}")
+                record_stage("save.write", write_started)
                 #new append ends
 
                 # Wait a moment for Google Sheets to process
-                time.sleep(5)
+                with timed_stage("save.processing_wait"):
+                    time.sleep(SHEETS_PROCESSING_WAIT_SECONDS)
                 
                 # Step 5: Verify the specific booking was saved (CONTENT-ONLY VALIDATION)
                 log_booking_attempt("PROCESSING_WAIT", f"Waiting for Google Sheets to process {booking_id}")
                 
-                verification_success, verification_message = verify_booking_saved(spreadsheet, new_booking)
+                on_progress("Verificando que la reserva quedó guardada...")
+                with timed_stage("save.verify"):
+                    verification_success, verification_message = verify_booking_saved(spreadsheet, new_booking)
                 
                 if verification_success:
                     log_booking_attempt("BOOKING_SAVE_SUCCESS", f"{booking_id} successfully saved and verified", success=True)
@@ -334,6 +923,7 @@ def save_booking_to_sheets_enhanced(new_booking):
                     break
                 else:
                     last_error = f"BOOKING_VERIFICATION_FAILED: {verification_message}"
+                    count_event("verification_misses")
                     log_booking_attempt("BOOKING_VERIFICATION_FAILED", f"{booking_id} save failed - content not found: {verification_message}", success=False)
                     
                     if attempt < max_save_attempts - 1:
@@ -343,16 +933,28 @@ def save_booking_to_sheets_enhanced(new_booking):
                 
             except Exception as save_error:
                 last_error = f"API_FAILURE: Save attempt {attempt + 1} failed: {str(save_error)}"
+                count_event("save_api_errors")
                 log_booking_attempt("SAVE_ATTEMPT_ERROR", f"{booking_id}", error=last_error)
                 
                 if attempt < max_save_attempts - 1:
                     wait_time = (attempt + 1) * 2
                     time.sleep(wait_time)
         
+        if slot_taken:
+            error_msg = "Slot already booked by another provider"
+            log_booking_attempt("SLOT_TAKEN", booking_id, success=False, error=f"{error_msg} (at write time)")
+            count_event("slot_conflicts")
+            notify_error("❌ Otro proveedor acaba de reservar este horario")
+            download_sheets_to_memory.clear()
+            return False, error_msg
+        
         if save_success:
             # Clear cache after successful save
             download_sheets_to_memory.clear()
             log_booking_attempt("SAVE_COMPLETE", f"{booking_id} successfully saved and verified", success=True)
+            count_event("bookings_saved")
+            if on_saved:
+                on_saved(new_booking)
             return True, "Booking saved and verified successfully"
         else:
             # Determine error code based on the type of failure
@@ -365,18 +967,20 @@ def save_booking_to_sheets_enhanced(new_booking):
             
             error_msg = f"Failed to save after {max_save_attempts} attempts. Last error: {last_error}"
             log_booking_attempt("SAVE_FAILED_FINAL", booking_id, success=False, error=error_msg)
+            count_event(f"save_failed_code_{error_code}")
             
             # Show user-friendly error message with appropriate error code
-            st.error(f"❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código {error_code})")
+            notify_error(f"❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código {error_code})")
             
             return False, error_msg
         
     except Exception as e:
         error_msg = f"Unexpected error in save_booking_to_sheets_enhanced: {str(e)}"
         log_booking_attempt("SAVE_EXCEPTION", booking_id, success=False, error=error_msg)
+        count_event("save_failed_code_2")
         
         # Show user-friendly error message
-        st.error("❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código 2)")
+        notify_error("❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código 2)")
         
         return False, error_msg
 
@@ -387,36 +991,44 @@ def get_duration_and_slots_info(numero_bultos, selected_slot):
         slot1 = selected_slot
         slot2 = get_next_slot(slot1)
         slot3 = get_next_slot(slot2)
-        combined_hora = f"{slot1}:00, {slot2}:00, {slot3}:00"
+        combined_hora = format_hora([slot1, slot2, slot3])
         duration_text = " (60 minutos)"
         duration_minutes = 60
     elif numero_bultos >= 4:
         # 40 minutes (2 x 20-minute slots)
         slot1 = selected_slot
         slot2 = get_next_slot(slot1)
-        combined_hora = f"{slot1}:00, {slot2}:00"
+        combined_hora = format_hora([slot1, slot2])
         duration_text = " (40 minutos)"
         duration_minutes = 40
     else:
         # 20 minutes (single slot)
-        combined_hora = f"{selected_slot}:00"
+        combined_hora = format_hora([selected_slot])
         duration_text = " (20 minutos)"
         duration_minutes = 20
     
     return combined_hora, duration_text, duration_minutes
 
-def enhanced_confirmation_process(selected_date, selected_slot, numero_bultos, valid_orders, supplier_name, supplier_email, supplier_cc_emails):
-    """Enhanced confirmation process with proper error handling and logging"""
+@timed_stage("confirmation.total")
+def enhanced_confirmation_process(job, selected_date, selected_slot, numero_bultos, valid_orders, supplier_name, supplier_email, supplier_cc_emails):
+    """Enhanced confirmation process with proper error handling and logging.
+
+    Runs on the confirmation job pool: progress and user messages go to ``job``
+    and are rendered by the polling fragment of the session that submitted it.
+    """
     
     log_booking_attempt("CONFIRMATION_START", f"User: {supplier_name}, Date: {selected_date}, Slot: {selected_slot}")
     
     # Final availability check
-    with st.spinner("Verificando disponibilidad final..."):
+    job.progress("Verificando disponibilidad final...")
+    with timed_stage("confirmation.final_check"):
         is_still_available, availability_message = check_slot_availability(selected_date, selected_slot, numero_bultos)
     
     if not is_still_available:
         log_booking_attempt("FINAL_CHECK_FAILED", f"{supplier_name}", success=False, error=availability_message)
-        st.error(f"❌ {availability_message}")
+        count_event("final_check_conflicts")
+        job.notify("error", f"❌ {availability_message}")
+        job.suggestions = compute_slot_suggestions(selected_date, selected_slot, numero_bultos)
         return False
     
     log_booking_attempt("FINAL_CHECK_PASSED", f"Slot still available for {supplier_name}")
@@ -437,32 +1049,40 @@ def enhanced_confirmation_process(selected_date, selected_slot, numero_bultos, v
     log_booking_attempt("BOOKING_PREPARED", f"Data prepared for {supplier_name}: {booking_to_save}")
 
     # Attempt to save booking
-    with st.spinner("Guardando reserva... (Esto puede tomar unos momentos)"):
-        save_success, save_message = save_booking_to_sheets_enhanced(booking_to_save)
+    job.progress("Guardando reserva... (Esto puede tomar unos momentos)")
+    saved_bookings = []
+    with timed_stage("confirmation.save"):
+        save_success, save_message = save_booking_to_sheets_enhanced(
+            booking_to_save,
+            notify_error=lambda text: job.notify("error", text),
+            on_progress=job.progress,
+            on_saved=saved_bookings.append
+        )
+    
+    log_sheets_quota_usage()
     
     if not save_success:
         log_booking_attempt("BOOKING_SAVE_FAILED", f"{supplier_name}", success=False, error=save_message)
         
-        # User already saw the error message from save_booking_to_sheets_enhanced
-        st.error("❌ No se enviará email de confirmación debido al error en el guardado")
-        
-        # Clear selected slot so user can try again
-        if 'selected_slot' in st.session_state:
-            del st.session_state.selected_slot
-        
-        st.info("💡 Puede intentar seleccionar otro horario o el mismo horario nuevamente después de unos minutos")
+        # User already got the error message from save_booking_to_sheets_enhanced
+        job.notify("error", "❌ No se enviará email de confirmación debido al error en el guardado")
+        job.notify("info", "💡 Puede intentar seleccionar otro horario o el mismo horario nuevamente después de unos minutos")
         
         return False
     
     # Only send email if save was successful and verified
     log_booking_attempt("BOOKING_SAVED", f"{supplier_name} - {save_message}", success=True)
-    st.success("✅ Reserva confirmada y verificada!")
+    job.notify("success", "✅ Reserva confirmada y verificada!")
+    # The saved copy carries the dock it was assigned
+    booking_to_save = saved_bookings[0]
+    queue_internal_digest(supplier_name, [booking_to_save])
     
     # Send email
     if supplier_email:
         log_booking_attempt("EMAIL_START", f"Sending to {supplier_email}")
         
-        with st.spinner("Enviando confirmación por email..."):
+        job.progress("Enviando confirmación por email...")
+        with timed_stage("confirmation.email"):
             email_sent, actual_cc_emails = send_booking_email(
                 supplier_email,
                 supplier_name,
@@ -472,18 +1092,301 @@ def enhanced_confirmation_process(selected_date, selected_slot, numero_bultos, v
         
         if email_sent:
             log_booking_attempt("EMAIL_SUCCESS", f"Email sent to {supplier_email}, CC: {actual_cc_emails}", success=True)
-            st.success(f"📧 Email de confirmación enviado a: {supplier_email}")
+            job.notify("success", f"📧 Email de confirmación enviado a: {supplier_email}")
             if actual_cc_emails:
-                st.success(f"📧 CC enviado a: {', '.join(actual_cc_emails)}")
+                job.notify("success", f"📧 CC enviado a: {', '.join(actual_cc_emails)}")
         else:
             log_booking_attempt("EMAIL_FAILED", f"Failed to send email to {supplier_email}", success=False)
-            st.warning("⚠️ Reserva guardada exitosamente pero error enviando email")
+            count_event("email_failures")
+            job.notify("warning", "⚠️ Reserva guardada exitosamente pero error enviando email")
     else:
         log_booking_attempt("NO_EMAIL", f"No email configured for {supplier_name}")
-        st.warning("⚠️ No se encontró email para enviar confirmación")
+        job.notify("warning", "⚠️ No se encontró email para enviar confirmación")
     
     return True
 
+def validate_booking_plan(plan, reservas_df, supplier_name):
+    """Check every item of a bulk plan against one snapshot and the plan's earlier items.
+
+    ``plan`` is a list of {'date', 'slot', 'numero_bultos', 'orders'}; returns
+    [(booking, error)] in plan order, with the dock already assigned to valid items.
+    """
+    today = datetime.now().date()
+    max_date = today + timedelta(days=30)
+    occupancy_by_date = build_occupancy_by_date(reservas_df)
+    results = []
+    
+    for item in plan:
+        selected_date, slot, numero_bultos = item['date'], item['slot'], item['numero_bultos']
+        if not numero_bultos or numero_bultos <= 0:
+            results.append((None, "Número de bultos inválido"))
+            continue
+        if not item['orders']:
+            results.append((None, "Falta al menos una orden de compra"))
+            continue
+        if not (today <= selected_date <= max_date):
+            results.append((None, "Fecha fuera del rango permitido (próximos 30 días)"))
+            continue
+        if selected_date.weekday() == 6:
+            results.append((None, "No trabajamos los domingos"))
+            continue
+        
+        slots_needed = get_slots_needed(numero_bultos)
+        starts = [start for start, _ in build_display_slots(get_slots_for_date(selected_date), {}, slots_needed)]
+        if slot not in starts:
+            results.append((None, f"Horario no ofrecido para {numero_bultos} bultos en esa fecha"))
+            continue
+        
+        # Items earlier in the plan occupy their docks too
+        occupancy = occupancy_by_date.setdefault(selected_date.strftime('%Y-%m-%d'), {})
+        window = get_window_slots(slot, slots_needed)
+        dock = assign_dock(free_docks_mask(occupancy, window))
+        if dock is None:
+            results.append((None, "Horario ocupado"))
+            continue
+        for window_slot in window:
+            occupancy[window_slot] = occupancy.get(window_slot, 0) | (1 << (dock - 1))
+        
+        combined_hora, _, _ = get_duration_and_slots_info(numero_bultos, slot)
+        results.append(({
+            'Fecha': selected_date.strftime('%Y-%m-%d') + ' 0:00:00',
+            'Hora': combined_hora,
+            'Proveedor': supplier_name,
+            'Numero_de_bultos': numero_bultos,
+            'Orden_de_compra': ', '.join(item['orders']),
+            'Anden': dock,
+        }, None))
+    
+    return results
+
+def _booking_row(booking):
+    """proveedor_reservas row (columns A-E, plus F with several docks) for a booking"""
+    return [
+        booking['Fecha'],
+        booking['Hora'],
+        booking['Proveedor'],
+        str(booking['Numero_de_bultos']),
+        booking['Orden_de_compra'],
+        str(booking['Anden'])
+    ][:RESERVAS_WRITE_COLUMNS]
+
+def claim_docks(bookings, all_values):
+    """Re-check bookings against the rows they will be appended after, moving them to
+    another free dock when needed; returns the bookings that no longer fit"""
+    index = interval_index_from_values(all_values, {booking['Fecha'].split(' ')[0] for booking in bookings})
+    taken = []
+    for booking in bookings:
+        day = index[booking['Fecha'].split(' ')[0]]
+        intervals = booking_intervals(booking['Hora'])
+        if not day.is_free(booking['Anden'], intervals):
+            dock = day.free_dock(intervals)
+            if dock is None:
+                taken.append(booking)
+                continue
+            booking['Anden'] = dock
+        day.add_booking(booking['Anden'], intervals)
+    return taken
+
+@booking_priority()
+@timed_stage("save_batch.total")
+def save_bookings_batch(plan, supplier_name, notify_error=st.error, on_progress=None):
+    """Validate a bulk plan against one fresh snapshot and write it with a single update.
+
+    Returns (bookings, message, item_errors): ``bookings`` are the rows written and
+    verified, or None when none were; ``item_errors`` lists (plan index, error) for the
+    rows that were not saved. A conflict found before any row landed rejects the whole
+    plan; once part of it is in the sheet, the rows that still fit are saved and only
+    the others are reported, so the caller can confirm the saved ones.
+    User messages use the same error codes as save_booking_to_sheets_enhanced.
+    """
+    on_progress = on_progress or (lambda text: None)
+    batch_id = f"{supplier_name}_bulk_{len(plan)}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    server_error = "❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código {})"
+    
+    with booking_context(booking_id=batch_id, supplier=supplier_name):
+        try:
+            log_booking_attempt("BULK_SAVE_START", f"Booking ID: {batch_id}, {len(plan)} deliveries")
+            
+            # Step 1: One fresh snapshot for the whole plan
+            on_progress("Validando el plan completo...")
+            with timed_stage("save_batch.load_snapshot"):
+                _, reservas_df, _ = download_fresh_sheets()
+            if reservas_df is None:
+                log_booking_attempt("DATA_LOAD_FAILED", batch_id, success=False, error="Failed to load data from Google Sheets")
+                notify_error(server_error.format(1))
+                return None, "Failed to load data from Google Sheets", []
+            
+            results = validate_booking_plan(plan, reservas_df, supplier_name)
+            item_errors = [(i, error) for i, (_, error) in enumerate(results) if error]
+            if item_errors:
+                log_booking_attempt("BULK_PLAN_REJECTED", batch_id, success=False, error=f"{len(item_errors)} invalid deliveries")
+                count_event("slot_conflicts", len(item_errors))
+                download_sheets_to_memory.clear()
+                return None, "Plan rejected", item_errors
+            bookings = [booking for booking, _ in results]
+            
+            # Step 2: Connection
+            gc = get_sheets_client()
+            if not gc:
+                log_booking_attempt("SHEETS_CONNECTION_FAILED", batch_id, success=False, error="Failed to connect to Google Sheets")
+                notify_error(server_error.format(1))
+                return None, "Failed to connect to Google Sheets", []
+            spreadsheet = open_spreadsheet(gc, "save_batch.open_spreadsheet")
+            reservas_ws = get_worksheet(spreadsheet, "proveedor_reservas", "save_batch.worksheet")
+            
+            # Step 3: Write every missing row in one contiguous update, then verify with one read
+            missing = list(bookings)
+            taken = []
+            plan_rejected = False
+            last_error = None
+            max_save_attempts = 3
+            for attempt in range(max_save_attempts):
+                try:
+                    log_booking_attempt("SAVE_ATTEMPT", f"Attempt {attempt + 1}/{max_save_attempts} for {batch_id}")
+                    on_progress(f"Guardando {len(missing)} reservas (intento {attempt + 1})...")
+                    if attempt > 0:
+                        count_event("save_retries")
+                    with timed_stage("save_batch.write"):
+                        all_values = sheets_call("save_batch.get_all_values", reservas_ws.get_all_values)
+                        if attempt > 0:
+                            # Rows of the previous attempt that landed after its verification
+                            present = {tuple(row[:RESERVAS_WRITE_COLUMNS]) for row in all_values[1:]}
+                            missing = [booking for booking in missing if tuple(_booking_row(booking)) not in present]
+                            if not missing:
+                                break
+                        conflicts = claim_docks(missing, all_values)
+                        if conflicts:
+                            taken += conflicts
+                            if len(missing) == len(bookings):
+                                plan_rejected = True  # Nothing landed yet: reject the whole plan
+                                break
+                            # Part of the plan is already in the sheet: keep saving the rows that still fit
+                            missing = [booking for booking in missing if not any(booking is t for t in conflicts)]
+                            if not missing:
+                                break
+                        ensure_dock_header(reservas_ws, all_values)
+                        first_row = len(all_values) + 1
+                        last_row = first_row + len(missing) - 1
+                        sheets_call(
+                            "save_batch.update",
+                            reservas_ws.update,
+                            range_name=f'A{first_row}:{RESERVAS_LAST_COLUMN}{last_row}',
+                            values=[_booking_row(booking) for booking in missing],
+                            value_input_option='RAW'
+                        )
+                    log_booking_attempt("APPEND_REQUESTED", f"Updated rows {first_row}-{last_row} for {batch_id}")
+                    
+                    with timed_stage("save.processing_wait"):
+                        time.sleep(SHEETS_PROCESSING_WAIT_SECONDS)
+                    
+                    on_progress("Verificando que las reservas quedaron guardadas...")
+                    with timed_stage("save_batch.verify"):
+                        saved_rows = {tuple(row[:RESERVAS_WRITE_COLUMNS]) for row in sheets_call("save_batch.verify", reservas_ws.get_all_values)[1:]}
+                    missing = [booking for booking in missing if tuple(_booking_row(booking)) not in saved_rows]
+                    if not missing:
+                        break
+                    last_error = f"BOOKING_VERIFICATION_FAILED: {len(missing)} rows not found"
+                    count_event("verification_misses", len(missing))
+                    log_booking_attempt("BOOKING_VERIFICATION_FAILED", f"{batch_id}: {len(missing)} rows not found", success=False)
+                except Exception as save_error:
+                    last_error = f"API_FAILURE: Save attempt {attempt + 1} failed: {str(save_error)}"
+                    count_event("save_api_errors")
+                    log_booking_attempt("SAVE_ATTEMPT_ERROR", batch_id, error=last_error)
+                
+                if attempt < max_save_attempts - 1:
+                    time.sleep((attempt + 1) * 2)
+            
+            download_sheets_to_memory.clear()
+            saved = [booking for booking in bookings if not any(booking is other for other in missing + taken)]
+            item_errors = [(i, "Otro proveedor acaba de reservar este horario")
+                           for i, booking in enumerate(bookings) if any(booking is other for other in taken)]
+            if taken:
+                count_event("slot_conflicts", len(taken))
+            if plan_rejected:
+                log_booking_attempt("SLOT_TAKEN", batch_id, success=False, error=f"{len(taken)} deliveries taken at write time")
+                return None, "Slot already booked by another provider", item_errors
+            if missing:
+                error_code = "4" if "BOOKING_VERIFICATION_FAILED" in (last_error or "") else "2"
+                count_event(f"save_failed_code_{error_code}")
+                notify_error(server_error.format(error_code))
+                if not saved:
+                    log_booking_attempt("SAVE_FAILED_FINAL", batch_id, success=False, error=last_error)
+                    return None, f"{len(missing)} of {len(bookings)} rows not saved. Last error: {last_error}", []
+                item_errors = sorted(item_errors + [
+                    (i, f"No se pudo guardar (Error código {error_code})")
+                    for i, booking in enumerate(bookings) if any(booking is other for other in missing)
+                ])
+            if item_errors:
+                # One terminal event per batch, so the log analyzer sees a single outcome
+                log_booking_attempt("BULK_SAVE_PARTIAL", f"{batch_id}: {len(saved)} of {len(bookings)} saved and verified",
+                                    success=False, error=f"{len(taken)} taken at write time, {len(missing)} not saved"
+                                                         + (f"; last error: {last_error}" if missing else ""))
+                count_event("bookings_saved", len(saved))
+                return saved, f"{len(saved)} of {len(bookings)} bookings saved", item_errors
+            
+            log_booking_attempt("SAVE_COMPLETE", f"{batch_id} successfully saved and verified", success=True)
+            count_event("bookings_saved", len(bookings))
+            count_event("bulk_plans_saved")
+            return bookings, "Bookings saved and verified successfully", []
+        
+        except Exception as e:
+            error_msg = f"Unexpected error in save_bookings_batch: {str(e)}"
+            log_booking_attempt("SAVE_EXCEPTION", batch_id, success=False, error=error_msg)
+            count_event("save_failed_code_2")
+            notify_error(server_error.format(2))
+            return None, error_msg, []
+
+@timed_stage("bulk_confirmation.total")
+def bulk_confirmation_process(job, plan, supplier_name, supplier_email, supplier_cc_emails):
+    """Save a whole plan in one write and send one consolidated email (runs on the job pool)"""
+    log_booking_attempt("BULK_CONFIRMATION_START", f"User: {supplier_name}, {len(plan)} deliveries")
+    
+    bookings, save_message, item_errors = save_bookings_batch(
+        plan,
+        supplier_name,
+        notify_error=lambda text: job.notify("error", text),
+        on_progress=job.progress
+    )
+    log_sheets_quota_usage()
+    
+    for i, error in item_errors:
+        item = plan[i]
+        job.notify("error", f"❌ Entrega {i + 1} ({item['date'].strftime('%d/%m/%Y')} {item['slot']}): {error}")
+    
+    if bookings is None:
+        if item_errors:
+            job.notify("info", "💡 Corrija el plan e intente nuevamente.")
+            return False
+        log_booking_attempt("BOOKING_SAVE_FAILED", f"{supplier_name}", success=False, error=save_message)
+        job.notify("error", "❌ No se enviará email de confirmación debido al error en el guardado")
+        return False
+    
+    if item_errors:
+        # Part of the plan is in the sheet: confirm it, and only the marked deliveries are booked again
+        job.notify("warning", f"⚠️ {len(bookings)} de {len(plan)} reservas quedaron confirmadas. "
+                              "Vuelva a reservar solo las entregas marcadas; las demás ya están guardadas.")
+    else:
+        job.notify("success", f"✅ {len(bookings)} reservas confirmadas y verificadas!")
+    queue_internal_digest(supplier_name, bookings)
+    
+    if supplier_email:
+        job.progress("Enviando confirmación por email...")
+        with timed_stage("confirmation.email"):
+            email_sent, actual_cc_emails = send_bulk_booking_email(supplier_email, supplier_name, bookings, supplier_cc_emails)
+        if email_sent:
+            log_booking_attempt("EMAIL_SUCCESS", f"Bulk email sent to {supplier_email}, CC: {actual_cc_emails}", success=True)
+            job.notify("success", f"📧 Email de confirmación enviado a: {supplier_email}")
+            if actual_cc_emails:
+                job.notify("success", f"📧 CC enviado a: {', '.join(actual_cc_emails)}")
+        else:
+            count_event("email_failures")
+            job.notify("warning", "⚠️ Reservas guardadas exitosamente pero error enviando email")
+    else:
+        job.notify("warning", "⚠️ No se encontró email para enviar confirmación")
+    
+    # A partly saved plan keeps the supplier logged in to book the rest
+    return not item_errors
+
 # ─────────────────────────────────────────────────────────────
 # 3. Email Functions - MODIFIED FOR 20-MINUTE SLOTS
 # ─────────────────────────────────────────────────────────────
@@ -508,77 +1411,118 @@ def _post_mail(to_field, subject, html_body):
 
 
 
+def _email_recipients(supplier_email, cc_emails):
+    """Supplier + CCs + internal addresses (unless they get the daily digest), deduped, supplier first"""
+    defaults = [] if INTERNAL_EMAIL_MODE == "digest" else INTERNAL_EMAILS
+    recipients = [supplier_email] + (list(cc_emails) if cc_emails else []) + defaults
+
+    seen = set()
+    return [e for e in recipients
+            if e and not (e in seen or seen.add(e))]
+
+# Templates are compiled once; only the per-booking values are substituted per mail
+EMAIL_SEPARATOR = "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+
+BOOKING_DETAILS_TEMPLATE = Template(
+    '📅 Fecha: $fecha<br>'
+    '🕐 Horario: $horario$duracion<br>'
+    '📦 Número de bultos: $bultos<br>'
+    '$anden'
+    '📋 Orden de compra: $orden<br>'
+)
+
+BOOKING_EMAIL_TEMPLATE = Template(
+    '<html><body style="font-family:Arial,sans-serif;font-size:14px;color:#222;">'
+    'Hola $supplier_name,<br><br>'
+    '$intro<br><br>'
+    '$title:<br>'
+    '$sep<br>'
+    '$details<br>'
+    'INSTRUCCIONES:<br>'
+    '$sep<br>'
+    '• Respeta el horario reservado para tu entrega.<br>'
+    '• En caso de retraso, podrías tener que esperar hasta el próximo cupo disponible del día o reprogramar tu entrega.<br>'
+    '• Dismac no se responsabiliza por los tiempos de espera ocasionados por llegadas fuera de horario.<br>'
+    '• Además, según el tipo de venta, es importante considerar lo siguiente:<br>'
+    '&nbsp;&nbsp;- Venta al contado: Debes entregar el pedido junto con la factura a nombre del comprador y tres (3) copias de la orden de compra.<br>'
+    '&nbsp;&nbsp;- Venta en minicuotas: Debes entregar el pedido junto con la factura a nombre de Dismatec S.A. y una (1) copia de la orden de compra.<br>'
+    '• Entregar impreso en almacén este correo.<br><br>'
+    'REQUISITOS DE SEGURIDAD<br>'
+    '• Pantalón largo, sin rasgados<br>'
+    '• Botines de seguridad<br>'
+    '• Casco de seguridad<br>'
+    '• Chaleco o camisa con reflectivo<br>'
+    '• No está permitido manillas, cadenas, y principalmente masticar coca.<br><br>'
+    '📄 <a href="$pdf_link">Guía del Seller Dismac Marketplace</a><br><br>'
+    'Gracias por utilizar nuestro sistema de reservas.<br><br>'
+    'Saludos cordiales,<br>'
+    'Equipo de Almacén Dismac'
+    '</body></html>'
+)
+
+DIGEST_ROW_TEMPLATE = Template(
+    '<tr><td>$fecha</td><td>$horario</td><td>$proveedor</td><td>$bultos</td>'
+    '<td>$anden</td><td>$orden</td><td>$hora_reserva</td></tr>'
+)
+
+DIGEST_EMAIL_TEMPLATE = Template(
+    '<html><body style="font-family:Arial,sans-serif;font-size:14px;color:#222;">'
+    'Resumen de las reservas realizadas hasta el $day a las $cutoff: $count reservas.<br><br>'
+    '<table border="1" cellpadding="4" cellspacing="0" style="border-collapse:collapse;font-size:13px;">'
+    '<tr><th>Fecha entrega</th><th>Horario</th><th>Proveedor</th><th>Bultos</th>'
+    '<th>Andén</th><th>Orden de compra</th><th>Reservado el</th></tr>'
+    '$rows'
+    '</table><br>'
+    'Equipo de Almacén Dismac'
+    '</body></html>'
+)
+
+@functools.lru_cache(maxsize=1)
+def _booking_email_layout():
+    """Confirmation mail template with the fixed parts (separator, guide link) filled in"""
+    pdf_link = f"https://drive.google.com/file/d/{st.secrets['PDF_FILE_ID']}/view"
+    return Template(BOOKING_EMAIL_TEMPLATE.safe_substitute(sep=EMAIL_SEPARATOR, pdf_link=pdf_link))
+
+def _booking_time_display(hora):
+    """('H:MM - HH:MM' or 'H:MM', minutes) of a Hora value"""
+    slots = parse_booked_slots([hora])
+    if len(slots) > 1:
+        end_minutes = slot_to_minutes(slots[-1]) + 20
+        return f"{slots[0]} - {end_minutes // 60:02d}:{end_minutes % 60:02d}", len(slots) * 20
+    return (slots[0] if slots else str(hora)), 20
+
+def _booking_details_html(booking_details):
+    """Fecha / horario / bultos / andén / orden lines of one booking"""
+    display_hora, duration_minutes = _booking_time_display(booking_details['Hora'])
+    # Dock only meaningful with more than one receiving dock
+    dock_line = ''
+    if NUM_DOCKS > 1 and booking_details.get('Anden'):
+        dock_line = f'🚪 Andén: {booking_details["Anden"]}<br>'
+    return BOOKING_DETAILS_TEMPLATE.substitute(
+        fecha=booking_details['Fecha'].split(' ')[0],
+        horario=display_hora,
+        duracion=f" (Duración: {duration_minutes} minutos)",
+        bultos=booking_details["Numero_de_bultos"],
+        anden=dock_line,
+        orden=booking_details["Orden_de_compra"],
+    )
+
+def _booking_email_html(supplier_name, intro, title, details_html):
+    """Full confirmation mail: greeting, booking details, instructions and safety rules"""
+    return _booking_email_layout().substitute(supplier_name=supplier_name, intro=intro, title=title, details=details_html)
+
 def send_booking_email(supplier_email, supplier_name, booking_details, cc_emails=None):
     """Send booking confirmation via Magento mail API (single comma-separated 'to')."""
     try:
-        # --- Build full recipient list (supplier + CCs + defaults), deduped ---
-        defaults = ["ljbyon@dismac.com.bo", "marketplace@dismac.com.bo"]
-        recipients = [supplier_email] + (list(cc_emails) if cc_emails else []) + defaults
-
-        seen = set()
-        recipients = [e for e in recipients
-                      if e and not (e in seen or seen.add(e))]
-
+        recipients = _email_recipients(supplier_email, cc_emails)
         to_field = ",".join(recipients)  # no spaces — safest for the Magento handler
 
         subject = "Confirmación de Reserva para Entrega de Mercadería"
-
-        # --- Time / duration display ---
-        display_fecha = booking_details['Fecha'].split(' ')[0]
-        hora_field = booking_details['Hora']
-        if ',' in hora_field:
-            slots = [slot.strip() for slot in hora_field.split(',')]
-            start_time = slots[0].rsplit(':', 1)[0]
-            last_slot = slots[-1].split(':')
-            end_hour = int(last_slot[0])
-            end_minute = int(last_slot[1]) + 20
-            if end_minute >= 60:
-                end_hour += end_minute // 60
-                end_minute = end_minute % 60
-            end_time = f"{end_hour:02d}:{end_minute:02d}"
-            display_hora = f"{start_time} - {end_time}"
-            num_slots = len(slots)
-            duration_minutes = num_slots * 20
-            duration_info = f" (Duración: {duration_minutes} minutos)"
-        else:
-            display_hora = hora_field.rsplit(':', 1)[0]
-            duration_info = " (Duración: 20 minutos)"
-
-        # --- PDF link ---
-        pdf_link = f"https://drive.google.com/file/d/{st.secrets['PDF_FILE_ID']}/view"
-
-        # --- HTML body with explicit <br> line breaks ---
-        sep = "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
-        html_body = (
-            '<html><body style="font-family:Arial,sans-serif;font-size:14px;color:#222;">'
-            f'Hola {supplier_name},<br><br>'
-            'Su reserva de entrega ha sido confirmada exitosamente.<br><br>'
-            'DETALLES DE LA RESERVA:<br>'
-            f'{sep}<br>'
-            f'📅 Fecha: {display_fecha}<br>'
-            f'🕐 Horario: {display_hora}{duration_info}<br>'
-            f'📦 Número de bultos: {booking_details["Numero_de_bultos"]}<br>'
-            f'📋 Orden de compra: {booking_details["Orden_de_compra"]}<br><br>'
-            'INSTRUCCIONES:<br>'
-            f'{sep}<br>'
-            '• Respeta el horario reservado para tu entrega.<br>'
-            '• En caso de retraso, podrías tener que esperar hasta el próximo cupo disponible del día o reprogramar tu entrega.<br>'
-            '• Dismac no se responsabiliza por los tiempos de espera ocasionados por llegadas fuera de horario.<br>'
-            '• Además, según el tipo de venta, es importante considerar lo siguiente:<br>'
-            '&nbsp;&nbsp;- Venta al contado: Debes entregar el pedido junto con la factura a nombre del comprador y tres (3) copias de la orden de compra.<br>'
-            '&nbsp;&nbsp;- Venta en minicuotas: Debes entregar el pedido junto con la factura a nombre de Dismatec S.A. y una (1) copia de la orden de compra.<br>'
-            '• Entregar impreso en almacén este correo.<br><br>'
-            'REQUISITOS DE SEGURIDAD<br>'
-            '• Pantalón largo, sin rasgados<br>'
-            '• Botines de seguridad<br>'
-            '• Casco de seguridad<br>'
-            '• Chaleco o camisa con reflectivo<br>'
-            '• No está permitido manillas, cadenas, y principalmente masticar coca.<br><br>'
-            f'📄 <a href="{pdf_link}">Guía del Seller Dismac Marketplace</a><br><br>'
-            'Gracias por utilizar nuestro sistema de reservas.<br><br>'
-            'Saludos cordiales,<br>'
-            'Equipo de Almacén Dismac'
-            '</body></html>'
+        html_body = _booking_email_html(
+            supplier_name,
+            'Su reserva de entrega ha sido confirmada exitosamente.',
+            'DETALLES DE LA RESERVA',
+            _booking_details_html(booking_details)
         )
 
         # --- Single send to everyone ---
@@ -591,20 +1535,136 @@ def send_booking_email(supplier_email, supplier_name, booking_details, cc_emails
         st.error(f"Error enviando email: {str(e)}")
         return False, []
 
-# ─────────────────────────────────────────────────────────────
-# 4. Time Slot Functions - MODIFIED FOR 20-MINUTE SLOTS
-# ─────────────────────────────────────────────────────────────
-def parse_booked_slots(booked_hours):
-    """Parse booked hours that may contain single or combined time slots"""
-    all_booked_slots = []
-    
-    for booked_hora in booked_hours:
-        hora_str = str(booked_hora).strip()
-        
+def send_bulk_booking_email(supplier_email, supplier_name, bookings, cc_emails=None):
+    """One consolidated confirmation for every booking of a bulk plan"""
+    try:
+        recipients = _email_recipients(supplier_email, cc_emails)
+        to_field = ",".join(recipients)
+
+        subject = f"Confirmación de {len(bookings)} Reservas para Entrega de Mercadería"
+        details_html = "<br>".join(
+            f'<b>Entrega {i}</b><br>{_booking_details_html(booking)}'
+            for i, booking in enumerate(bookings, start=1)
+        )
+        html_body = _booking_email_html(
+            supplier_name,
+            f'Sus {len(bookings)} reservas de entrega han sido confirmadas exitosamente.',
+            'DETALLES DE LAS RESERVAS',
+            details_html
+        )
+
+        _post_mail(to_field, subject, html_body)
+        return True, recipients[1:]
+
+    except Exception as e:
+        log_booking_attempt("BULK_EMAIL_ERROR", "", error=str(e))
+        return False, []
+
+@st.cache_resource(show_spinner=False)
+def get_email_digest():
+    """Bookings waiting for the internal daily digest, shared by every session of this server process"""
+    from email_digest import EmailDigestQueue
+    return EmailDigestQueue(EMAIL_DIGEST_PATH or None, EMAIL_DIGEST_TIME)
+
+def queue_internal_digest(supplier_name, bookings):
+    """In digest mode, queue saved bookings for the internal recipients' daily summary"""
+    if INTERNAL_EMAIL_MODE != "digest" or not INTERNAL_EMAILS:
+        return
+    digest = get_email_digest()
+    for booking in bookings:
+        digest.add(supplier_name, booking)
+    count_event("digest_bookings_queued", len(bookings))
+
+def _digest_email_html(day, records):
+    """One table row per booking, ordered by delivery date and time"""
+    def delivery_order(record):
+        intervals = booking_intervals(record['booking'].get('Hora', ''))
+        return record['booking'].get('Fecha', ''), intervals[0][0] if intervals else 0
+
+    rows = []
+    for record in sorted(records, key=delivery_order):
+        booking = record['booking']
+        display_hora, _ = _booking_time_display(booking.get('Hora', ''))
+        rows.append(DIGEST_ROW_TEMPLATE.substitute(
+            fecha=str(booking.get('Fecha', '')).split(' ')[0],
+            horario=display_hora,
+            proveedor=record['supplier'],
+            bultos=booking.get('Numero_de_bultos', ''),
+            anden=booking.get('Anden') or '',
+            orden=booking.get('Orden_de_compra', ''),
+            hora_reserva=record['time'],
+        ))
+    return DIGEST_EMAIL_TEMPLATE.substitute(
+        day=day, cutoff=EMAIL_DIGEST_TIME.strftime('%H:%M'), count=len(records), rows=''.join(rows)
+    )
+
+def send_email_digests(now=None):
+    """Send the internal digest of every due day, one mail per day; returns the number sent.
+
+    A failed send keeps the day's bookings queued for the next run.
+    """
+    digest = get_email_digest()
+    sent = 0
+    with digest.sending():
+        for day in digest.due_days(now or datetime.now()):
+            records = digest.take(day)
+            if not records:
+                continue
+            try:
+                _post_mail(
+                    ",".join(INTERNAL_EMAILS),
+                    f"Resumen diario de reservas {day} ({len(records)})",
+                    _digest_email_html(day, records)
+                )
+            except Exception as e:
+                digest.restore(day, records, str(e))
+                count_event("digest_failures")
+                log_booking_attempt("EMAIL_DIGEST_FAILED", f"{day}: {len(records)} bookings kept", success=False, error=str(e))
+                continue
+            digest.sent()
+            sent += 1
+            count_event("digest_emails")
+            log_booking_attempt("EMAIL_DIGEST_SENT", f"{day}: {len(records)} bookings to {', '.join(INTERNAL_EMAILS)}", success=True)
+    return sent
+
+def _email_digest_worker():
+    while True:
+        time.sleep(60)
+        try:
+            if get_email_digest().pending_count():
+                send_email_digests()
+        except Exception as e:
+            log_booking_attempt("EMAIL_DIGEST_ERROR", "", error=str(e))
+
+@st.cache_resource(show_spinner=False)
+def start_email_digest_scheduler():
+    """Check for due internal digests every minute, once per server process (digest mode only)"""
+    if INTERNAL_EMAIL_MODE != "digest":
+        return None
+    thread = threading.Thread(target=_email_digest_worker, name="dismac-email-digest", daemon=True)
+    thread.start()
+    return thread
+
+# ─────────────────────────────────────────────────────────────
+# 4. Time Slot Functions - MODIFIED FOR 20-MINUTE SLOTS
+# ─────────────────────────────────────────────────────────────
+def parse_booked_slots(booked_hours):
+    """Parse booked hours that may contain single or combined time slots"""
+    all_booked_slots = []
+    
+    for booked_hora in booked_hours:
+        hora_str = str(booked_hora).strip()
+        
         # Skip empty or NaN values
         if not hora_str or hora_str.lower() in ['nan', 'none', '']:
             continue
         
+        # Compact 'H:MM+minutes'
+        compact = parse_compact_hora(hora_str)
+        if compact:
+            all_booked_slots.extend(compact_hora_slots(*compact))
+            continue
+        
         # Check if it contains comma (combined slots)
         if ',' in hora_str:
             # Split by comma and clean each slot
@@ -621,6 +1681,44 @@ def parse_booked_slots(booked_hours):
     
     return all_booked_slots
 
+_COMPACT_HORA = re.compile(r'^(\d{1,2}):(\d{2})(?::\d{2})?\s*\+\s*(\d+)$')
+
+def parse_compact_hora(hora):
+    """(start minute, duration) of a compact 'H:MM+minutes' Hora, or None for other formats"""
+    match = _COMPACT_HORA.match(str(hora).strip())
+    if not match:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2)), int(match.group(3))
+
+@functools.lru_cache(maxsize=256)
+def compact_hora_slots(start, duration):
+    """The 'H:MM' slots covered by a compact Hora"""
+    return tuple(f"{minute // 60:d}:{minute % 60:02d}" for minute in range(start, start + duration, 20))
+
+def format_hora(slots):
+    """Hora cell for a delivery occupying consecutive 'H:MM' slots, in the configured HORA_FORMAT"""
+    if HORA_FORMAT == "legacy":
+        return ", ".join(f"{slot}:00" for slot in slots)
+    return f"{slots[0]}+{len(slots) * 20}"
+
+def legacy_hora(hora):
+    """Comma-joined 'H:MM:00' form of a compact Hora (other values are returned unchanged)"""
+    compact = parse_compact_hora(hora)
+    if not compact:
+        return hora
+    return ", ".join(f"{slot}:00" for slot in compact_hora_slots(*compact))
+
+def compact_hora(hora):
+    """Compact form of a legacy Hora with consecutive slots, or None if it cannot be converted"""
+    compact = parse_compact_hora(hora)
+    if compact:
+        start, duration = compact
+        return f"{start // 60:d}:{start % 60:02d}+{duration}"
+    slots = parse_booked_slots([hora])
+    if not slots or slots != get_window_slots(slots[0], len(slots)):
+        return None
+    return f"{slots[0]}+{len(slots) * 20}"
+
 def format_time_slot(time_str):
     """Format time string to HH:MM format, handling various input formats"""
     try:
@@ -676,34 +1774,152 @@ def get_next_slot(slot_time):
     
     return next_slot
 
-def find_contiguous_slots(all_slots, booked_slots, slots_needed):
-    """Find available contiguous slots based on number of slots needed"""
-    available_slots = []
+def parse_dock(value):
+    """Dock number from the 'Anden' column; rows saved before multi-dock used dock 1"""
+    try:
+        dock = int(float(str(value).strip()))
+    except (TypeError, ValueError):
+        return 1
+    return dock if 1 <= dock <= NUM_DOCKS else 1
+
+def build_slot_occupancy(booked_hours, booked_docks):
+    """{slot: bitmask of docks busy in that slot} for one day's reservations"""
+    occupancy = {}
+    for hora, anden in zip(booked_hours, booked_docks):
+        dock_bit = 1 << (parse_dock(anden) - 1)
+        for slot in parse_booked_slots([hora]):
+            occupancy[slot] = occupancy.get(slot, 0) | dock_bit
+    return occupancy
+
+def get_day_occupancy(reservas_df, selected_date):
+    """Dock occupancy per slot for one date"""
+    target_date = selected_date.strftime('%Y-%m-%d')
+    date_mask = reservas_df['Fecha'].astype(str).str.contains(target_date, na=False)
+    day_df = reservas_df[date_mask]
+    booked_docks = day_df['Anden'].tolist() if 'Anden' in day_df.columns else [None] * len(day_df)
+    return build_slot_occupancy(day_df['Hora'].tolist(), booked_docks)
+
+def get_window_slots(slot_time, slots_needed):
+    """The consecutive 20-minute slots a delivery starting at slot_time occupies"""
+    window = [slot_time]
+    for _ in range(1, slots_needed):
+        window.append(get_next_slot(window[-1]))
+    return window
+
+def free_docks_mask(occupancy, window_slots):
+    """Bitmask of docks that are free during every slot of the window"""
+    busy = 0
+    for slot in window_slots:
+        busy |= occupancy.get(slot, 0)
+    return ALL_DOCKS_MASK & ~busy
+
+def assign_dock(free_mask):
+    """Lowest free dock number for a free-dock bitmask, or None if all are busy"""
+    if not free_mask:
+        return None
+    return (free_mask & -free_mask).bit_length()
+
+def build_display_slots(all_slots, occupancy, slots_needed):
+    """[(start_slot, is_available)] for every contiguous window of slots_needed slots"""
+    display_slots = []
     
     for i in range(len(all_slots) - (slots_needed - 1)):
         # Check if we have enough consecutive slots
-        slots_to_check = []
-        current = all_slots[i]
-        slots_to_check.append(current)
-        
-        # Get the next slots needed
-        for j in range(1, slots_needed):
-            next_expected = get_next_slot(slots_to_check[-1])
-            if i + j < len(all_slots) and all_slots[i + j] == next_expected:
-                slots_to_check.append(all_slots[i + j])
-            else:
-                break
+        window = all_slots[i:i + slots_needed]
+        if window != get_window_slots(all_slots[i], slots_needed):
+            continue
         
-        # Check if we found all needed consecutive slots
-        if len(slots_to_check) == slots_needed:
-            # Check if all slots are available
-            if all(slot not in booked_slots for slot in slots_to_check):
-                available_slots.append(current)
+        # Available when at least one dock is free for the whole window
+        display_slots.append((all_slots[i], free_docks_mask(occupancy, window) != 0))
     
-    return available_slots
+    return display_slots
+
+def find_contiguous_slots(all_slots, occupancy, slots_needed):
+    """Find available contiguous slots based on number of slots needed"""
+    return [slot for slot, is_available in build_display_slots(all_slots, occupancy, slots_needed) if is_available]
 
 def get_available_slots(selected_date, reservas_df, numero_bultos):
     """Get available slots for a date based on bultos count"""
+    all_20min_slots = get_slots_for_date(selected_date)
+    if not all_20min_slots:
+        return []
+
+    # Dock occupancy for this date (handles combined slots)
+    occupancy = get_day_occupancy(reservas_df, selected_date)
+    
+    # 1-3 bultos = 1 slot, 4-7 bultos = 2 slots, 8+ bultos = 3 slots
+    return find_contiguous_slots(all_20min_slots, occupancy, get_slots_needed(numero_bultos))
+
+class AvailabilityPrefetcher:
+    """Per-date slot grids computed ahead of time on a small thread pool.
+
+    Grids are kept in an LRU keyed by (snapshot fingerprint, date, slots needed),
+    so a new snapshot never serves stale availability.
+    """
+
+    def __init__(self, max_workers, max_entries):
+        self.max_entries = max_entries
+        self.grids = OrderedDict()
+        self.pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dismac-prefetch")
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint, reservas_df, selected_date, slots_needed):
+        """Grid for one date: from the cache, from a prefetch in flight, or computed now"""
+        key = (fingerprint, selected_date, slots_needed)
+        with self._lock:
+            if key in self.grids:
+                self.grids.move_to_end(key)
+                count_event("prefetch_hits")
+                return self.grids[key]
+            future = self.pending.get(key)
+        if future is not None:
+            count_event("prefetch_joined")
+            return future.result()
+        count_event("prefetch_misses")
+        return self._compute(key, reservas_df)
+
+    def prefetch(self, fingerprint, reservas_df, dates, slots_needed):
+        for selected_date in dates:
+            key = (fingerprint, selected_date, slots_needed)
+            with self._lock:
+                if key in self.grids or key in self.pending:
+                    continue
+                self.pending[key] = self._executor.submit(self._compute, key, reservas_df)
+
+    def _compute(self, key, reservas_df):
+        _, selected_date, slots_needed = key
+        try:
+            grid = build_display_slots(get_slots_for_date(selected_date), get_day_occupancy(reservas_df, selected_date), slots_needed)
+            with self._lock:
+                self.grids[key] = grid
+                self.grids.move_to_end(key)
+                while len(self.grids) > self.max_entries:
+                    self.grids.popitem(last=False)
+            return grid
+        finally:
+            with self._lock:
+                self.pending.pop(key, None)
+
+@st.cache_resource(show_spinner=False)
+def get_availability_prefetcher():
+    """Prefetch pool and grid cache shared by every session of this server process"""
+    return AvailabilityPrefetcher(PREFETCH_WORKERS, PREFETCH_CACHE_SIZE)
+
+def prefetch_dates(selected_date, today, max_date):
+    """Adjacent dates plus the rest of the selected date's week, within the booking window"""
+    week_end = selected_date + timedelta(days=6 - selected_date.weekday())
+    candidates = [selected_date - timedelta(days=1), selected_date + timedelta(days=1)]
+    candidates += [selected_date + timedelta(days=offset) for offset in range(2, (week_end - selected_date).days + 1)]
+    return [day for day in candidates if today <= day <= max_date and get_slots_for_date(day)]
+
+def get_display_slots(reservas_df, selected_date, numero_bultos, fingerprint=None):
+    """[(start_slot, is_available)] for a date, served from the prefetch cache when warm"""
+    fingerprint = fingerprint if fingerprint is not None else snapshot_key(reservas_df)
+    return get_availability_prefetcher().get(fingerprint, reservas_df, selected_date, get_slots_needed(numero_bultos))
+
+def get_slots_for_date(selected_date):
+    """All 20-minute slots offered on a date (none on Sundays)"""
     weekday_slots, saturday_slots = generate_all_20min_slots()
     
     # Sunday = 6, no work
@@ -711,44 +1927,287 @@ def get_available_slots(selected_date, reservas_df, numero_bultos):
         return []
     
     # Saturday = 5
-    if selected_date.weekday() == 5:
-        all_20min_slots = saturday_slots
-    else:
-        all_20min_slots = weekday_slots
-
-    
-    
+    all_20min_slots = saturday_slots if selected_date.weekday() == 5 else weekday_slots
     
     # Special case: December 24, 2025 - only allow reservations until 3pm
     if selected_date.year == 2025 and selected_date.month == 12 and selected_date.day == 24:
         all_20min_slots = [slot for slot in all_20min_slots if int(slot.split(':')[0]) < 15]
     
+    return all_20min_slots
 
+def get_slots_needed(numero_bultos):
+    """Number of consecutive 20-minute slots a delivery needs"""
+    if numero_bultos >= 8:
+        return 3
+    if numero_bultos >= 4:
+        return 2
+    return 1
 
+def slot_to_minutes(slot_time):
+    """Minutes since midnight for an 'H:MM' slot"""
+    hour, minute = map(int, slot_time.split(':')[:2])
+    return hour * 60 + minute
 
-    # Get booked slots for this date
-    target_date = selected_date.strftime('%Y-%m-%d')
-    
-    # Filter reservations for the selected date
-    date_mask = reservas_df['Fecha'].astype(str).str.contains(target_date, na=False)
-    booked_hours = reservas_df[date_mask]['Hora'].tolist()
+def build_occupancy_by_date(reservas_df):
+    """{'YYYY-MM-DD': {slot: busy dock bitmask}} from a single pass over the reservations"""
+    if reservas_df is None or reservas_df.empty:
+        return {}
+    fechas = reservas_df['Fecha'].astype(str).str.extract(r'(\d{4}-\d{2}-\d{2})', expand=False)
+    docks = reservas_df['Anden'] if 'Anden' in reservas_df.columns else pd.Series(None, index=reservas_df.index)
+    occupancy_by_date = {}
+    for fecha, day_df in pd.DataFrame({'Hora': reservas_df['Hora'], 'Anden': docks}).groupby(fechas):
+        occupancy_by_date[fecha] = build_slot_occupancy(day_df['Hora'].tolist(), day_df['Anden'].tolist())
+    return occupancy_by_date
+
+def booking_intervals(hora):
+    """(start minute, duration) of each run of consecutive slots in a Hora value"""
+    compact = parse_compact_hora(hora)
+    if compact:
+        return [compact]
+    intervals = []
+    for start in sorted({slot_to_minutes(slot) for slot in parse_booked_slots([hora])}):
+        if intervals and intervals[-1][0] + intervals[-1][1] == start:
+            intervals[-1] = (intervals[-1][0], intervals[-1][1] + 20)
+        else:
+            intervals.append((start, 20))
+    return intervals
+
+
+class DayIntervals:
+    """One date's bookings per dock as (start, duration) intervals sorted by start.
+
+    Alongside the starts we keep the running maximum end, so an overlap check is
+    a bisect plus one comparison even when existing rows overlap each other.
+    """
+
+    def __init__(self):
+        self.starts = defaultdict(list)
+        self.max_ends = defaultdict(list)
+
+    def add(self, dock, start, duration):
+        starts, max_ends = self.starts[dock], self.max_ends[dock]
+        i = bisect.bisect_right(starts, start)
+        end = max(start + duration, max_ends[i - 1] if i else 0)
+        starts.insert(i, start)
+        max_ends.insert(i, end)
+        for j in range(i + 1, len(max_ends)):
+            if max_ends[j] >= end:
+                break
+            max_ends[j] = end
+
+    def overlaps(self, dock, start, duration):
+        starts = self.starts.get(dock)
+        if not starts:
+            return False
+        # Intervals starting before our end overlap when one of them ends after our start
+        i = bisect.bisect_left(starts, start + duration)
+        return i > 0 and self.max_ends[dock][i - 1] > start
+
+    def is_free(self, dock, intervals):
+        return not any(self.overlaps(dock, start, duration) for start, duration in intervals)
+
+    def free_dock(self, intervals):
+        """Lowest dock free during all the intervals, or None"""
+        for dock in range(1, NUM_DOCKS + 1):
+            if self.is_free(dock, intervals):
+                return dock
+        return None
+
+    def add_booking(self, dock, intervals):
+        for start, duration in intervals:
+            self.add(dock, start, duration)
+
+
+def build_interval_index(fechas, horas, andenes, dates):
+    """{'YYYY-MM-DD': DayIntervals} for the given dates from parallel Fecha/Hora/Anden values"""
+    index = {fecha: DayIntervals() for fecha in dates}
+    for fecha, hora, anden in zip(fechas, horas, andenes):
+        day = index.get(str(fecha).split(' ')[0])
+        if day is not None:
+            day.add_booking(parse_dock(anden), booking_intervals(hora))
+    return index
+
+def interval_index_from_df(reservas_df, dates):
+    """Interval index of a reservations snapshot"""
+    andenes = reservas_df['Anden'] if 'Anden' in reservas_df.columns else [None] * len(reservas_df)
+    return build_interval_index(reservas_df['Fecha'].astype(str), reservas_df['Hora'], andenes, dates)
+
+def interval_index_from_values(all_values, dates):
+    """Interval index of proveedor_reservas rows as returned by get_all_values()"""
+    header = all_values[0] if all_values else []
+    if 'Fecha' not in header or 'Hora' not in header:
+        return {fecha: DayIntervals() for fecha in dates}
+    rows = all_values[1:]
+    column = {name: header.index(name) for name in ('Fecha', 'Hora', 'Anden') if name in header}
+    cell = lambda row, name: row[column[name]] if name in column and column[name] < len(row) else None
+    return build_interval_index(
+        (cell(row, 'Fecha') or '' for row in rows),
+        (cell(row, 'Hora') for row in rows),
+        (cell(row, 'Anden') for row in rows),
+        dates
+    )
+
+def compute_free_runs(day_slots, occupancy):
+    """runs[i] = longest run of consecutive slots starting at day_slots[i] free on a single dock"""
+    runs = [0] * len(day_slots)
+    dock_runs = [0] * NUM_DOCKS
+    for i in range(len(day_slots) - 1, -1, -1):
+        is_contiguous = i + 1 < len(day_slots) and day_slots[i + 1] == get_next_slot(day_slots[i])
+        busy = occupancy.get(day_slots[i], 0)
+        for dock in range(NUM_DOCKS):
+            if busy & (1 << dock):
+                dock_runs[dock] = 0
+            else:
+                dock_runs[dock] = dock_runs[dock] + 1 if is_contiguous else 1
+        runs[i] = max(dock_runs)
+    return runs
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cached_free_runs(fingerprint, first_day, horizon_days, _reservas_df):
+    occupancy_by_date = build_occupancy_by_date(_reservas_df)
+    free_runs = {}
+    for offset in range(horizon_days + 1):
+        day = first_day + timedelta(days=offset)
+        day_slots = get_slots_for_date(day)
+        if day_slots:
+            free_runs[day] = (day_slots, compute_free_runs(day_slots, occupancy_by_date.get(day.isoformat(), {})))
+    return free_runs
+
+def get_free_runs(reservas_df, first_day, horizon_days=30):
+    """Free-run lengths per day across the booking horizon, computed once per snapshot"""
+    return _cached_free_runs(snapshot_key(reservas_df), first_day, horizon_days, reservas_df)
+
+def suggest_alternative_slots(reservas_df, numero_bultos, preferred_date, preferred_slot=None, limit=6, horizon_days=30):
+    """Nearest feasible start slots to the preferred date/time, as [(date, slot)]"""
+    today = datetime.now().date()
+    slots_needed = get_slots_needed(numero_bultos)
+    preferred_minute = slot_to_minutes(preferred_slot) if preferred_slot else slot_to_minutes("9:00")
     
-    # Parse booked slots (handles combined slots)
-    booked_slots = parse_booked_slots(booked_hours)
+    candidates = []
+    for day, (day_slots, runs) in get_free_runs(reservas_df, today, horizon_days).items():
+        day_distance = abs((day - preferred_date).days) * 24 * 60
+        for slot, run in zip(day_slots, runs):
+            if run < slots_needed or (day == preferred_date and slot == preferred_slot):
+                continue
+            distance = day_distance + abs(slot_to_minutes(slot) - preferred_minute)
+            candidates.append((distance, day, slot_to_minutes(slot), slot))
     
-    if numero_bultos >= 8:
-        # For 8+ bultos, find contiguous 60-minute slots (3 x 20 minutes)
-        return find_contiguous_slots(all_20min_slots, booked_slots, 3)
-    elif numero_bultos >= 4:
-        # For 4-7 bultos, find contiguous 40-minute slots (2 x 20 minutes)
-        return find_contiguous_slots(all_20min_slots, booked_slots, 2)
-    else:
-        # For 1-3 bultos, return available 20-minute slots
-        return [slot for slot in all_20min_slots if slot not in booked_slots]
+    return [(day, slot) for _, day, _, slot in heapq.nsmallest(limit, candidates)]
 
 # ─────────────────────────────────────────────────────────────
 # 5. Authentication Function - UPDATED FOR GOOGLE SHEETS
 # ─────────────────────────────────────────────────────────────
+class SupplierRecord:
+    """Compact login record for one supplier, compiled from proveedor_credencial"""
+    __slots__ = ("usuario", "password_digest", "email", "cc_emails")
+
+    def __init__(self, usuario, password_digest, email, cc_emails):
+        self.usuario = usuario
+        self.password_digest = password_digest
+        self.email = email
+        self.cc_emails = cc_emails
+
+def _password_digest(password):
+    """SHA-256 of the stripped password, compared in constant time at login"""
+    return hashlib.sha256(str(password).strip().encode("utf-8")).digest()
+
+def _clean_cell(value):
+    """Cell value as a stripped string, or None for empty/NaN cells"""
+    text = str(value).strip() if value is not None else ""
+    return None if text.lower() in ("", "nan", "none") else text
+
+def _cell_text(value):
+    """Cell value as a stripped string; only missing cells (None/NaN) become empty"""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value).strip()
+
+def compile_supplier_directory(credentials_df):
+    """Build {usuario: SupplierRecord} from the credentials sheet (first row wins)"""
+    columns = credentials_df.reindex(columns=['usuario', 'password', 'Email', 'cc'])
+    directory = {}
+    for usuario, password, email, cc_data in columns.itertuples(index=False, name=None):
+        usuario = _clean_cell(usuario)
+        if usuario is None or usuario in directory:
+            continue
+        cc_text = _clean_cell(cc_data)
+        # Parse semicolon-separated emails
+        cc_emails = tuple(cc.strip() for cc in cc_text.split(';') if cc.strip()) if cc_text else ()
+        directory[usuario] = SupplierRecord(
+            usuario,
+            # Passwords are compared as typed: 'none' or 'nan' are valid passwords
+            _password_digest(_cell_text(password)),
+            _clean_cell(email),
+            cc_emails,
+        )
+    return directory
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _cached_supplier_directory(fingerprint, _credentials_df):
+    return compile_supplier_directory(_credentials_df)
+
+def get_supplier_directory(credentials_df):
+    """Supplier directory for this credentials snapshot, compiled once per snapshot"""
+    return _cached_supplier_directory(snapshot_key(credentials_df), credentials_df)
+
+def build_supplier_booking_index(reservas_df, first_day):
+    """{proveedor: [booking dicts sorted by date and time]} for reservations from first_day on"""
+    if reservas_df is None or reservas_df.empty:
+        return {}
+    fechas = reservas_df['Fecha'].astype(str).str.extract(r'(\d{4}-\d{2}-\d{2})', expand=False)
+    upcoming = reservas_df[fechas >= first_day.isoformat()].assign(_fecha=fechas)
+    docks = upcoming['Anden'] if 'Anden' in upcoming.columns else pd.Series(None, index=upcoming.index)
+    proveedores = upcoming['Proveedor'].astype(str).str.strip()
+    
+    index = defaultdict(list)
+    for proveedor, fecha, hora, bultos, ordenes, anden in zip(
+            proveedores, upcoming['_fecha'], upcoming['Hora'], upcoming['Numero_de_bultos'],
+            upcoming['Orden_de_compra'], docks):
+        slots = parse_booked_slots([hora])
+        if not slots:
+            continue
+        end = slot_to_minutes(slots[-1]) + 20
+        index[proveedor].append({
+            'date': datetime.strptime(fecha, '%Y-%m-%d').date(),
+            'start': slots[0],
+            'end': f"{end // 60}:{end % 60:02d}",
+            'numero_bultos': _clean_cell(bultos) or '',
+            'orders': [orden.strip() for orden in str(_clean_cell(ordenes) or '').split(',') if orden.strip()],
+            'dock': parse_dock(anden),
+        })
+    for bookings in index.values():
+        bookings.sort(key=lambda booking: (booking['date'], slot_to_minutes(booking['start'])))
+    return dict(index)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _cached_supplier_booking_index(fingerprint, first_day, _reservas_df):
+    return build_supplier_booking_index(_reservas_df, first_day)
+
+def get_supplier_bookings(reservas_df, supplier_name):
+    """Upcoming bookings of one supplier, from an index built once per snapshot and day"""
+    index = _cached_supplier_booking_index(snapshot_key(reservas_df), datetime.now().date(), reservas_df)
+    return index.get(str(supplier_name).strip(), [])
+
+def render_my_bookings(reservas_df):
+    """'Mis reservas' panel with the logged-in supplier's upcoming deliveries"""
+    bookings = get_supplier_bookings(reservas_df, st.session_state.supplier_name)
+    with st.expander(f"📋 Mis reservas ({len(bookings)} próximas)"):
+        if not bookings:
+            st.caption("No tiene reservas próximas.")
+            return
+        rows = []
+        for booking in bookings:
+            row = {
+                'Fecha': booking['date'].strftime('%d/%m/%Y'),
+                'Horario': f"{booking['start']} - {booking['end']}",
+                'Bultos': booking['numero_bultos'],
+                'Órdenes de compra': ', '.join(booking['orders']),
+            }
+            if NUM_DOCKS > 1:
+                row['Andén'] = booking['dock']
+            rows.append(row)
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
 def authenticate_user(usuario, password):
     """Authenticate user against Google Sheets data and get email + CC emails"""
     credentials_df, _, _ = download_sheets_to_memory()
@@ -756,104 +2215,109 @@ def authenticate_user(usuario, password):
     if credentials_df is None:
         return False, "Error al cargar credenciales", None, None
     
-    # Clean and compare (all data is already strings)
-    df_usuarios = credentials_df['usuario'].str.strip()
-    
-    input_usuario = str(usuario).strip()
-    input_password = str(password).strip()
-    
-    # Find user row
-    user_row = credentials_df[df_usuarios == input_usuario]
-    if user_row.empty:
+    record = get_supplier_directory(credentials_df).get(str(usuario).strip())
+    if record is None:
         return False, "Usuario no encontrado", None, None
     
-    # Get stored password and clean it
-    stored_password = str(user_row.iloc[0]['password']).strip()
-    
-    # Compare passwords
-    if stored_password == input_password:
-        # Get email
-        email = None
-        try:
-            email = user_row.iloc[0]['Email']
-            if str(email) == 'nan' or email is None:
-                email = None
-        except:
-            email = None
-        
-        # Get CC emails
-        cc_emails = []
-        try:
-            cc_data = user_row.iloc[0]['cc']
-            if str(cc_data) != 'nan' and cc_data is not None and str(cc_data).strip():
-                # Parse semicolon-separated emails
-                cc_emails = [email.strip() for email in str(cc_data).split(';') if email.strip()]
-        except Exception as e:
-            cc_emails = []
-        
-        return True, "Autenticación exitosa", email, cc_emails
+    # Constant-time comparison of the password digests
+    if hmac.compare_digest(record.password_digest, _password_digest(password)):
+        return True, "Autenticación exitosa", record.email, list(record.cc_emails)
     
     return False, "Contraseña incorrecta", None, None
 
 # ─────────────────────────────────────────────────────────────
 # 6. Fresh slot validation function - MODIFIED FOR 20-MINUTE SLOTS
 # ─────────────────────────────────────────────────────────────
+@booking_priority()
 def check_slot_availability(selected_date, slot_time, numero_bultos):
     """Check if a specific slot is still available with fresh data from Google Sheets"""
     try:
         # Force fresh download
-        download_sheets_to_memory.clear()
-        _, fresh_reservas_df, _ = download_sheets_to_memory()
+        _, fresh_reservas_df, _ = download_fresh_sheets()
         
         if fresh_reservas_df is None:
             return False, "Error al verificar disponibilidad"
         
-        # Get booked slots for this date
-        target_date = selected_date.strftime('%Y-%m-%d')
-        date_mask = fresh_reservas_df['Fecha'].astype(str).str.contains(target_date, na=False)
-        booked_hours = fresh_reservas_df[date_mask]['Hora'].tolist()
-        
-        # Parse booked slots (handles combined slots)
-        booked_slots = parse_booked_slots(booked_hours)
+        # Dock occupancy for this date (handles combined slots)
+        occupancy = get_day_occupancy(fresh_reservas_df, selected_date)
+        window = get_window_slots(slot_time, get_slots_needed(numero_bultos))
         
-        if numero_bultos >= 8:
-            # For 8+ bultos, check current and next 2 slots (60 minutes)
-            slot1 = slot_time
-            slot2 = get_next_slot(slot1)
-            slot3 = get_next_slot(slot2)
-            
-            if slot1 in booked_slots:
-                return False, "Otro proveedor acaba de reservar este horario. Por favor, elija otro."
-            if slot2 in booked_slots:
+        # A slot is full once every dock is busy in it
+        if occupancy.get(window[0], 0) == ALL_DOCKS_MASK:
+            return False, "Otro proveedor acaba de reservar este horario. Por favor, elija otro."
+        if any(occupancy.get(slot, 0) == ALL_DOCKS_MASK for slot in window[1:]):
+            if len(window) == 3:
                 return False, "Uno de los horarios necesarios para su reserva de 60 minutos ya está ocupado."
-            if slot3 in booked_slots:
-                return False, "Uno de los horarios necesarios para su reserva de 60 minutos ya está ocupado."
-                
-        elif numero_bultos >= 4:
-            # For 4-7 bultos, check current and next slot (40 minutes)
-            slot1 = slot_time
-            slot2 = get_next_slot(slot1)
-            
-            if slot1 in booked_slots:
-                return False, "Otro proveedor acaba de reservar este horario. Por favor, elija otro."
-            if slot2 in booked_slots:
-                return False, "El horario siguiente necesario para su reserva de 40 minutos ya está ocupado."
-        else:
-            # For 1-3 bultos, check only current slot (20 minutes)
-            if slot_time in booked_slots:
-                return False, "Otro proveedor acaba de reservar este horario. Por favor, elija otro."
+            return False, "El horario siguiente necesario para su reserva de 40 minutos ya está ocupado."
+        
+        # Multi-slot deliveries must stay on the same dock for the whole window
+        if not free_docks_mask(occupancy, window):
+            return False, "No hay un andén libre durante todo el horario necesario para su reserva. Por favor, elija otro."
         
         return True, "Horario disponible"
         
     except Exception as e:
         return False, f"Error verificando disponibilidad: {str(e)}"
 
+def compute_slot_suggestions(selected_date, slot_time, numero_bultos):
+    """Rank alternatives for a rejected slot ({'numero_bultos', 'options'} or None)"""
+    _, reservas_df, _ = download_sheets_to_memory()
+    if reservas_df is None:
+        return None
+    
+    options = suggest_alternative_slots(reservas_df, numero_bultos, selected_date, slot_time)
+    log_booking_attempt("SLOT_SUGGESTIONS", f"{len(options)} alternatives for {selected_date} {slot_time}")
+    return {'numero_bultos': numero_bultos, 'options': options}
+
+def store_slot_suggestions(selected_date, slot_time, numero_bultos):
+    """Rank alternatives for a rejected slot and keep them in the session"""
+    st.session_state.slot_suggestions = compute_slot_suggestions(selected_date, slot_time, numero_bultos)
+
+def _apply_slot_suggestion(day, slot):
+    """Button callback: jump to the suggested date and preselect the slot"""
+    st.session_state.selected_date_input = day
+    st.session_state.selected_slot = slot
+    st.session_state.slot_error_message = None
+    st.session_state.slot_suggestions = None
+
+def render_slot_suggestions(numero_bultos, key_prefix):
+    """Show the stored alternatives as buttons (only for the bultos they were computed for)"""
+    suggestions = st.session_state.get('slot_suggestions')
+    if not suggestions or suggestions['numero_bultos'] != numero_bultos:
+        return
+    
+    if not suggestions['options']:
+        st.info("💡 No hay horarios alternativos disponibles en los próximos 30 días")
+        return
+    
+    st.write("💡 **Horarios alternativos más cercanos:**")
+    columns = st.columns(3)
+    for i, (day, slot) in enumerate(suggestions['options']):
+        with columns[i % 3]:
+            st.button(
+                f"📅 {day.strftime('%d/%m/%Y')} - 🕐 {slot}",
+                key=f"{key_prefix}_suggestion_{i}",
+                on_click=_apply_slot_suggestion,
+                args=(day, slot),
+                use_container_width=True
+            )
+
 # ─────────────────────────────────────────────────────────────
 # 7. Main App - MODIFIED FOR 20-MINUTE SLOTS
 # ─────────────────────────────────────────────────────────────
 def main():
+    # Kick off credentials and cache warm-up before rendering anything
+    start_prewarm()
+    start_metrics_server()
+    # Check-in events only exist with staff configured (or still spooled from a previous run)
+    if STAFF_USERS or ADMIN_USERS or (GESTION_SPOOL_PATH and os.path.exists(GESTION_SPOOL_PATH)
+                                       and os.path.getsize(GESTION_SPOOL_PATH)):
+        start_gestion_flusher()
+    start_email_digest_scheduler()
+    record_startup_timing("first_render")
+
     st.title("🚚 Dismac: Reserva de Entrega de Mercadería")
-    
+
     # Download Google Sheets data when app starts
     with st.spinner("Cargando datos..."):
         credentials_df, reservas_df, gestion_df = download_sheets_to_memory()
@@ -877,8 +2341,18 @@ def main():
         st.session_state.supplier_cc_emails = []
     if 'slot_error_message' not in st.session_state:
         st.session_state.slot_error_message = None
+    if 'slot_suggestions' not in st.session_state:
+        st.session_state.slot_suggestions = None
     if 'orden_compra_list' not in st.session_state:
         st.session_state.orden_compra_list = ['']
+    if 'confirmation_job_id' not in st.session_state:
+        st.session_state.confirmation_job_id = None
+    
+    # A confirmation in progress (or just finished) takes over the page, also after a reload
+    job_id = tracked_confirmation_job_id()
+    if job_id:
+        render_confirmation_job(job_id)
+        return
     
     # Authentication - UNCHANGED LOGIC
     if not st.session_state.authenticated:
@@ -930,8 +2404,27 @@ def main():
                     del st.session_state.selected_slot
                 st.rerun()
         
+        render_my_bookings(reservas_df)
+        
         st.markdown("---")
         
+        pages = ["📦 Reservar entrega", "🗓️ Reserva múltiple"]
+        if is_staff_user():
+            pages.append("🏭 Recepción")
+        if is_admin_user():
+            pages.append("📊 Indicadores")
+        if len(pages) > 1:
+            page = st.sidebar.radio("Página", pages)
+            if page == "🗓️ Reserva múltiple":
+                render_bulk_booking_page(reservas_df)
+                return
+            if page == "🏭 Recepción":
+                render_checkin_page(reservas_df, gestion_df)
+                return
+            if page == "📊 Indicadores":
+                render_kpi_dashboard()
+                return
+        
         # STEP 1: Delivery Information - MODIFIED INFO MESSAGE
         st.subheader("📦 Información de Entrega")
         st.markdown('<p style="color: red; font-size: 14px; margin-top: -10px;">Esta aplicación permite programar entregas <strong>exclusivamente de pedidos Marketplace</strong>.<br>Las compras locales o corporativas deben coordinarse directamente con el almacén.</p>', unsafe_allow_html=True)        
@@ -1010,11 +2503,22 @@ def main():
         today = datetime.now().date()
         max_date = today + timedelta(days=30)
         
+        # Keyed so that a suggested alternative can move the date picker
+        current_date = st.session_state.get('selected_date_input')
+        if current_date is None or not (today <= current_date <= max_date):
+            st.session_state.selected_date_input = today
+        
         selected_date = st.date_input(
             "Fecha de entrega",
             min_value=today,
             max_value=max_date,
-            value=today
+            key="selected_date_input"
+        )
+        
+        # Warm the grids of the dates the supplier is likely to look at next
+        snapshot_fingerprint = snapshot_key(reservas_df)
+        get_availability_prefetcher().prefetch(
+            snapshot_fingerprint, reservas_df, prefetch_dates(selected_date, today, max_date), get_slots_needed(numero_bultos)
         )
         
         # Check if Sunday
@@ -1028,60 +2532,11 @@ def main():
         # Show any persistent error message
         if st.session_state.slot_error_message:
             st.error(f"❌ {st.session_state.slot_error_message}")
-        
-        # Get ALL possible slots and determine availability - MODIFIED
-        weekday_slots, saturday_slots = generate_all_20min_slots()
-        
-        if selected_date.weekday() == 5:  # Saturday
-            all_20min_slots = saturday_slots
-        else:  # Monday-Friday
-            all_20min_slots = weekday_slots
-
-
-
-        # Special case: December 24, 2025 - only allow reservations until 3pm
-        if selected_date.year == 2025 and selected_date.month == 12 and selected_date.day == 24:
-            all_20min_slots = [slot for slot in all_20min_slots if int(slot.split(':')[0]) < 15]
-
-
-
-        # Get booked slots for this date
-        target_date = selected_date.strftime('%Y-%m-%d')
-        date_mask = reservas_df['Fecha'].astype(str).str.contains(target_date, na=False)
-        booked_hours = reservas_df[date_mask]['Hora'].tolist()
-        booked_slots = parse_booked_slots(booked_hours)
+            render_slot_suggestions(numero_bultos, key_prefix="grid")
         
         # Generate display slots based on bultos - MODIFIED FOR 20-MINUTE SLOTS
-        if numero_bultos >= 8:
-            # For 8+ bultos, show all possible 60-minute slots with availability
-            display_slots = []
-            slots_needed = 3
-            for i in range(len(all_20min_slots) - (slots_needed - 1)):
-                current_slot = all_20min_slots[i]
-                slots_to_check = [current_slot]
-                temp_slot = current_slot
-                for j in range(1, slots_needed):
-                    temp_slot = get_next_slot(temp_slot)
-                    if i + j < len(all_20min_slots) and all_20min_slots[i + j] == temp_slot:
-                        slots_to_check.append(temp_slot)
-                    else:
-                        break
-                if len(slots_to_check) == slots_needed:
-                    is_available = all(slot not in booked_slots for slot in slots_to_check)
-                    display_slots.append((current_slot, is_available))
-        elif numero_bultos >= 4:
-            # For 4-7 bultos, show all possible 40-minute slots with availability
-            display_slots = []
-            slots_needed = 2
-            for i in range(len(all_20min_slots) - (slots_needed - 1)):
-                current_slot = all_20min_slots[i]
-                next_slot = get_next_slot(current_slot)
-                if i + 1 < len(all_20min_slots) and all_20min_slots[i + 1] == next_slot:
-                    is_available = current_slot not in booked_slots and next_slot not in booked_slots
-                    display_slots.append((current_slot, is_available))
-        else:
-            # For 1-3 bultos, show all 20-minute slots with availability
-            display_slots = [(slot, slot not in booked_slots) for slot in all_20min_slots]
+        # 1-3 bultos = 20 minutes, 4-7 bultos = 40 minutes, 8+ bultos = 60 minutes
+        display_slots = get_display_slots(reservas_df, selected_date, numero_bultos, snapshot_fingerprint)
         
         if not display_slots:
             st.warning("❌ No hay horarios para esta fecha")
@@ -1116,8 +2571,11 @@ def main():
                         if is_available:
                             selected_slot = slot1
                             st.session_state.slot_error_message = None
+                            st.session_state.slot_suggestions = None
                         else:
                             st.session_state.slot_error_message = message
+                            count_event("slot_click_conflicts")
+                            store_slot_suggestions(selected_date, slot1, numero_bultos)
                             st.rerun()
             
             # Second slot (if exists)
@@ -1144,8 +2602,11 @@ def main():
                             if is_available:
                                 selected_slot = slot2
                                 st.session_state.slot_error_message = None
+                                st.session_state.slot_suggestions = None
                             else:
                                 st.session_state.slot_error_message = message
+                                count_event("slot_click_conflicts")
+                                store_slot_suggestions(selected_date, slot2, numero_bultos)
                                 st.rerun()
         
         # STEP 4: Enhanced Confirmation - MODIFIED FOR 20-MINUTE SLOTS
@@ -1165,36 +2626,682 @@ def main():
             
             # Confirm button
             if st.button("✅ Confirmar Reserva", use_container_width=True):
-                success = enhanced_confirmation_process(
-                    selected_date,
-                    st.session_state.selected_slot,
-                    numero_bultos,
-                    valid_orders,
-                    st.session_state.supplier_name,
-                    st.session_state.supplier_email,
-                    st.session_state.supplier_cc_emails
-                )
-                
-                if success:
-                    st.balloons()
-                    
-                    # Clear session data and log off user
-                    log_booking_attempt("SESSION_CLEANUP", f"Clearing session for {st.session_state.supplier_name}")
-                    st.session_state.orden_compra_list = ['']
-                    if 'numero_bultos_input' in st.session_state:
-                        del st.session_state.numero_bultos_input
-                    st.info("Cerrando sesión automáticamente...")
-                    st.session_state.authenticated = False
-                    st.session_state.supplier_name = None
-                    st.session_state.supplier_email = None
-                    st.session_state.supplier_cc_emails = []
-                    if 'selected_slot' in st.session_state:
-                        del st.session_state.selected_slot
-                    
-                    # Wait a moment then rerun
-                    time.sleep(2)
-                    st.rerun()
+                # Runs on the confirmation pool; this script thread is free right away
+                submit_confirmation_job(selected_date, st.session_state.selected_slot, numero_bultos, valid_orders)
+                st.rerun()
 
                     
+# ─────────────────────────────────────────────────────────────
+# 8. On-demand Profiling (admin only)
+# ─────────────────────────────────────────────────────────────
+class StackSampler:
+    """Samples one thread's Python stack from a background thread.
+
+    Stacks are aggregated in collapsed form ("outer;inner;leaf count"), which
+    flamegraph.pl, speedscope and inferno read directly.
+    """
+
+    def __init__(self, thread_id, interval_seconds):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stacks = defaultdict(int)
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="dismac-profiler", daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+    def top_functions(self, limit=15):
+        """[(function, self_samples, total_samples)] sorted by self time"""
+        self_samples = defaultdict(int)
+        total_samples = defaultdict(int)
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] += count
+            for function in set(frames):
+                total_samples[function] += count
+        ranked = sorted(self_samples, key=lambda function: -self_samples[function])[:limit]
+        return [(function, self_samples[function], total_samples[function]) for function in ranked]
+
+def is_profiling_requested():
+    """True when a logged-in admin's rerun carries the profiling token (one dict lookup otherwise)"""
+    if not PROFILE_TOKEN or not is_admin_user():
+        return False
+    requested = st.query_params.get("profile")
+    return bool(requested) and hmac.compare_digest(str(requested), str(PROFILE_TOKEN))
+
+@contextmanager
+def sample_stacks(label, reports):
+    """Sample the enclosed block on the current thread and append its report to ``reports``"""
+    sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{label}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.folded")
+        sampler.write_folded(path)
+        log_booking_attempt("PROFILE_WRITTEN", f"{label}: {sampler.samples} samples in {sampler.duration:.2f}s -> {path}")
+        reports.append({
+            'label': label,
+            'path': path,
+            'duration': sampler.duration,
+            'samples': sampler.samples,
+            'top': sampler.top_functions(),
+        })
+
+@contextmanager
+def profile_section(label):
+    """Sample the enclosed block when profiling is requested; a no-op otherwise"""
+    if not is_profiling_requested() or random.random() >= PROFILE_SAMPLE_RATE:
+        yield
+        return
+    
+    reports = st.session_state.setdefault('profile_reports', [])
+    try:
+        with sample_stacks(label, reports):
+            yield
+    finally:
+        del reports[:-5]
+
+def render_profile_reports():
+    """Show the hottest functions of the last profiled reruns (admins only)"""
+    if not is_profiling_requested() or not st.session_state.get('profile_reports'):
+        return
+    
+    with st.expander("🔬 Perfil de ejecución (admin)"):
+        for report in reversed(st.session_state.profile_reports):
+            st.markdown(f"**{report['label']}** - {report['duration']:.2f}s, {report['samples']} muestras - `{report['path']}`")
+            st.table(pd.DataFrame(report['top'], columns=['Función', 'Muestras propias', 'Muestras totales']))
+
+# ─────────────────────────────────────────────────────────────
+# 9. Background Confirmation Jobs
+# ─────────────────────────────────────────────────────────────
+class ConfirmationJob:
+    """Progress and outcome of one booking confirmation running on the job pool"""
+
+    def __init__(self, supplier_name, summary, profile=False):
+        self.id = uuid.uuid4().hex
+        self.supplier_name = supplier_name
+        self.summary = summary
+        self.profile = profile
+        self.state = "queued"  # queued -> running -> succeeded | failed
+        self.steps = []        # progress messages, oldest first
+        self.messages = []     # (kind, text) for st.success / st.error / st.warning / st.info
+        self.suggestions = None
+        self.profile_reports = []
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def progress(self, text):
+        with self._lock:
+            self.steps.append(text)
+
+    def notify(self, kind, text):
+        with self._lock:
+            self.messages.append((kind, text))
+
+    def start(self):
+        with self._lock:
+            self.state = "running"
+
+    def finish(self, succeeded):
+        with self._lock:
+            self.state = "succeeded" if succeeded else "failed"
+            self.finished_at = time.time()
+
+    @property
+    def done(self):
+        return self.state in ("succeeded", "failed")
+
+    def view(self):
+        """Consistent copy of the fields the polling fragment renders"""
+        with self._lock:
+            return {'state': self.state, 'steps': list(self.steps), 'messages': list(self.messages)}
+
+
+class ConfirmationJobRegistry:
+    """Worker pool plus the jobs of every session, so a reload can resume tracking"""
+
+    def __init__(self, max_workers, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.jobs = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dismac-confirm")
+        self._lock = threading.Lock()
+
+    def submit(self, job, process, *args):
+        """Run ``process(job, *args)`` on the pool"""
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        self._executor.submit(self._run, job, process, args)
+        count_event("confirmation_jobs_submitted")
+        log_booking_attempt("CONFIRMATION_JOB_SUBMITTED", f"{job.id} for {job.supplier_name}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _prune(self):
+        expired = time.time() - self.ttl_seconds
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done and job.finished_at < expired]:
+            del self.jobs[job_id]
+
+    def _run(self, job, process, args):
+        job.start()
+        succeeded = False
+        try:
+            with booking_context(supplier=job.supplier_name), \
+                    (sample_stacks("confirmation", job.profile_reports) if job.profile else nullcontext()):
+                succeeded = process(job, *args)
+        except Exception as e:
+            log_booking_attempt("CONFIRMATION_JOB_ERROR", job.id, success=False, error=str(e))
+            job.notify("error", "❌ Debido a errores de servidor, no se pudo concretar la reserva. Por favor intentar luego después de unos minutos (Error código 2)")
+        finally:
+            job.finish(succeeded)
+            log_booking_attempt("CONFIRMATION_JOB_FINISHED", f"{job.id}: {job.state}", success=succeeded)
+
+@st.cache_resource(show_spinner=False)
+def get_confirmation_jobs():
+    """Job registry shared by every session of this server process"""
+    return ConfirmationJobRegistry(CONFIRMATION_WORKERS, CONFIRMATION_JOB_TTL_SECONDS)
+
+def submit_confirmation_job(selected_date, selected_slot, numero_bultos, valid_orders):
+    """Queue the confirmation of the current session's booking and start tracking it"""
+    _, duration_text, _ = get_duration_and_slots_info(numero_bultos, selected_slot)
+    job = ConfirmationJob(
+        st.session_state.supplier_name,
+        summary=[
+            f"📅 Fecha: {selected_date}",
+            f"🕐 Horario: {selected_slot}{duration_text}",
+            f"📦 Número de bultos: {numero_bultos}",
+            f"📋 Órdenes de compra: {', '.join(valid_orders)}",
+        ],
+        profile=is_profiling_requested(),
+    )
+    get_confirmation_jobs().submit(
+        job,
+        enhanced_confirmation_process,
+        selected_date,
+        selected_slot,
+        numero_bultos,
+        valid_orders,
+        st.session_state.supplier_name,
+        st.session_state.supplier_email,
+        st.session_state.supplier_cc_emails
+    )
+    track_confirmation_job(job)
+    return job
+
+def submit_bulk_confirmation_job(plan):
+    """Queue a bulk plan (one write, one email) and start tracking it"""
+    job = ConfirmationJob(
+        st.session_state.supplier_name,
+        summary=[
+            f"{i}. 📅 {item['date'].strftime('%d/%m/%Y')} · 🕐 {item['slot']} · 📦 {item['numero_bultos']} bultos · 📋 {', '.join(item['orders'])}"
+            for i, item in enumerate(plan, start=1)
+        ],
+        profile=is_profiling_requested(),
+    )
+    get_confirmation_jobs().submit(
+        job,
+        bulk_confirmation_process,
+        plan,
+        st.session_state.supplier_name,
+        st.session_state.supplier_email,
+        st.session_state.supplier_cc_emails
+    )
+    track_confirmation_job(job)
+    return job
+
+def track_confirmation_job(job):
+    # The query parameter survives a reload, the session state does not
+    st.session_state.confirmation_job_id = job.id
+    st.query_params["job"] = job.id
+
+def tracked_confirmation_job_id():
+    """Job id being tracked by this session or carried in the URL"""
+    return st.session_state.get('confirmation_job_id') or st.query_params.get("job")
+
+def stop_tracking_confirmation_job():
+    st.session_state.confirmation_job_id = None
+    if "job" in st.query_params:
+        del st.query_params["job"]
+
+def clear_booking_session():
+    """Log the supplier off and reset the booking form"""
+    st.session_state.orden_compra_list = ['']
+    if 'numero_bultos_input' in st.session_state:
+        del st.session_state.numero_bultos_input
+    st.session_state.authenticated = False
+    st.session_state.supplier_name = None
+    st.session_state.supplier_email = None
+    st.session_state.supplier_cc_emails = []
+    if 'selected_slot' in st.session_state:
+        del st.session_state.selected_slot
+
+def render_confirmation_job(job_id):
+    """Confirmation page: polls the job while it runs, then shows its outcome"""
+    st.subheader("✅ Confirmar Reserva")
+    job = get_confirmation_jobs().get(job_id)
+    if job is None:
+        stop_tracking_confirmation_job()
+        st.warning("⚠️ No se encontró el estado de esta reserva (el servidor pudo haberse reiniciado). Revise su email de confirmación antes de reservar nuevamente.")
+        st.button("🔄 Continuar", use_container_width=True)
+        return
+    
+    for line in job.summary:
+        st.info(line)
+    
+    if not job.done:
+        # Poll without rerunning the whole page until the job finishes
+        st.fragment(_render_job_progress, run_every=CONFIRMATION_POLL_SECONDS)(job_id, polling=True)
+        return
+    
+    _render_job_progress(job_id, polling=False)
+    _render_job_outcome(job)
+
+def _render_job_progress(job_id, polling):
+    job = get_confirmation_jobs().get(job_id)
+    if job is None:
+        return
+    view = job.view()
+    if polling and view['state'] in ("succeeded", "failed"):
+        # Leave the fragment so the outcome renders once, without further polling
+        st.rerun()
+    
+    for i, step in enumerate(view['steps']):
+        is_current = i == len(view['steps']) - 1 and view['state'] == "running"
+        st.write(f"{'⏳' if is_current else '✔️'} {step}")
+    if view['state'] == "queued":
+        st.write("⏳ En cola...")
+
+def _render_job_outcome(job):
+    view = job.view()
+    for kind, text in view['messages']:
+        getattr(st, kind)(text)
+    if job.profile_reports:
+        st.session_state.setdefault('profile_reports', []).extend(job.profile_reports)
+        job.profile_reports = []
+    stop_tracking_confirmation_job()
+    
+    if view['state'] == "succeeded":
+        st.balloons()
+        
+        # Clear session data and log off user
+        log_booking_attempt("SESSION_CLEANUP", f"Clearing session for {job.supplier_name}")
+        clear_booking_session()
+        st.info("Cerrando sesión automáticamente...")
+        
+        # Wait a moment then rerun
+        time.sleep(2)
+        st.rerun()
+    
+    # Clear selected slot so user can try again
+    if 'selected_slot' in st.session_state:
+        del st.session_state.selected_slot
+    if st.session_state.get('authenticated') and job.suggestions:
+        st.session_state.slot_suggestions = job.suggestions
+        render_slot_suggestions(job.suggestions['numero_bultos'], key_prefix="confirm")
+    st.button("🔄 Volver", use_container_width=True)
+
+# ─────────────────────────────────────────────────────────────
+# 10. KPI Dashboard (admin only)
+# ─────────────────────────────────────────────────────────────
+@st.cache_resource(show_spinner=False)
+def get_gestion_kpis():
+    """Incremental KPI engine shared by every session of this server process"""
+    from gestion_kpis import GestionKPIEngine
+    return GestionKPIEngine()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def compute_gestion_kpis():
+    """KPI tables of the current proveedor_gestion snapshot (only new rows are processed)"""
+    _, _, gestion_df = download_sheets_to_memory()
+    engine = get_gestion_kpis()
+    with timed_stage("kpis.update"):
+        processed = engine.update(gestion_df)
+    log_booking_attempt("KPIS_UPDATED", f"{processed} new proveedor_gestion rows, {engine.rows_seen} total")
+    return {
+        'overview': engine.overview(),
+        'Proveedor': engine.summary("Proveedor"),
+        'semana': engine.summary("semana"),
+        'slot': engine.summary("slot"),
+    }
+
+def is_admin_user():
+    return bool(st.session_state.get('authenticated')) and st.session_state.get('supplier_name') in ADMIN_USERS
+
+def _slot_sort_key(index):
+    return index.map(lambda slot: slot_to_minutes(slot) if slot != "-" else 24 * 60)
+
+def _kpi_text(value, unit, digits=None):
+    """KPI with its unit, or '—' while there is nothing to measure (no completed deliveries)"""
+    if value is None or pd.isna(value):
+        return "—"
+    return f"{value:.{digits}f}{unit}" if digits is not None else f"{value}{unit}"
+
+def render_kpi_dashboard():
+    """Wait, service and delay KPIs from proveedor_gestion"""
+    st.subheader("📊 Indicadores de Recepción")
+    started = time.perf_counter()
+    kpis = compute_gestion_kpis()
+    overview = kpis['overview']
+    
+    if not overview['entregas']:
+        st.info("ℹ️ Aún no hay registros en proveedor_gestion")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Entregas", f"{overview['entregas']:,}")
+    col2.metric("Espera media", _kpi_text(overview['espera_media'], " min"),
+                help=f"p90: {_kpi_text(overview['espera_p90'], ' min', 0)}")
+    col3.metric("Atención media", _kpi_text(overview['atencion_media'], " min"),
+                help=f"p90: {_kpi_text(overview['atencion_p90'], ' min', 0)}")
+    col4.metric("Con retraso", _kpi_text(overview['pct_con_retraso'], "%"),
+                help=f"Retraso medio: {_kpi_text(overview['retraso_media'], ' min')}")
+    
+    tab_proveedor, tab_semana, tab_horario = st.tabs(["Por proveedor", "Por semana", "Por horario"])
+    with tab_proveedor:
+        st.dataframe(kpis['Proveedor'].sort_values("espera_media", ascending=False), use_container_width=True)
+    with tab_semana:
+        por_semana = kpis['semana'].sort_index()
+        st.line_chart(por_semana[["espera_media", "atencion_media", "retraso_media"]])
+        st.dataframe(por_semana, use_container_width=True)
+    with tab_horario:
+        por_horario = kpis['slot'].sort_index(key=_slot_sort_key)
+        st.bar_chart(por_horario[["espera_media", "atencion_media"]])
+        st.dataframe(por_horario, use_container_width=True)
+    
+    st.caption(f"Tiempos en minutos. Calculado en {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+# ─────────────────────────────────────────────────────────────
+# 11. Warehouse Check-in (staff only)
+# ─────────────────────────────────────────────────────────────
+GESTION_EVENT_BUTTONS = [("llegada", "🚚 Llegada"), ("inicio", "▶️ Inicio"), ("fin", "✅ Fin")]
+
+@st.cache_resource(show_spinner=False)
+def get_gestion_buffer():
+    """Check-in events waiting to be written, shared by every session of this server process"""
+    from gestion_events import GestionEventBuffer
+    return GestionEventBuffer(GESTION_SPOOL_PATH or None)
+
+def flush_gestion_events():
+    """Write every buffered check-in event to proveedor_gestion with one batch_update.
+
+    Returns the number of rows written, or None if the flush failed (events stay buffered).
+    """
+    from gestion_events import GESTION_COLUMNS, build_gestion_row
+    
+    buffer = get_gestion_buffer()
+    with buffer.flush_lock:
+        taken = buffer.take()
+        if not taken:
+            return 0
+        
+        try:
+            gc = get_sheets_client()
+            if not gc:
+                raise RuntimeError("Failed to connect to Google Sheets")
+            spreadsheet = open_spreadsheet(gc, "gestion.open_spreadsheet")
+            try:
+                gestion_ws = get_worksheet(spreadsheet, "proveedor_gestion", "gestion.worksheet")
+            except gspread.WorksheetNotFound:
+                gestion_ws = sheets_call("gestion.add_worksheet", spreadsheet.add_worksheet,
+                                         "proveedor_gestion", rows=100, cols=12)
+            all_values = sheets_call("gestion.get_all_values", gestion_ws.get_all_values)
+            
+            updates = []
+            if not all_values:
+                all_values = [GESTION_COLUMNS]
+                updates.append({'range': 'A1:L1', 'values': [GESTION_COLUMNS]})
+            header = all_values[0]
+            row_numbers = {row[0]: i + 1 for i, row in enumerate(all_values) if i and row and row[0]}
+            next_row = len(all_values) + 1
+            
+            for key, entry in taken.items():
+                row_number = row_numbers.get(key)
+                existing = dict(zip(header, all_values[row_number - 1])) if row_number else {}
+                if row_number is None:
+                    row_number = next_row
+                    next_row += 1
+                updates.append({
+                    'range': f'A{row_number}:L{row_number}',
+                    'values': [build_gestion_row(existing, entry['booking'], entry['events'])]
+                })
+            
+            sheets_call("gestion.batch_update", gestion_ws.batch_update, updates, value_input_option='RAW')
+        except Exception as e:
+            buffer.restore(taken, str(e))
+            count_event("gestion_flush_failures")
+            log_booking_attempt("GESTION_FLUSH_FAILED", f"{len(taken)} bookings kept in buffer", success=False, error=str(e))
+            return None
+        
+        buffer.flushed()
+    
+    count_event("gestion_flushes")
+    count_event("gestion_rows_written", len(taken))
+    log_booking_attempt("GESTION_FLUSHED", f"{len(taken)} rows written in one batch_update", success=True)
+    download_sheets_to_memory.clear()
+    return len(taken)
+
+def _gestion_flush_worker():
+    while True:
+        time.sleep(GESTION_FLUSH_SECONDS)
+        try:
+            if get_gestion_buffer().pending_count():
+                flush_gestion_events()
+        except Exception as e:
+            log_booking_attempt("GESTION_FLUSH_ERROR", "", error=str(e))
+
+@st.cache_resource(show_spinner=False)
+def start_gestion_flusher():
+    """Flush buffered check-in events every GESTION_FLUSH_SECONDS, once per server process"""
+    thread = threading.Thread(target=_gestion_flush_worker, name="dismac-gestion-flush", daemon=True)
+    thread.start()
+    return thread
+
+def is_staff_user():
+    return bool(st.session_state.get('authenticated')) and st.session_state.get('supplier_name') in STAFF_USERS | ADMIN_USERS
+
+def _record_gestion_event(booking, event):
+    """Button callback: buffer the event; it reaches the sheet with the next flush"""
+    time_text = get_gestion_buffer().record(booking, event)
+    start_gestion_flusher()
+    count_event("gestion_events")
+    log_booking_attempt("GESTION_EVENT", f"{event} {time_text} for {booking['Orden_de_compra']} ({booking['Proveedor']})")
+
+def _synced_gestion_events(gestion_df):
+    """{Orden_de_compra: {event: time}} already written to proveedor_gestion"""
+    from gestion_events import EVENT_COLUMNS
+    
+    synced = {}
+    if gestion_df is None or gestion_df.empty or 'Orden_de_compra' not in gestion_df.columns:
+        return synced
+    for row in gestion_df.to_dict('records'):
+        events = {event: str(row[column]) for event, column in EVENT_COLUMNS.items() if str(row.get(column, '')).strip()}
+        if events:
+            synced[str(row['Orden_de_compra'])] = events
+    return synced
+
+def render_checkin_page(reservas_df, gestion_df):
+    """Today's deliveries with arrival / start / end buttons for the dock staff"""
+    st.subheader("🏭 Recepción en Andén")
+    buffer = get_gestion_buffer()
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        pending = buffer.pending_count()
+        last_flush = buffer.last_flush.strftime('%H:%M:%S') if buffer.last_flush else "-"
+        st.caption(f"⏳ {pending} eventos pendientes de sincronizar · Última sincronización: {last_flush}")
+        if buffer.last_error:
+            st.warning(f"⚠️ La última sincronización falló; se reintentará automáticamente ({buffer.last_error})")
+    with col2:
+        if st.button("🔄 Sincronizar ahora", use_container_width=True, disabled=not pending):
+            written = flush_gestion_events()
+            if written is None:
+                st.error("❌ No se pudo sincronizar, los eventos siguen guardados localmente")
+            else:
+                st.rerun()
+    
+    today = datetime.now().date()
+    day_df = reservas_df[reservas_df['Fecha'].astype(str).str.contains(today.strftime('%Y-%m-%d'), na=False)]
+    if day_df.empty:
+        st.info("ℹ️ No hay reservas para hoy")
+        return
+    
+    synced = _synced_gestion_events(gestion_df)
+    records = sorted(day_df.to_dict('records'), key=lambda r: slot_to_minutes((parse_booked_slots([r['Hora']]) or ["23:59"])[0]))
+    for i, record in enumerate(records):
+        booking = {
+            'Fecha': str(record['Fecha']),
+            'Hora': str(record['Hora']),
+            'Proveedor': str(record['Proveedor']),
+            'Numero_de_bultos': str(record['Numero_de_bultos']),
+            'Orden_de_compra': str(record['Orden_de_compra']),
+        }
+        events = {**synced.get(booking['Orden_de_compra'], {}), **buffer.events_for(booking['Orden_de_compra'])}
+        first_slot = (parse_booked_slots([booking['Hora']]) or ["-"])[0]
+        dock_text = f" · Andén {parse_dock(record.get('Anden'))}" if NUM_DOCKS > 1 else ""
+        
+        columns = st.columns([3, 1, 1, 1])
+        columns[0].write(f"**{first_slot}** · {booking['Proveedor']} · {booking['Numero_de_bultos']} bultos · OC {booking['Orden_de_compra']}{dock_text}")
+        previous_done = True
+        for column, (event, label) in zip(columns[1:], GESTION_EVENT_BUTTONS):
+            with column:
+                if event in events:
+                    st.write(f"{label}: {events[event]}")
+                else:
+                    st.button(
+                        label,
+                        key=f"gestion_{event}_{i}",
+                        disabled=not previous_done,
+                        on_click=_record_gestion_event,
+                        args=(booking, event),
+                        use_container_width=True
+                    )
+            previous_done = event in events
+
+# ─────────────────────────────────────────────────────────────
+# 12. Bulk Booking
+# ─────────────────────────────────────────────────────────────
+BULK_MAX_DELIVERIES = 20
+
+def _read_bulk_plan(edited_df):
+    """Plan items from the editor rows (fully empty rows are ignored)"""
+    plan = []
+    for row in edited_df.to_dict('records'):
+        fecha, horario, bultos, ordenes = row.get('Fecha'), row.get('Horario'), row.get('Bultos'), row.get('Órdenes')
+        if all(pd.isna(value) or value == "" for value in (fecha, horario, bultos, ordenes)):
+            continue
+        plan.append({
+            'date': pd.Timestamp(fecha).date() if not pd.isna(fecha) else None,
+            'slot': horario if isinstance(horario, str) else None,
+            'numero_bultos': int(bultos) if not pd.isna(bultos) else 0,
+            'orders': [orden.strip() for orden in str(ordenes or "").split(',') if orden.strip()],
+        })
+    return plan
+
+def render_bulk_booking_page(reservas_df):
+    """Plan several deliveries, validate them together and confirm them in one write"""
+    st.subheader("🗓️ Reserva Múltiple")
+    st.info("ℹ️ Cargue todas sus entregas: se validan juntas, se guardan en una sola operación y recibirá un único email de confirmación. Separe varias órdenes de compra con comas.")
+    today = datetime.now().date()
+    weekday_slots, saturday_slots = generate_all_20min_slots()
+    
+    edited_df = st.data_editor(
+        pd.DataFrame({'Fecha': pd.Series(dtype='datetime64[ns]'), 'Horario': pd.Series(dtype=object),
+                      'Bultos': pd.Series(dtype='Int64'), 'Órdenes': pd.Series(dtype=object)}),
+        num_rows="dynamic",
+        key="bulk_plan_editor",
+        column_config={
+            'Fecha': st.column_config.DateColumn("Fecha", min_value=today, max_value=today + timedelta(days=30), format="DD/MM/YYYY"),
+            'Horario': st.column_config.SelectboxColumn(
+                "Horario", options=weekday_slots, help=f"Sábados: {saturday_slots[0]} a {saturday_slots[-1]}"
+            ),
+            'Bultos': st.column_config.NumberColumn("Bultos", min_value=1, step=1),
+            'Órdenes': st.column_config.TextColumn("Órdenes de compra"),
+        },
+        use_container_width=True
+    )
+    
+    plan = _read_bulk_plan(edited_df)
+    if not plan:
+        st.warning("⚠️ Agregue al menos una entrega al plan.")
+        return
+    if len(plan) > BULK_MAX_DELIVERIES:
+        st.warning(f"⚠️ Máximo {BULK_MAX_DELIVERIES} entregas por plan.")
+        return
+    # The Horario options are the weekday ones for every row: check each against its own date
+    off_schedule = []
+    for i, item in enumerate(plan, start=1):
+        if item['date'] is None:
+            continue
+        day_slots = get_slots_for_date(item['date'])
+        if not day_slots:
+            off_schedule.append(f"{i} (no trabajamos los domingos)")
+        elif item['slot'] is not None and item['slot'] not in day_slots:
+            off_schedule.append(f"{i} (ese día de {day_slots[0]} a {day_slots[-1]})")
+    if off_schedule:
+        st.error(f"❌ Horario no disponible en la fecha elegida para las entregas: {', '.join(off_schedule)}")
+        return
+    incomplete = [i + 1 for i, item in enumerate(plan) if item['date'] is None or item['slot'] is None]
+    if incomplete:
+        st.warning(f"⚠️ Complete fecha y horario de las entregas: {', '.join(map(str, incomplete))}")
+        return
+    
+    # Preview against the cached snapshot; the job re-validates against fresh data
+    results = validate_booking_plan(plan, reservas_df, st.session_state.supplier_name)
+    for i, (item, (booking, error)) in enumerate(zip(plan, results), start=1):
+        line = f"{i}. {item['date'].strftime('%d/%m/%Y')} · {item['slot']} · {item['numero_bultos']} bultos"
+        if error:
+            st.error(f"❌ {line}: {error}")
+        else:
+            dock_text = f" · Andén {booking['Anden']}" if NUM_DOCKS > 1 else ""
+            st.success(f"✅ {line}{dock_text}")
+    
+    if any(error for _, error in results):
+        st.warning("⚠️ Corrija las entregas marcadas para poder confirmar el plan.")
+        return
+    
+    if st.button(f"✅ Confirmar {len(plan)} reservas", use_container_width=True):
+        submit_bulk_confirmation_job(plan)
+        st.rerun()
+
+record_startup_timing("module_loaded")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        with profile_section("rerun"):
+            main()
+    finally:
+        render_profile_reports()
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Production logging for the booking app.
+
+The request thread only enqueues log records; a background QueueListener does
+the message formatting, JSON encoding and file I/O. Log files are rotated by
+size and age and rotated files are gzip-compressed, so disk usage stays
+bounded:
+
+    logs/booking_current.log           <- active file (JSON lines)
+    logs/booking_20260114_185804.log.gz <- rotated, compressed
+"""
+import atexit
+import glob
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+LOGGER_NAME = "dismac.booking"
+ACTIVE_LOG_NAME = "booking_current.log"
+
+# Fields passed through ``extra`` that are copied into every JSON record
+STRUCTURED_FIELDS = ("action", "details", "success", "error", "booking_id", "supplier")
+
+_booking_id = ContextVar("log_booking_id", default=None)
+_supplier = ContextVar("log_supplier", default=None)
+
+_listener = None
+
+
+@contextmanager
+def booking_context(booking_id=None, supplier=None):
+    """Attach a booking id and/or supplier to every record logged inside the block"""
+    tokens = []
+    if booking_id is not None:
+        tokens.append((_booking_id, _booking_id.set(booking_id)))
+    if supplier is not None:
+        tokens.append((_supplier, _supplier.set(supplier)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class _ContextFilter(logging.Filter):
+    """Copy the booking context onto the record while still on the calling thread"""
+
+    def filter(self, record):
+        if getattr(record, "booking_id", None) is None:
+            record.booking_id = _booking_id.get()
+        if getattr(record, "supplier", None) is None:
+            record.supplier = _supplier.get()
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never formats on the caller thread and never blocks on a full queue"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Message formatting is deferred to the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line with the structured booking fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BookingTextFormatter(logging.Formatter):
+    """Human-readable console format, matching the historical booking log lines"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(message)s")
+
+    def formatMessage(self, record):
+        message = super().formatMessage(record)
+        if getattr(record, "success", None) is not None:
+            message += f" | Success: {record.success}"
+        if getattr(record, "error", None):
+            message += f" | Error: {record.error}"
+        return message
+
+
+class CompressingRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """Rotates when the file exceeds ``max_bytes`` or is older than ``max_age_seconds``.
+
+    Rotated files are renamed to ``booking_<timestamp>.log.gz`` (gzip) and only the
+    newest ``backup_count`` of them are kept.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, max_age_seconds=24 * 3600, backup_count=30):
+        super().__init__(filename, "a", encoding="utf-8", delay=True)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.backup_count = backup_count
+        started = os.path.getmtime(filename) if os.path.exists(filename) else time.time()
+        self.rollover_at = started + max_age_seconds
+
+    def shouldRollover(self, record):
+        if self.max_age_seconds and time.time() >= self.rollover_at:
+            return True
+        if self.max_bytes:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() >= self.max_bytes:
+                return True
+        return False
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            log_dir = os.path.dirname(self.baseFilename)
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            target = os.path.join(log_dir, f"booking_{stamp}.log.gz")
+            suffix = 1
+            while os.path.exists(target):
+                target = os.path.join(log_dir, f"booking_{stamp}_{suffix}.log.gz")
+                suffix += 1
+            with open(self.baseFilename, "rb") as source, gzip.open(target, "wb") as compressed:
+                shutil.copyfileobj(source, compressed)
+            os.remove(self.baseFilename)
+            self._prune(log_dir)
+
+        self.rollover_at = time.time() + self.max_age_seconds
+        self.stream = self._open()
+
+    def _prune(self, log_dir):
+        rotated = sorted(glob.glob(os.path.join(log_dir, "booking_*.log.gz")), key=lambda path: (os.path.getmtime(path), path))
+        for path in rotated[:-self.backup_count] if self.backup_count else []:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def setup_booking_logging(log_dir="logs", level=logging.INFO, max_bytes=10 * 1024 * 1024,
+                          max_age_seconds=24 * 3600, backup_count=30, console=True, queue_size=10000):
+    """Configure the booking logger once per process and return it.
+
+    ``log_dir=None`` (or empty) disables the file handler. Safe to call on every
+    Streamlit rerun: later calls return the already configured logger.
+    """
+    global _listener
+    booking_logger = logging.getLogger(LOGGER_NAME)
+    if _listener is not None:
+        return booking_logger
+
+    handlers = []
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = CompressingRotatingFileHandler(
+            os.path.join(log_dir, ACTIVE_LOG_NAME),
+            max_bytes=max_bytes,
+            max_age_seconds=max_age_seconds,
+            backup_count=backup_count,
+        )
+        file_handler.setFormatter(JsonLineFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(BookingTextFormatter())
+        handlers.append(console_handler)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+
+    booking_logger.setLevel(level)
+    booking_logger.addHandler(queue_handler)
+    booking_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return booking_logger
+
+
+def dropped_record_count():
+    """Records dropped because the logging queue was full"""
+    for handler in logging.getLogger(LOGGER_NAME).handlers:
+        if isinstance(handler, _NonBlockingQueueHandler):
+            return handler.dropped
+    return 0
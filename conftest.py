@@ -0,0 +1,20 @@
+"""Shared pytest fixtures"""
+import logging
+import os
+
+import pytest
+
+import load_test
+
+
+@pytest.fixture(scope="session")
+def app():
+    """app.py imported headless (settings are read at import time)"""
+    os.environ.update({key: value for key, value in load_test.IMPORT_ENV.items() if key not in os.environ})
+    os.environ["LOG_DIR"] = ""
+    os.environ["SHEETS_PROCESSING_WAIT_SECONDS"] = "0"
+    # The fake has no quota; the API budgets count calls instead
+    os.environ["SHEETS_REQUESTS_PER_MINUTE"] = str(10 ** 6)
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import app
+    return app
@@ -0,0 +1,139 @@
+"""
+Pending daily digest of bookings for the internal mail recipients.
+
+In digest mode the internal inboxes get one summary of the day's bookings
+instead of a copy of every confirmation. Bookings are kept in memory and
+appended to a local JSON-lines file (so a restart does not lose them) until
+the app sends the day's digest at the scheduled time. A booking made after
+that time waits for the next day's digest, so each day's mail goes out once.
+
+The Streamlit app and api_server.py share the file: every operation holds an
+exclusive lock on it (a '.lock' file next to it) and re-reads it first, so one
+process never overwrites bookings queued by the other or sends them again.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, one process per spool file
+    fcntl = None
+
+DAY_FORMAT = '%Y-%m-%d'
+
+
+class EmailDigestQueue:
+    """Bookings waiting for their day's digest, spooled to a local file"""
+
+    def __init__(self, pending_path=None, send_time=None):
+        self.pending_path = pending_path
+        self.send_time = send_time
+        self.pending = {}  # 'YYYY-MM-DD' (day of the digest) -> [{'supplier', 'booking', 'time'}]
+        self.last_sent = None
+        self.last_error = None
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._lock_file = None
+        with self._locked():
+            pass
+
+    def digest_day(self, when):
+        """Day whose digest covers a booking made at ``when``: that day, or the next once it was sent"""
+        if self.send_time is not None and when.time() >= self.send_time:
+            when += timedelta(days=1)
+        return when.strftime(DAY_FORMAT)
+
+    @contextmanager
+    def _locked(self):
+        """Hold the queue (and the spool file's lock); the outermost entry re-reads the spool"""
+        with self._lock:
+            if self._depth == 0 and self.pending_path:
+                if fcntl is not None:
+                    self._lock_file = open(self.pending_path + '.lock', 'a')
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+                self.pending = {}
+                self._load_pending()
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and self._lock_file is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def sending(self):
+        """Held for a whole send so a day's digest never goes out twice, from any process"""
+        return self._locked()
+
+    def add(self, supplier_name, booking, when=None):
+        """Queue one saved booking for the next digest"""
+        with self._locked():
+            # Taken under the lock so a send never misses a booking of the day it empties
+            when = when or datetime.now()
+            day = self.digest_day(when)
+            record = {'supplier': supplier_name, 'booking': dict(booking), 'time': when.strftime('%Y-%m-%d %H:%M:%S')}
+            self.pending.setdefault(day, []).append(record)
+            self._append_pending({'day': day, **record})
+        return day
+
+    def pending_count(self):
+        with self._locked():
+            return sum(len(records) for records in self.pending.values())
+
+    def due_days(self, now):
+        """Days whose digest is due: earlier days, and today once the send time has passed"""
+        today = now.strftime(DAY_FORMAT)
+        with self._locked():
+            return sorted(day for day in self.pending
+                          if day < today or (day == today and (self.send_time is None or now.time() >= self.send_time)))
+
+    def take(self, day):
+        """Remove and return a day's bookings (inside sending(); restore() them if the send fails)"""
+        with self._locked():
+            return self.pending.pop(day, [])
+
+    def restore(self, day, records, error):
+        """Re-queue the bookings of a failed send ahead of those added meanwhile"""
+        with self._locked():
+            self.pending[day] = records + self.pending.get(day, [])
+            self.last_error = error
+
+    def sent(self):
+        """Mark a successful send and shrink the file to what is still pending"""
+        with self._locked():
+            self.last_sent = datetime.now()
+            self.last_error = None
+            self._rewrite_pending()
+
+    def _append_pending(self, record):
+        if not self.pending_path:
+            return
+        with open(self.pending_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+    def _rewrite_pending(self):
+        if not self.pending_path:
+            return
+        temporary = self.pending_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            for day, records in self.pending.items():
+                for record in records:
+                    f.write(json.dumps({'day': day, **record}, ensure_ascii=False, default=str) + '\n')
+        os.replace(temporary, self.pending_path)
+
+    def _load_pending(self):
+        if not self.pending_path or not os.path.exists(self.pending_path):
+            return
+        with open(self.pending_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                day = record.pop('day')
+                self.pending.setdefault(day, []).append(record)
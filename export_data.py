@@ -0,0 +1,284 @@
+"""
+Export proveedor_reservas and proveedor_gestion to CSV or Parquet files.
+
+Reads each worksheet in chunked ranges (--chunk-rows rows per API call, so a
+large sheet never times out as a single request), normalizes the types and
+writes every chunk out before the next is read, keeping memory bounded:
+
+    python export_data.py --from 2025-07-01 --to 2025-07-31
+    python export_data.py --format parquet --supplier Proveedor_001 --out exports/julio
+
+Reservations are written with the date as YYYY-MM-DD, the Hora split into
+start, end and duration in minutes, and bultos and dock as integers.
+proveedor_gestion has no date column, so a date filter keeps the gestion rows
+whose orders belong to a reservation in the range. Parquet needs pyarrow.
+"""
+import argparse
+import csv
+import functools
+import os
+import re
+import time
+from datetime import date, datetime
+
+from migrate_hora import column_letter
+
+# Dummy mail settings so app.py can be imported outside of Streamlit
+IMPORT_ENV = {
+    "MAIL_API_URL": "http://localhost/mail",
+    "MAIL_API_TOKEN": "export-data",
+    "MAIL_FROM_EMAIL": "export@localhost",
+    "MAIL_FROM_NAME": "Export Data",
+    "DISMAC_PREWARM": "0",
+}
+
+# Worksheet -> output columns and their types (date, int or string)
+EXPORT_COLUMNS = {
+    "proveedor_reservas": [
+        ("fecha", "date"), ("hora_inicio", "string"), ("hora_fin", "string"), ("duracion_min", "int"),
+        ("proveedor", "string"), ("numero_de_bultos", "int"), ("orden_de_compra", "string"), ("anden", "int"),
+    ],
+    "proveedor_gestion": [
+        ("orden_de_compra", "string"), ("proveedor", "string"), ("numero_de_bultos", "int"),
+        ("hora_llegada", "string"), ("hora_inicio_atencion", "string"), ("hora_fin_atencion", "string"),
+        ("tiempo_espera", "int"), ("tiempo_atencion", "int"), ("tiempo_total", "int"), ("tiempo_retraso", "int"),
+        ("numero_de_semana", "int"), ("hora_reserva_inicio", "string"), ("hora_reserva_fin", "string"),
+        ("duracion_reserva_min", "int"),
+    ],
+}
+
+_DATE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+_TIME = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$")
+
+
+def read_chunks(app, worksheet, chunk_rows):
+    """Header, then lists of row dicts, one range read per chunk"""
+    header = app.sheets_call("export.header", worksheet.get, "A1:Z1")
+    header = header[0] if header else []
+    if not header:
+        return
+    last_column = column_letter(len(header) - 1)
+    yield header
+    # The API drops trailing empty rows, so a short chunk may still have rows after a
+    # blank stretch; the grid size (worksheet metadata, no API call) bounds the reads
+    last_row = worksheet.row_count
+    for start in range(2, last_row + 1, chunk_rows):
+        end = min(start + chunk_rows - 1, last_row)
+        rows = app.sheets_call("export.get", worksheet.get, f"A{start}:{last_column}{end}")
+        yield [dict(zip(header, row)) for row in rows if any(cell.strip() for cell in row)]
+
+
+def to_int(value):
+    try:
+        return int(float(str(value).strip()))
+    except (TypeError, ValueError):
+        return None
+
+
+def to_time(value):
+    """'HH:MM:SS' of a time cell, or None"""
+    match = _TIME.match(str(value).strip())
+    if not match:
+        return None
+    return f"{int(match.group(1)):02d}:{match.group(2)}:{match.group(3) or '00'}"
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_fecha(value):
+    """Date of a 'YYYY-MM-DD[ 0:00:00]' cell, or None"""
+    match = _DATE.search(value)
+    return date.fromisoformat(match.group(1)) if match else None
+
+
+# Few distinct Hora values repeat across the whole history
+@functools.lru_cache(maxsize=4096)
+def hora_span(app, hora):
+    """(start 'H:MM', end 'H:MM', minutes) of a Hora cell in either format"""
+    intervals = app.booking_intervals(hora) if str(hora).strip() else []
+    if not intervals:
+        return None, None, None
+    start = intervals[0][0]
+    end = intervals[-1][0] + intervals[-1][1]
+    return f"{start // 60}:{start % 60:02d}", f"{end // 60}:{end % 60:02d}", sum(duration for _, duration in intervals)
+
+
+def order_numbers(value):
+    return {order.strip() for order in str(value).split(",") if order.strip()}
+
+
+def normalize_reserva(app, row):
+    start, end, minutes = hora_span(app, row.get("Hora", ""))
+    return {
+        "fecha": parse_fecha(str(row.get("Fecha", ""))),
+        "hora_inicio": start,
+        "hora_fin": end,
+        "duracion_min": minutes,
+        "proveedor": str(row.get("Proveedor", "")).strip(),
+        "numero_de_bultos": to_int(row.get("Numero_de_bultos")),
+        "orden_de_compra": str(row.get("Orden_de_compra", "")).strip(),
+        # Raw dock number: app.parse_dock() clamps to this host's NUM_DOCKS; rows from before docks are dock 1
+        "anden": to_int(row.get("Anden")) or 1,
+    }
+
+
+def normalize_gestion(app, row):
+    start, end, minutes = hora_span(app, row.get("hora_de_reserva", ""))
+    return {
+        "orden_de_compra": str(row.get("Orden_de_compra", "")).strip(),
+        "proveedor": str(row.get("Proveedor", "")).strip(),
+        "numero_de_bultos": to_int(row.get("Numero_de_bultos")),
+        "hora_llegada": to_time(row.get("Hora_llegada", "")),
+        "hora_inicio_atencion": to_time(row.get("Hora_inicio_atencion", "")),
+        "hora_fin_atencion": to_time(row.get("Hora_fin_atencion", "")),
+        "tiempo_espera": to_int(row.get("Tiempo_espera")),
+        "tiempo_atencion": to_int(row.get("Tiempo_atencion")),
+        "tiempo_total": to_int(row.get("Tiempo_total")),
+        "tiempo_retraso": to_int(row.get("Tiempo_retraso")),
+        "numero_de_semana": to_int(row.get("numero_de_semana")),
+        "hora_reserva_inicio": start,
+        "hora_reserva_fin": end,
+        "duracion_reserva_min": minutes,
+    }
+
+
+class CsvSink:
+    def __init__(self, path, columns):
+        self.names = [name for name, _ in columns]
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.names)
+
+    def write(self, records):
+        self.writer.writerows(
+            ["" if record[name] is None else record[name] for name in self.names] for record in records
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """One row group per chunk"""
+
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet export needs pyarrow (pip install pyarrow), or use --format csv")
+        types = {"date": pa.date32(), "int": pa.int64(), "string": pa.string()}
+        self.pa = pa
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, records):
+        if records:
+            self.writer.write_table(self.pa.Table.from_pylist(records, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def export_sheet(app, spreadsheet, title, sink, chunk_rows, keep=None):
+    """Stream one worksheet through ``keep`` (record -> bool) into ``sink``; (read, written) row counts"""
+    normalize = normalize_reserva if title == "proveedor_reservas" else normalize_gestion
+    worksheet = app.get_worksheet(spreadsheet, title, "export.worksheet")
+    read = written = 0
+    chunks = read_chunks(app, worksheet, chunk_rows)
+    next(chunks, None)  # header
+    for rows in chunks:
+        records = [normalize(app, row) for row in rows]
+        read += len(records)
+        records = [record for record in records if keep is None or keep(record)]
+        written += len(records)
+        if sink is not None:
+            sink.write(records)
+    return read, written
+
+
+def export(app, spreadsheet, out_dir, output_format, sheets, date_from=None, date_to=None, supplier=None,
+           chunk_rows=5000):
+    """Export the selected worksheets; {title: (path or None, rows read, rows written)}"""
+    os.makedirs(out_dir, exist_ok=True)
+    sink_class = ParquetSink if output_format == "parquet" else CsvSink
+    date_filtered = date_from is not None or date_to is not None
+    # Gestion rows are matched to the date range through the reservations' orders
+    orders = set() if date_filtered and "proveedor_gestion" in sheets else None
+    results = {}
+
+    def keep_reserva(record):
+        if supplier and record["proveedor"] != supplier:
+            return False
+        if date_filtered and record["fecha"] is None:
+            return False
+        if date_from and record["fecha"] < date_from:
+            return False
+        if date_to and record["fecha"] > date_to:
+            return False
+        if orders is not None:
+            orders.update(order_numbers(record["orden_de_compra"]))
+        return True
+
+    if "proveedor_reservas" in sheets or orders is not None:
+        title = "proveedor_reservas"
+        path = os.path.join(out_dir, f"{title}.{output_format}") if title in sheets else None
+        sink = sink_class(path, EXPORT_COLUMNS[title]) if path else None
+        try:
+            read, written = export_sheet(app, spreadsheet, title, sink, chunk_rows, keep_reserva)
+        finally:
+            if sink:
+                sink.close()
+        if path:
+            results[title] = (path, read, written)
+
+    if "proveedor_gestion" in sheets:
+        title = "proveedor_gestion"
+
+        def keep_gestion(record):
+            if supplier and record["proveedor"] != supplier:
+                return False
+            return orders is None or bool(order_numbers(record["orden_de_compra"]) & orders)
+
+        path = os.path.join(out_dir, f"{title}.{output_format}")
+        sink = sink_class(path, EXPORT_COLUMNS[title])
+        try:
+            read, written = export_sheet(app, spreadsheet, title, sink, chunk_rows, keep_gestion)
+        finally:
+            sink.close()
+        results[title] = (path, read, written)
+    return results
+
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError("use YYYY-MM-DD")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export reservations and gestion data to CSV or Parquet")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--out", default="exports", help="Output directory")
+    parser.add_argument("--sheets", nargs="+", choices=["reservas", "gestion"], default=["reservas", "gestion"])
+    parser.add_argument("--from", dest="date_from", type=parse_day, help="First reservation date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=parse_day, help="Last reservation date (YYYY-MM-DD)")
+    parser.add_argument("--supplier", help="Only this Proveedor")
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="Rows per range read")
+    args = parser.parse_args()
+
+    os.environ.update({key: value for key, value in IMPORT_ENV.items() if key not in os.environ})
+    import app
+    spreadsheet = app.open_spreadsheet(app.get_sheets_client(), "export.open_spreadsheet")
+    started = time.perf_counter()
+    results = export(
+        app, spreadsheet, args.out, args.format, [f"proveedor_{sheet}" for sheet in args.sheets],
+        args.date_from, args.date_to, args.supplier, max(1, args.chunk_rows)
+    )
+    for title, (path, read, written) in results.items():
+        print(f"{title}: {written} of {read} rows -> {path}")
+    print(f"Done in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
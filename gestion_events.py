@@ -0,0 +1,152 @@
+"""
+Buffer for warehouse check-in/check-out events (proveedor_gestion).
+
+Dock staff record arrival, start and end of service for each booking. The
+events are kept in memory and appended to a local JSON-lines spool (so a
+restart does not lose them) until the app flushes them to the sheet in one
+batched update. Rows are rebuilt from the merged events with the
+``Tiempo_*`` columns computed on write.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+GESTION_COLUMNS = [
+    'Orden_de_compra', 'Proveedor', 'Numero_de_bultos',
+    'Hora_llegada', 'Hora_inicio_atencion', 'Hora_fin_atencion',
+    'Tiempo_espera', 'Tiempo_atencion', 'Tiempo_total', 'Tiempo_retraso',
+    'numero_de_semana', 'hora_de_reserva'
+]
+
+# Event name -> column holding its time
+EVENT_COLUMNS = {
+    'llegada': 'Hora_llegada',
+    'inicio': 'Hora_inicio_atencion',
+    'fin': 'Hora_fin_atencion',
+}
+
+TIME_FORMAT = '%H:%M:%S'
+
+
+def _minutes(value):
+    """Minutes after midnight of an 'H:MM[:SS]' string (or the start of a Hora value), or None"""
+    try:
+        parts = [int(part) for part in str(value).strip().split(',')[0].split('+')[0].strip().split(':')]
+    except ValueError:
+        return None
+    if len(parts) < 2:
+        return None
+    return parts[0] * 60 + parts[1] + (parts[2] / 60 if len(parts) > 2 else 0)
+
+
+def _difference(end, start):
+    end_minutes, start_minutes = _minutes(end), _minutes(start)
+    if end_minutes is None or start_minutes is None:
+        return ''
+    return round(end_minutes - start_minutes)
+
+
+def build_gestion_row(existing, booking, events):
+    """Full proveedor_gestion row from the sheet row (dict, may be empty) plus new events"""
+    row = {column: str(existing.get(column, '')) for column in GESTION_COLUMNS}
+    row['Orden_de_compra'] = booking['Orden_de_compra']
+    row['Proveedor'] = booking['Proveedor'] or row['Proveedor']
+    row['Numero_de_bultos'] = str(booking.get('Numero_de_bultos', '') or row['Numero_de_bultos'])
+    row['hora_de_reserva'] = booking.get('Hora', '') or row['hora_de_reserva']
+    if booking.get('Fecha'):
+        row['numero_de_semana'] = str(datetime.strptime(booking['Fecha'][:10], '%Y-%m-%d').isocalendar()[1])
+
+    for event, column in EVENT_COLUMNS.items():
+        if event in events:
+            row[column] = events[event]
+
+    row['Tiempo_espera'] = _difference(row['Hora_inicio_atencion'], row['Hora_llegada'])
+    row['Tiempo_atencion'] = _difference(row['Hora_fin_atencion'], row['Hora_inicio_atencion'])
+    row['Tiempo_total'] = _difference(row['Hora_fin_atencion'], row['Hora_llegada'])
+    row['Tiempo_retraso'] = _difference(row['Hora_llegada'], row['hora_de_reserva'])
+    return [row[column] for column in GESTION_COLUMNS]
+
+
+class GestionEventBuffer:
+    """Pending check-in/check-out events per booking, spooled to a local file"""
+
+    def __init__(self, spool_path=None):
+        self.spool_path = spool_path
+        self.pending = {}  # Orden_de_compra -> {'booking': {...}, 'events': {event: 'HH:MM:SS'}}
+        self.last_flush = None
+        self.last_error = None
+        # Held for a whole flush so two flushes never append to the same sheet row
+        self.flush_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._load_spool()
+
+    def record(self, booking, event, when=None):
+        """Buffer one event (llegada, inicio or fin) for a booking"""
+        if event not in EVENT_COLUMNS:
+            raise ValueError(f"Unknown gestion event: {event}")
+        time_text = (when or datetime.now()).strftime(TIME_FORMAT)
+        with self._lock:
+            entry = self.pending.setdefault(booking['Orden_de_compra'], {'booking': dict(booking), 'events': {}})
+            entry['events'][event] = time_text
+            self._append_spool({'booking': entry['booking'], 'event': event, 'time': time_text})
+        return time_text
+
+    def events_for(self, key):
+        with self._lock:
+            entry = self.pending.get(key)
+            return dict(entry['events']) if entry else {}
+
+    def pending_count(self):
+        with self._lock:
+            return sum(len(entry['events']) for entry in self.pending.values())
+
+    def take(self):
+        """Remove and return everything pending (put it back with restore() if the flush fails)"""
+        with self._lock:
+            taken, self.pending = self.pending, {}
+            return taken
+
+    def restore(self, taken, error):
+        """Re-queue events of a failed flush; events recorded meanwhile win"""
+        with self._lock:
+            for key, entry in taken.items():
+                current = self.pending.setdefault(key, {'booking': entry['booking'], 'events': {}})
+                current['events'] = {**entry['events'], **current['events']}
+            self.last_error = error
+
+    def flushed(self):
+        """Mark a successful flush and shrink the spool to what is still pending"""
+        with self._lock:
+            self.last_flush = datetime.now()
+            self.last_error = None
+            self._rewrite_spool()
+
+    def _append_spool(self, record):
+        if not self.spool_path:
+            return
+        with open(self.spool_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _rewrite_spool(self):
+        if not self.spool_path:
+            return
+        temporary = self.spool_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            for entry in self.pending.values():
+                for event, time_text in entry['events'].items():
+                    f.write(json.dumps({'booking': entry['booking'], 'event': event, 'time': time_text}, ensure_ascii=False) + '\n')
+        os.replace(temporary, self.spool_path)
+
+    def _load_spool(self):
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                booking = record['booking']
+                entry = self.pending.setdefault(booking['Orden_de_compra'], {'booking': booking, 'events': {}})
+                entry['events'][record['event']] = record['time']
@@ -0,0 +1,242 @@
+"""
+KPIs of the proveedor_gestion sheet (wait, service and delay times).
+
+Rows are normalized with vectorized pandas operations and folded into
+aggregates that are updated incrementally: when the sheet only grew since
+the last update, just the appended rows are processed. Means come from
+per-(supplier, week, slot) sums and percentiles from 1-minute histograms
+kept per supplier, week and slot, so a dashboard refresh never rescans
+the full history:
+
+    engine = GestionKPIEngine()
+    engine.update(gestion_df)
+    engine.summary("Proveedor")
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Histogram range in minutes; values outside are counted in the edge bins
+BIN_MIN = -120
+BIN_MAX = 600
+NUM_BINS = BIN_MAX - BIN_MIN + 1
+
+DIMENSIONS = ("Proveedor", "semana", "slot")
+
+# KPI name -> proveedor_gestion column holding it (in minutes or H:MM:SS)
+METRICS = {
+    "espera": "Tiempo_espera",
+    "atencion": "Tiempo_atencion",
+    "retraso": "Tiempo_retraso",
+}
+
+# Arrivals later than this many minutes after the booked slot count as delayed
+DELAY_TOLERANCE_MINUTES = 0
+
+
+def _parse_unique(series, parse):
+    """Apply ``parse`` to the distinct values only; time columns repeat a lot"""
+    codes, uniques = pd.factorize(series)
+    parsed = parse(pd.Series(uniques, dtype=object)).to_numpy(dtype=float)
+    return pd.Series(np.where(codes >= 0, parsed[codes], np.nan), index=series.index)
+
+
+def _durations(values):
+    minutes = pd.to_numeric(values, errors="coerce")
+    missing = minutes.isna()
+    if missing.any():
+        text = values[missing].astype(str).str.strip()
+        negative = text.str.startswith("-")
+        parsed = pd.to_timedelta(text.str.lstrip("-"), errors="coerce").dt.total_seconds() / 60
+        minutes[missing] = parsed.where(~negative, -parsed)
+    return minutes
+
+
+def _times_of_day(values):
+    text = values.astype(str).str.strip()
+    minutes = pd.to_timedelta(text, errors="coerce").dt.total_seconds() / 60
+    missing = minutes.isna()
+    if missing.any():
+        parsed = pd.to_datetime(text[missing], errors="coerce", format="mixed")
+        minutes[missing] = parsed.dt.hour * 60 + parsed.dt.minute + parsed.dt.second / 60
+    return minutes
+
+
+def duration_minutes(series):
+    """Durations as float minutes from numbers (minutes) or 'H:MM:SS' strings"""
+    return _parse_unique(series, _durations)
+
+
+def time_of_day_minutes(series):
+    """Minutes after midnight from 'H:MM[:SS]' or full datetime strings"""
+    return _parse_unique(series, _times_of_day)
+
+
+def normalize_gestion(gestion_df):
+    """One row per delivery with Proveedor, semana, slot and the KPI minutes"""
+    df = gestion_df
+    frame = pd.DataFrame(index=df.index)
+    frame["Proveedor"] = df.get("Proveedor", pd.Series("", index=df.index)).astype(str).str.strip()
+    frame["semana"] = pd.to_numeric(df.get("numero_de_semana"), errors="coerce").fillna(0).astype("int64")
+
+    # Booked slot: start of hora_de_reserva ('H:MM+minutes' or comma-joined slots), as 'H:MM'
+    reserved = _parse_unique(
+        df.get("hora_de_reserva", pd.Series("", index=df.index)),
+        lambda values: _times_of_day(values.astype(str).str.split(r"[,+]", regex=True).str[0])
+    )
+    frame["slot"] = _format_slot(reserved)
+
+    for kpi, column in METRICS.items():
+        frame[kpi] = duration_minutes(df[column]) if column in df.columns else np.nan
+
+    # Fill missing durations from the recorded timestamps
+    if {"Hora_llegada", "Hora_inicio_atencion", "Hora_fin_atencion"} <= set(df.columns):
+        llegada = time_of_day_minutes(df["Hora_llegada"])
+        inicio = time_of_day_minutes(df["Hora_inicio_atencion"])
+        fin = time_of_day_minutes(df["Hora_fin_atencion"])
+        frame["espera"] = frame["espera"].fillna(inicio - llegada)
+        frame["atencion"] = frame["atencion"].fillna(fin - inicio)
+        frame["retraso"] = frame["retraso"].fillna(llegada - reserved)
+
+    return frame[frame["Proveedor"] != ""]
+
+
+def _format_slot(minutes):
+    valid = minutes.notna()
+    whole = minutes.fillna(0).astype("int64")
+    slots = (whole // 60).astype(str) + ":" + (whole % 60).astype(str).str.zfill(2)
+    return slots.where(valid, "-")
+
+
+class _DimensionHistogram:
+    """1-minute histograms of each KPI for every value of one dimension"""
+
+    def __init__(self):
+        self.keys = pd.Index([])
+        self.counts = {kpi: np.zeros((0, NUM_BINS), dtype=np.int64) for kpi in METRICS}
+
+    def add(self, values, frame):
+        new_keys = pd.Index(values.unique()).difference(self.keys)
+        if len(new_keys):
+            self.keys = self.keys.append(new_keys)
+            for kpi in METRICS:
+                self.counts[kpi] = np.vstack([self.counts[kpi], np.zeros((len(new_keys), NUM_BINS), dtype=np.int64)])
+
+        rows = self.keys.get_indexer(values)
+        for kpi in METRICS:
+            minutes = frame[kpi].to_numpy()
+            valid = ~np.isnan(minutes)
+            bins = np.clip(np.rint(minutes[valid]).astype(np.int64), BIN_MIN, BIN_MAX) - BIN_MIN
+            np.add.at(self.counts[kpi], (rows[valid], bins), 1)
+
+    def percentiles(self, kpi, q):
+        """Series of the q-th percentile (0-100) per dimension value"""
+        counts = self.counts[kpi]
+        totals = counts.sum(axis=1)
+        cumulative = counts.cumsum(axis=1)
+        target = np.ceil(totals * q / 100).clip(min=1)
+        index = (cumulative >= target[:, None]).argmax(axis=1)
+        values = np.where(totals > 0, index + BIN_MIN, np.nan).astype(float)
+        return pd.Series(values, index=self.keys)
+
+    def overall_percentile(self, kpi, q):
+        counts = self.counts[kpi].sum(axis=0)
+        total = counts.sum()
+        if not total:
+            return np.nan
+        return float(np.searchsorted(counts.cumsum(), max(1, np.ceil(total * q / 100))) + BIN_MIN)
+
+
+class GestionKPIEngine:
+    """Incrementally maintained wait/service/delay aggregates of proveedor_gestion"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.rows_seen = 0
+        self._prefix_hash = 0
+        self.totals = None
+        self.histograms = {dimension: _DimensionHistogram() for dimension in DIMENSIONS}
+
+    def update(self, gestion_df):
+        """Fold the rows appended since the last call; rebuild if earlier rows changed.
+
+        Returns the number of rows processed.
+        """
+        with self._lock:
+            if gestion_df is None or gestion_df.empty:
+                self._reset()
+                return 0
+
+            row_hashes = pd.util.hash_pandas_object(gestion_df, index=False).to_numpy()
+            if len(gestion_df) < self.rows_seen or int(row_hashes[:self.rows_seen].sum()) != self._prefix_hash:
+                self._reset()
+
+            new_rows = gestion_df.iloc[self.rows_seen:]
+            if len(new_rows):
+                self._fold(normalize_gestion(new_rows))
+            self.rows_seen = len(gestion_df)
+            self._prefix_hash = int(row_hashes.sum())
+            return len(new_rows)
+
+    def _fold(self, frame):
+        if frame.empty:
+            return
+        frame = frame.assign(
+            entregas=1,
+            con_retraso=(frame["retraso"] > DELAY_TOLERANCE_MINUTES).astype("int64"),
+            **{f"{kpi}_n": frame[kpi].notna().astype("int64") for kpi in METRICS},
+            **{f"{kpi}_sum": frame[kpi].fillna(0) for kpi in METRICS},
+        )
+        sum_columns = ["entregas", "con_retraso"] + [f"{kpi}_{part}" for kpi in METRICS for part in ("n", "sum")]
+        grouped = frame.groupby(list(DIMENSIONS))
+        new_totals = grouped[sum_columns].sum()
+        for kpi in METRICS:
+            new_totals[f"{kpi}_max"] = grouped[kpi].max()
+
+        if self.totals is None:
+            self.totals = new_totals
+        else:
+            combined = pd.concat([self.totals, new_totals])
+            aggregations = {column: "sum" for column in sum_columns}
+            aggregations.update({f"{kpi}_max": "max" for kpi in METRICS})
+            self.totals = combined.groupby(level=list(range(len(DIMENSIONS)))).agg(aggregations)
+
+        for dimension in DIMENSIONS:
+            self.histograms[dimension].add(frame[dimension], frame)
+
+    def summary(self, dimension):
+        """KPI table per value of ``dimension`` (Proveedor, semana or slot)"""
+        with self._lock:
+            if self.totals is None:
+                return pd.DataFrame()
+            totals = self.totals.groupby(level=dimension).sum()
+            maxima = self.totals.groupby(level=dimension)[[f"{kpi}_max" for kpi in METRICS]].max()
+            table = pd.DataFrame({"entregas": totals["entregas"]})
+            histogram = self.histograms[dimension]
+            for kpi in METRICS:
+                table[f"{kpi}_media"] = (totals[f"{kpi}_sum"] / totals[f"{kpi}_n"].replace(0, np.nan)).round(1)
+                table[f"{kpi}_p50"] = histogram.percentiles(kpi, 50).reindex(table.index)
+                table[f"{kpi}_p90"] = histogram.percentiles(kpi, 90).reindex(table.index)
+                table[f"{kpi}_max"] = maxima[f"{kpi}_max"].round(1)
+            table["pct_con_retraso"] = (totals["con_retraso"] / totals["retraso_n"].replace(0, np.nan) * 100).round(1)
+            return table
+
+    def overview(self):
+        """Headline KPIs over all deliveries"""
+        with self._lock:
+            if self.totals is None:
+                return {"entregas": 0}
+            totals = self.totals.sum()
+            histogram = self.histograms["Proveedor"]
+            overview = {"entregas": int(totals["entregas"])}
+            for kpi in METRICS:
+                n = totals[f"{kpi}_n"]
+                overview[f"{kpi}_media"] = round(totals[f"{kpi}_sum"] / n, 1) if n else None
+                overview[f"{kpi}_p90"] = histogram.overall_percentile(kpi, 90)
+            n = totals["retraso_n"]
+            overview["pct_con_retraso"] = round(totals["con_retraso"] / n * 100, 1) if n else None
+            return overview
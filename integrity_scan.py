@@ -0,0 +1,209 @@
+"""
+Integrity scan of proveedor_reservas: overlapping and duplicate reservations.
+
+Every booking becomes one interval per compact Hora ('H:MM+minutes') or one
+per 20-minute slot of a legacy comma-joined Hora; the intervals are
+sorted by (date, dock, start) and swept with a running maximum of the end time,
+all in vectorized pandas/numpy, so the whole history is checked in seconds:
+
+    python integrity_scan.py                     # live sheet (app.py settings)
+    python integrity_scan.py reservas.csv --docks 2 --json
+
+Duplicates are rows repeating date, Hora, Proveedor and Orden_de_compra (e.g.
+a save retry that appended twice); conflicts are different bookings sharing
+a dock at the same time. Rows are reported with their sheet row number.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SLOT_MINUTES = 20
+DUPLICATE_KEY = ["fecha", "hora", "Proveedor", "Orden_de_compra"]
+
+# Dummy mail settings so app.py can be imported outside of Streamlit
+IMPORT_ENV = {
+    "MAIL_API_URL": "http://localhost/mail",
+    "MAIL_API_TOKEN": "integrity-scan",
+    "MAIL_FROM_EMAIL": "integrity@localhost",
+    "MAIL_FROM_NAME": "Integrity Scan",
+    "DISMAC_PREWARM": "0",
+}
+
+
+def load_sheet_rows():
+    """proveedor_reservas as a DataFrame of strings, indexed by sheet row number"""
+    os.environ.update({key: value for key, value in IMPORT_ENV.items() if key not in os.environ})
+    import app
+    spreadsheet = app.open_spreadsheet(app.get_sheets_client(), "integrity.open_spreadsheet")
+    worksheet = app.get_worksheet(spreadsheet, "proveedor_reservas", "integrity.worksheet")
+    values = app.sheets_call("integrity.get_all_values", worksheet.get_all_values)
+    return rows_to_frame(values[0], values[1:])
+
+
+def load_csv_rows(path):
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return rows_to_frame(list(df.columns), df.values.tolist())
+
+
+def rows_to_frame(header, rows):
+    df = pd.DataFrame(rows, columns=header[:len(rows[0])] if rows else header, dtype=str)
+    df.index = pd.RangeIndex(2, len(df) + 2, name="fila")
+    return df
+
+
+def normalize(df, num_docks):
+    """One row per booking with fecha, normalized hora and dock"""
+    bookings = pd.DataFrame(index=df.index)
+    bookings["fecha"] = df["Fecha"].astype(str).str.extract(r"(\d{4}-\d{2}-\d{2})", expand=False)
+    bookings["hora"] = df["Hora"].astype(str).str.strip()
+    bookings["Proveedor"] = df.get("Proveedor", pd.Series("", index=df.index)).astype(str).str.strip()
+    bookings["Orden_de_compra"] = df.get("Orden_de_compra", pd.Series("", index=df.index)).astype(str).str.strip()
+    # Same rule as app.parse_dock: missing or out-of-range docks are dock 1
+    dock = pd.to_numeric(df["Anden"], errors="coerce") if "Anden" in df.columns else pd.Series(np.nan, index=df.index)
+    bookings["dock"] = dock.where(dock.between(1, num_docks), 1).fillna(1).astype("int64")
+    return bookings[bookings["fecha"].notna() & (bookings["hora"] != "")]
+
+
+def explode_intervals(bookings, raw_hours):
+    """[start, end) minute intervals keyed by sheet row: one per compact 'H:MM+minutes'
+    Hora, one per slot for the legacy comma-joined format"""
+    hours = raw_hours.loc[bookings.index].astype(str).str.strip()
+    compact = hours.str.extract(r"^(\d{1,2}):(\d{2})(?::\d{2})?\s*\+\s*(\d+)$")
+    is_compact = compact[0].notna()
+    compact = compact[is_compact].astype("int64")
+    compact_start = compact[0] * 60 + compact[1]
+
+    slots = hours[~is_compact].str.split(",").explode().str.strip()
+    parts = slots.str.extract(r"^(\d{1,2}):(\d{2})")
+    parts = parts[parts[0].notna()].astype("int64")
+    slot_start = parts[0] * 60 + parts[1]
+
+    intervals = pd.DataFrame({
+        "fila": np.concatenate([compact_start.index.to_numpy(), slot_start.index.to_numpy()]),
+        "start": np.concatenate([compact_start.to_numpy(), slot_start.to_numpy()]),
+        "end": np.concatenate([(compact_start + compact[2]).to_numpy(), (slot_start + SLOT_MINUTES).to_numpy()]),
+    })
+    intervals["fecha"] = bookings.loc[intervals["fila"], "fecha"].to_numpy()
+    intervals["dock"] = bookings.loc[intervals["fila"], "dock"].to_numpy()
+    return intervals
+
+
+def sweep_overlaps(intervals):
+    """Overlapping pairs of different bookings on the same date and dock.
+
+    Each interval is paired with the earlier one reaching furthest, so every
+    booking involved in an overlap is reported at least once.
+    """
+    ordered = intervals.sort_values(["fecha", "dock", "start", "end"], kind="stable").reset_index(drop=True)
+    group = (ordered["fecha"] != ordered["fecha"].shift()) | (ordered["dock"] != ordered["dock"].shift())
+    group_id = group.cumsum()
+
+    # Running max end of the earlier intervals in the group, and the booking holding it
+    running_end = ordered.groupby(group_id)["end"].cummax()
+    holder = ordered["fila"].where(ordered["end"] == running_end).groupby(group_id).ffill()
+    previous_end = running_end.groupby(group_id).shift()
+    previous_holder = holder.groupby(group_id).shift()
+
+    overlapping = (ordered["start"] < previous_end) & (previous_holder != ordered["fila"])
+    pairs = pd.DataFrame({
+        "fila": ordered.loc[overlapping, "fila"].to_numpy(),
+        "fila_previa": previous_holder[overlapping].astype("int64").to_numpy(),
+        "fecha": ordered.loc[overlapping, "fecha"].to_numpy(),
+        "dock": ordered.loc[overlapping, "dock"].to_numpy(),
+        "start": ordered.loc[overlapping, "start"].to_numpy(),
+    })
+    pairs["primera"] = pairs[["fila", "fila_previa"]].min(axis=1)
+    pairs["segunda"] = pairs[["fila", "fila_previa"]].max(axis=1)
+    return pairs.groupby(["primera", "segunda"], as_index=False).agg(
+        fecha=("fecha", "first"), dock=("dock", "first"), start=("start", "min"), slots=("start", "size"))
+
+
+def scan(df, num_docks=1):
+    """Duplicate groups and dock conflicts of a proveedor_reservas frame"""
+    bookings = normalize(df, num_docks)
+    intervals = explode_intervals(bookings, df["Hora"])
+
+    # Compare Hora in one canonical 'H:MM+minutes' form, whichever format each row uses
+    span = intervals.groupby("fila").agg(start=("start", "min"), end=("end", "max"))
+    bookings.loc[span.index, "hora"] = _format_minutes(span["start"]) + "+" + (span["end"] - span["start"]).astype(str)
+
+    duplicated = bookings.duplicated(DUPLICATE_KEY, keep=False)
+    duplicate_groups = (
+        bookings[duplicated].reset_index().groupby(DUPLICATE_KEY, sort=False)["fila"]
+        .agg(lambda filas: [int(fila) for fila in filas]).reset_index()
+    )
+
+    pairs = sweep_overlaps(intervals)
+    # Overlaps between copies of the same booking are already reported as duplicates
+    booking_key = pd.Series(bookings.groupby(DUPLICATE_KEY, sort=False).ngroup(), index=bookings.index)
+    conflicts = pairs[booking_key.loc[pairs["primera"]].to_numpy() != booking_key.loc[pairs["segunda"]].to_numpy()]
+    conflicts = conflicts.assign(
+        desde=_format_minutes(conflicts["start"]),
+        proveedor_a=bookings["Proveedor"].loc[conflicts["primera"]].to_numpy(),
+        proveedor_b=bookings["Proveedor"].loc[conflicts["segunda"]].to_numpy(),
+    )
+
+    return {
+        "rows": len(df),
+        "bookings_scanned": len(bookings),
+        "duplicate_groups": [
+            {"fecha": fecha, "hora": hora, "proveedor": proveedor, "orden_de_compra": orden, "filas": filas}
+            for fecha, hora, proveedor, orden, filas in duplicate_groups.itertuples(index=False, name=None)
+        ],
+        "conflicts": [
+            {"fecha": fecha, "anden": int(dock), "desde": desde, "slots": int(slots),
+             "filas": [int(primera), int(segunda)], "proveedores": [proveedor_a, proveedor_b]}
+            for primera, segunda, fecha, dock, slots, desde, proveedor_a, proveedor_b in conflicts[
+                ["primera", "segunda", "fecha", "dock", "slots", "desde", "proveedor_a", "proveedor_b"]
+            ].itertuples(index=False, name=None)
+        ],
+    }
+
+
+def _format_minutes(minutes):
+    return (minutes // 60).astype(str) + ":" + (minutes % 60).astype(str).str.zfill(2)
+
+
+def print_report(report, limit):
+    print(f"Scanned {report['bookings_scanned']} bookings ({report['rows']} rows) in {report['elapsed_seconds']} s")
+    duplicates = report["duplicate_groups"]
+    print(f"\nDuplicate groups: {len(duplicates)} ({sum(len(group['filas']) - 1 for group in duplicates)} extra rows)")
+    for group in duplicates[:limit]:
+        print(f"  {group['fecha']} {group['hora']:<28} {group['proveedor']:<20} {group['orden_de_compra']:<20} "
+              f"rows {', '.join(map(str, group['filas']))}")
+    conflicts = report["conflicts"]
+    print(f"\nOverlapping bookings: {len(conflicts)}")
+    for conflict in conflicts[:limit]:
+        print(f"  {conflict['fecha']} {conflict['desde']:>5} dock {conflict['anden']} "
+              f"rows {conflict['filas'][0]} ({conflict['proveedores'][0]}) / {conflict['filas'][1]} ({conflict['proveedores'][1]})")
+    if max(len(duplicates), len(conflicts)) > limit:
+        print(f"\n(showing the first {limit}; use --limit or --json for all)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find overlapping and duplicate reservations")
+    parser.add_argument("csv", nargs="?", help="CSV export of proveedor_reservas (default: read the live sheet)")
+    parser.add_argument("--docks", type=int, default=int(os.getenv("NUM_DOCKS", 1)), help="Receiving docks (NUM_DOCKS)")
+    parser.add_argument("--limit", type=int, default=20, help="Findings listed per section")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    df = load_csv_rows(args.csv) if args.csv else load_sheet_rows()
+    started = time.perf_counter()
+    report = scan(df, max(1, args.docks))
+    report["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report, args.limit)
+    sys.exit(1 if report["duplicate_groups"] or report["conflicts"] else 0)
+
+
+if __name__ == "__main__":
+    main()
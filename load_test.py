@@ -0,0 +1,269 @@
+"""
+Concurrent-supplier load test for the booking flow.
+
+Simulates many supplier sessions racing for the same morning slots. Each
+session runs the same steps as a confirmation in the app
+(``check_slot_availability()`` then ``save_booking_to_sheets_enhanced()``)
+against sheets_fake.FakeSheetsClient, so neither the real spreadsheet nor
+its API quota is touched:
+
+    python load_test.py --sessions 50 --hot-slots 3 --latency-ms 200 --error-rate 0.02
+    python load_test.py --sessions 20 --docks 2 --json reports/load_20.json
+
+The report covers throughput, p50/p99 confirmation latency, double bookings
+(two deliveries on the same dock and slot), lost writes (saves reported as
+successful whose row is no longer in the sheet) and API calls per booking.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from sheets_fake import FakeSheetsClient
+
+# Dummy mail settings so app.py can be imported outside of Streamlit
+IMPORT_ENV = {
+    "MAIL_API_URL": "http://localhost/mail",
+    "MAIL_API_TOKEN": "load-test",
+    "MAIL_FROM_EMAIL": "load-test@localhost",
+    "MAIL_FROM_NAME": "Load Test",
+    "GOOGLE_SHEET_NAME": "load-test",
+    "DISMAC_PREWARM": "0",
+}
+
+CREDENTIALS_HEADER = ["usuario", "password", "Email", "cc"]
+RESERVAS_HEADER = ["Fecha", "Hora", "Proveedor", "Numero_de_bultos", "Orden_de_compra", "Anden"]
+GESTION_HEADER = [
+    "Orden_de_compra", "Proveedor", "Numero_de_bultos",
+    "Hora_llegada", "Hora_inicio_atencion", "Hora_fin_atencion",
+    "Tiempo_espera", "Tiempo_atencion", "Tiempo_total", "Tiempo_retraso",
+    "numero_de_semana", "hora_de_reserva",
+]
+
+
+def load_app(args):
+    """Import app.py configured for the run (settings are read at import time)"""
+    os.environ.update({key: value for key, value in IMPORT_ENV.items() if key not in os.environ})
+    os.environ["NUM_DOCKS"] = str(args.docks)
+    os.environ["SHEETS_PROCESSING_WAIT_SECONDS"] = str(args.processing_wait)
+    os.environ["SHEETS_REQUESTS_PER_MINUTE"] = str(args.quota_per_minute or 10 ** 6)
+    os.environ.setdefault("LOG_DIR", "")
+
+    # Streamlit warns about every st.* call made outside a script run
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    import app
+    from booking_logging import LOGGER_NAME
+    if not args.verbose:
+        logging.getLogger(LOGGER_NAME).setLevel(logging.CRITICAL)
+    return app
+
+
+def next_weekday(start):
+    day = start + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+def build_fake(args):
+    fake = FakeSheetsClient(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    fake.seed_worksheet("proveedor_credencial", [CREDENTIALS_HEADER] + [
+        [supplier_name(i), "secret", f"proveedor{i}@localhost", ""] for i in range(args.sessions)
+    ])
+    fake.seed_worksheet("proveedor_reservas", [RESERVAS_HEADER])
+    fake.seed_worksheet("proveedor_gestion", [GESTION_HEADER])
+    return fake
+
+
+def supplier_name(index):
+    return f"Proveedor_{index:03d}"
+
+
+def run_session(app, index, target_date, hot_slots, rng, start_barrier):
+    """One simulated supplier: final availability check, then save (as in the confirmation)"""
+    slot = rng.choice(hot_slots)
+    numero_bultos = rng.choice([1, 2, 3, 5, 6, 9])
+    combined_hora, _, _ = app.get_duration_and_slots_info(numero_bultos, slot)
+    booking = {
+        "Fecha": target_date.strftime("%Y-%m-%d") + " 0:00:00",
+        "Hora": combined_hora,
+        "Proveedor": supplier_name(index),
+        "Numero_de_bultos": numero_bultos,
+        "Orden_de_compra": f"OC-LOAD-{index:05d}",
+    }
+
+    start_barrier.wait()
+    started = time.perf_counter()
+    available, _ = app.check_slot_availability(target_date, slot, numero_bultos)
+    if not available:
+        return {"outcome": "rejected_at_check", "latency": time.perf_counter() - started, "booking": booking}
+
+    saved, message = app.save_booking_to_sheets_enhanced(booking)
+    if saved:
+        outcome = "saved"
+    elif "already booked" in message:
+        outcome = "rejected_at_save"
+    else:
+        outcome = "failed"
+    return {"outcome": outcome, "latency": time.perf_counter() - started, "booking": booking}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)]
+
+
+def find_double_bookings(app, rows):
+    """Extra deliveries on an already taken (date, slot, dock)"""
+    header = rows[0]
+    column = {name: header.index(name) for name in ("Fecha", "Hora") if name in header}
+    dock_column = header.index("Anden") if "Anden" in header else None
+    taken = Counter()
+    for row in rows[1:]:
+        if not any(row):
+            continue
+        fecha = row[column["Fecha"]].split(" ")[0]
+        dock = app.parse_dock(row[dock_column] if dock_column is not None and dock_column < len(row) else None)
+        for slot in app.parse_booked_slots([row[column["Hora"]]]):
+            taken[(fecha, slot, dock)] += 1
+    return sum(count - 1 for count in taken.values() if count > 1)
+
+
+def run_load_test(app, args):
+    fake = build_fake(args)
+    app.use_sheets_client(fake)
+
+    target_date = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else next_weekday(date.today())
+    hot_slots = app.get_slots_for_date(target_date)[:args.hot_slots]
+    if not hot_slots:
+        raise SystemExit(f"No slots are offered on {target_date}")
+
+    start_barrier = threading.Barrier(args.sessions)
+    rng = random.Random(args.seed)
+    session_rngs = [random.Random(rng.random()) for _ in range(args.sessions)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions, thread_name_prefix="supplier") as pool:
+        futures = [
+            pool.submit(run_session, app, i, target_date, hot_slots, session_rngs[i], start_barrier)
+            for i in range(args.sessions)
+        ]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    rows = fake.rows("proveedor_reservas")
+    orders_in_sheet = {row[4] for row in rows[1:] if len(row) > 4}
+    outcomes = Counter(result["outcome"] for result in results)
+    saved = [result for result in results if result["outcome"] == "saved"]
+    confirmation_latencies = [result["latency"] for result in results if result["outcome"] != "rejected_at_check"]
+    quota = app.get_sheets_quota().snapshot()
+
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "sessions": args.sessions,
+            "date": target_date.isoformat(),
+            "hot_slots": hot_slots,
+            "docks": args.docks,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "processing_wait_seconds": args.processing_wait,
+            "quota_per_minute": args.quota_per_minute or None,
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "outcomes": dict(outcomes),
+        "throughput_bookings_per_minute": round(len(saved) / elapsed * 60, 2) if elapsed else None,
+        "confirmation_latency_seconds": {
+            "p50": _round(percentile(confirmation_latencies, 50)),
+            "p99": _round(percentile(confirmation_latencies, 99)),
+            "max": _round(max(confirmation_latencies, default=None)),
+        },
+        "double_bookings": find_double_bookings(app, rows),
+        "lost_writes": sum(1 for result in saved if result["booking"]["Orden_de_compra"] not in orders_in_sheet),
+        "rows_in_sheet": len(rows) - 1,
+        "api_calls": {
+            "total": fake.total_calls(),
+            "per_session": round(fake.total_calls() / args.sessions, 1),
+            "per_saved_booking": round(fake.total_calls() / len(saved), 1) if saved else None,
+            "injected_errors": sum(fake.errors.values()),
+            "by_method": dict(sorted(fake.calls.items())),
+        },
+        "quota_throttled_calls": sum(stats["throttled"] for stats in quota["operations"].values()),
+    }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def print_report(report):
+    config = report["config"]
+    print(f"{config['sessions']} sessions on {config['date']} racing for {', '.join(config['hot_slots'])} "
+          f"({config['docks']} dock(s), {config['latency_ms']}±{config['jitter_ms']} ms, "
+          f"{config['error_rate']:.0%} errors)")
+    print(f"Elapsed: {report['elapsed_seconds']} s")
+    print()
+    print("Outcomes: " + ", ".join(f"{name}={count}" for name, count in sorted(report["outcomes"].items())))
+    print(f"Throughput: {report['throughput_bookings_per_minute']} bookings/min")
+    latency = report["confirmation_latency_seconds"]
+    print(f"Confirmation latency (s): p50={latency['p50']}, p99={latency['p99']}, max={latency['max']}")
+    print()
+    print(f"Double bookings: {report['double_bookings']}")
+    print(f"Lost writes: {report['lost_writes']}")
+    print()
+    calls = report["api_calls"]
+    print(f"API calls: {calls['total']} total, {calls['per_session']} per session, "
+          f"{calls['per_saved_booking']} per saved booking ({calls['injected_errors']} injected errors)")
+    for method, count in calls["by_method"].items():
+        print(f"  {method:<20} {count:>6}")
+    if report["quota_throttled_calls"]:
+        print(f"Calls delayed by the quota budget: {report['quota_throttled_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the booking flow against a fake spreadsheet")
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent supplier sessions")
+    parser.add_argument("--hot-slots", type=int, default=3, help="Number of morning slots the sessions compete for")
+    parser.add_argument("--date", help="Booking date YYYY-MM-DD (default: next weekday)")
+    parser.add_argument("--docks", type=int, default=1, help="Receiving docks (NUM_DOCKS)")
+    parser.add_argument("--latency-ms", type=float, default=150, help="Mean latency of each fake API call")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="Uniform +/- jitter of the API latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability that an API call fails")
+    parser.add_argument("--processing-wait", type=float, default=0.5,
+                        help="Seconds between write and verification (the app waits 5)")
+    parser.add_argument("--quota-per-minute", type=int, default=0,
+                        help="Sheets budget per minute (default: unlimited)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for slots, bultos and injected errors")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the booking log while running")
+    args = parser.parse_args()
+
+    app = load_app(args)
+    report = run_load_test(app, args)
+    print_report(report)
+
+    if args.json_path:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n📝 Report saved to: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
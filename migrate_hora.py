@@ -0,0 +1,116 @@
+"""
+One-shot migration of Hora cells between the legacy and compact formats.
+
+Legacy cells list every 20-minute slot ("9:00:00, 9:20:00, 9:40:00"); compact
+cells hold the start and the duration in minutes ("9:00+60"). app.py reads both,
+so the migration can run while the app is up. Converts proveedor_reservas.Hora
+and proveedor_gestion.hora_de_reserva, each column with one range update:
+
+    python migrate_hora.py                  # dry run: what would change
+    python migrate_hora.py --apply
+    python migrate_hora.py --apply --to legacy
+
+Cells that cannot be converted (empty, non-consecutive slots) are left as they are.
+
+New bookings are written in HORA_FORMAT, 'legacy' by default so that older app
+instances, staff reading the sheet and other consumers keep understanding every
+row. Switch to compact in this order:
+
+    1. deploy the app version that reads both formats to every instance
+    2. python migrate_hora.py --apply
+    3. set HORA_FORMAT=compact and restart
+
+To go back, set HORA_FORMAT=legacy first, then run --apply --to legacy.
+"""
+import argparse
+import os
+
+# Dummy mail settings so app.py can be imported outside of Streamlit
+IMPORT_ENV = {
+    "MAIL_API_URL": "http://localhost/mail",
+    "MAIL_API_TOKEN": "migrate-hora",
+    "MAIL_FROM_EMAIL": "migrate@localhost",
+    "MAIL_FROM_NAME": "Migrate Hora",
+    "DISMAC_PREWARM": "0",
+}
+
+# (worksheet, column holding a Hora value)
+HORA_COLUMNS = [
+    ("proveedor_reservas", "Hora"),
+    ("proveedor_gestion", "hora_de_reserva"),
+]
+
+
+def column_letter(index):
+    """A1 column letters of a 0-based column index"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def convert_column(values, convert):
+    """New cell values plus the number of cells changed and skipped"""
+    converted, changed, skipped = [], 0, 0
+    for value in values:
+        new_value = convert(value) if value.strip() else value
+        if new_value is None:
+            new_value = value
+            skipped += 1
+        elif new_value != value:
+            changed += 1
+        converted.append(new_value)
+    return converted, changed, skipped
+
+
+def migrate_column(app, spreadsheet, title, header_name, target, apply):
+    worksheet = app.get_worksheet(spreadsheet, title, "migrate.worksheet")
+    rows = app.sheets_call("migrate.get_all_values", worksheet.get_all_values)
+    if not rows or header_name not in rows[0]:
+        print(f"{title}: no '{header_name}' column, skipped")
+        return
+    index = rows[0].index(header_name)
+    values = [row[index] if index < len(row) else "" for row in rows[1:]]
+    convert = app.compact_hora if target == "compact" else app.legacy_hora
+    converted, changed, skipped = convert_column(values, convert)
+
+    size_before = sum(len(value) for value in values)
+    size_after = sum(len(value) for value in converted)
+    print(f"{title}.{header_name}: {changed} of {len(values)} cells to convert, {skipped} left as they are, "
+          f"{size_before} -> {size_after} characters")
+    for old, new in [(old, new) for old, new in zip(values, converted) if old != new][:3]:
+        print(f"  {old!r} -> {new!r}")
+
+    if apply and changed:
+        letter = column_letter(index)
+        app.sheets_call(
+            "migrate.update",
+            worksheet.update,
+            range_name=f"{letter}2:{letter}{len(rows)}",
+            values=[[value] for value in converted],
+            value_input_option="RAW"
+        )
+        print(f"  written {letter}2:{letter}{len(rows)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert Hora cells between the legacy and compact formats")
+    parser.add_argument("--to", choices=["compact", "legacy"], default="compact", help="Target format")
+    parser.add_argument("--apply", action="store_true", help="Write the changes (default: dry run)")
+    args = parser.parse_args()
+
+    os.environ.update({key: value for key, value in IMPORT_ENV.items() if key not in os.environ})
+    import app
+    spreadsheet = app.open_spreadsheet(app.get_sheets_client(), "migrate.open_spreadsheet")
+    for title, header_name in HORA_COLUMNS:
+        migrate_column(app, spreadsheet, title, header_name, args.to, args.apply)
+    if not args.apply:
+        print("\nDry run: nothing was written (use --apply)")
+    elif app.HORA_FORMAT != args.to:
+        print(f"\nNote: HORA_FORMAT is '{app.HORA_FORMAT}', new bookings will still be written in that format")
+
+
+if __name__ == "__main__":
+    main()
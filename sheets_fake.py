@@ -0,0 +1,300 @@
+"""
+In-memory stand-in for the gspread client used by app.py.
+
+Implements just the calls the app makes (open, worksheet, add_worksheet,
+get_lastUpdateTime, get_all_records, get_all_values, get, update, batch_update)
+with configurable
+per-call latency and error rate, so load tests never touch the real
+spreadsheet or its API quota:
+
+    client = FakeSheetsClient(latency_ms=150, jitter_ms=100, error_rate=0.02)
+    client.seed_worksheet("proveedor_credencial", [["usuario", "password", "Email", "cc"]])
+    app.use_sheets_client(client)
+
+Every call is also logged with its worksheet and the bytes it returned, so
+tests can bound the Sheets round trips of a user flow:
+
+    with client.recording() as recorded:
+        app.authenticate_user("Proveedor_000", "secret")
+    assert recorded.total_calls <= 8
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+try:
+    from gspread.exceptions import WorksheetNotFound
+except ImportError:  # gspread not installed: keep the fake usable on its own
+    class WorksheetNotFound(Exception):
+        pass
+
+_CELL = re.compile(r"^([A-Z]+)(\d+)$")
+
+
+class FakeAPIError(Exception):
+    """Injected API failure; ``code`` mirrors gspread.exceptions.APIError.code"""
+
+    def __init__(self, operation, code):
+        super().__init__(f"Injected {code} error on {operation}")
+        self.code = code
+
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def _cell(reference):
+    """0-based (column, row) of an A1 cell reference"""
+    match = _CELL.match(reference)
+    if not match:
+        raise ValueError(f"Unsupported range: {reference}")
+    return _column_index(match.group(1)), int(match.group(2)) - 1
+
+
+def _payload_bytes(values):
+    """Size of a read's values as the Sheets API would send them (compact JSON)"""
+    return len(json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _numericise(value):
+    """Mimic gspread's default get_all_records() conversion of numeric strings"""
+    if isinstance(value, str) and value.strip():
+        for cast in (int, float):
+            try:
+                return cast(value)
+            except ValueError:
+                continue
+    return value
+
+
+class FakeWorksheet:
+    def __init__(self, client, title, rows=None):
+        self.client = client
+        self.title = title
+        self.rows = [list(row) for row in rows or []]
+
+    def get_all_values(self):
+        entry = self.client.api_call("get_all_values", self.title)
+        with self.client.lock:
+            width = max((len(row) for row in self.rows), default=0)
+            values = [row + [""] * (width - len(row)) for row in self.rows]
+        entry.bytes_read = _payload_bytes(values)
+        return values
+
+    def get_all_records(self):
+        entry = self.client.api_call("get_all_records", self.title)
+        with self.client.lock:
+            # gspread fetches the whole range and builds the records locally
+            entry.bytes_read = _payload_bytes(self.rows)
+            if not self.rows:
+                return []
+            header = self.rows[0]
+            return [
+                {name: _numericise(row[i]) if i < len(row) else "" for i, name in enumerate(header)}
+                for row in self.rows[1:]
+                if any(cell != "" for cell in row)
+            ]
+
+    @property
+    def row_count(self):
+        """Grid rows (gspread reads this from the worksheet metadata, no API call)"""
+        with self.client.lock:
+            return len(self.rows)
+
+    def get(self, range_name=None, **kwargs):
+        """Values of an 'A1:F500' range, trimmed like the API (no trailing empty rows or cells)"""
+        entry = self.client.api_call("get", self.title)
+        (first_col, first_row), (last_col, last_row) = (_cell(cell) for cell in range_name.split(":"))
+        with self.client.lock:
+            values = [row[first_col:last_col + 1] for row in self.rows[first_row:last_row + 1]]
+        values = [row[:max((i + 1 for i, cell in enumerate(row) if cell != ""), default=0)] for row in values]
+        while values and not values[-1]:
+            values.pop()
+        entry.bytes_read = _payload_bytes(values)
+        return values
+
+    def update(self, range_name=None, values=None, value_input_option=None, **kwargs):
+        self.client.api_call("update", self.title)
+        self._write(range_name, values)
+        return {"updatedRange": f"{self.title}!{range_name}"}
+
+    def batch_update(self, data, value_input_option=None, **kwargs):
+        """Several ranges in one API call: [{'range': 'A2:L2', 'values': [[...]]}, ...]"""
+        self.client.api_call("batch_update", self.title)
+        for entry in data:
+            self._write(entry["range"], entry["values"])
+        return {"totalUpdatedRanges": len(data)}
+
+    def _write(self, range_name, values):
+        first_col, first_row = _cell(range_name.split(":")[0])
+        with self.client.lock:
+            for offset, values_row in enumerate(values):
+                row_index = first_row + offset
+                while len(self.rows) <= row_index:
+                    self.rows.append([])
+                row = self.rows[row_index]
+                if len(row) < first_col + len(values_row):
+                    row.extend([""] * (first_col + len(values_row) - len(row)))
+                row[first_col:first_col + len(values_row)] = [str(value) for value in values_row]
+            self.client.touch()
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, title):
+        self.client = client
+        self.title = title
+        self.worksheets = {}
+
+    def worksheet(self, title):
+        self.client.api_call("worksheet", title)
+        with self.client.lock:
+            if title not in self.worksheets:
+                raise WorksheetNotFound(title)
+            return self.worksheets[title]
+
+    def add_worksheet(self, title, rows=100, cols=26, **kwargs):
+        self.client.api_call("add_worksheet", title)
+        with self.client.lock:
+            worksheet = self.worksheets.setdefault(title, FakeWorksheet(self.client, title))
+            self.client.touch()
+        return worksheet
+
+    def get_lastUpdateTime(self):
+        """Drive modifiedTime of the spreadsheet (RFC 3339, strictly increasing per change)"""
+        self.client.api_call("get_lastUpdateTime")
+        with self.client.lock:
+            return self.client.modified_time.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class CallLogEntry:
+    """One recorded API call: method, worksheet (if any) and bytes returned"""
+
+    __slots__ = ("operation", "worksheet", "bytes_read")
+
+    def __init__(self, operation, worksheet):
+        self.operation = operation
+        self.worksheet = worksheet
+        self.bytes_read = 0
+
+    def __repr__(self):
+        return f"<{self.operation} {self.worksheet or ''} {self.bytes_read}B>"
+
+
+class CallRecording:
+    """The calls logged by a client between the start and the end of ``recording()``"""
+
+    def __init__(self, client):
+        self.client = client
+        self.start = len(client.log)
+        self.end = None
+
+    @property
+    def entries(self):
+        with self.client.lock:
+            return self.client.log[self.start:self.end]
+
+    @property
+    def calls(self):
+        """Calls per method, e.g. {'get_all_values': 2, 'update': 1}"""
+        return Counter(entry.operation for entry in self.entries)
+
+    @property
+    def total_calls(self):
+        return len(self.entries)
+
+    @property
+    def bytes_read(self):
+        return sum(entry.bytes_read for entry in self.entries)
+
+    def reads_of(self, worksheet):
+        """Full reads (get_all_values/get_all_records) of one worksheet"""
+        return sum(1 for entry in self.entries
+                   if entry.worksheet == worksheet and entry.operation in ("get_all_values", "get_all_records"))
+
+    def summary(self):
+        return f"{self.total_calls} calls {dict(self.calls)}, {self.bytes_read} bytes read"
+
+
+class FakeSheetsClient:
+    """Thread-safe fake of ``gspread.Client`` holding a single spreadsheet.
+
+    Every API method sleeps ``latency_ms`` +/- ``jitter_ms`` and fails with
+    probability ``error_rate`` (a 429 for ``quota_error_share`` of the failures,
+    a 500 otherwise). Calls are counted per method in ``calls`` and logged in
+    order in ``log`` (see ``recording()``).
+    """
+
+    def __init__(self, title="fake", latency_ms=0, jitter_ms=0, error_rate=0.0, quota_error_share=0.5, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.quota_error_share = quota_error_share
+        self.lock = threading.RLock()
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.log = []
+        self.modified_time = datetime.now(timezone.utc)
+        self.spreadsheet = FakeSpreadsheet(self, title)
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def seed_worksheet(self, title, rows):
+        """Create or replace a worksheet without counting API calls"""
+        with self.lock:
+            self.spreadsheet.worksheets[title] = FakeWorksheet(self, title, rows)
+            self.touch()
+        return self.spreadsheet.worksheets[title]
+
+    def touch(self):
+        """Advance the spreadsheet's modifiedTime (at least 1 ms per change)"""
+        with self.lock:
+            self.modified_time = max(datetime.now(timezone.utc), self.modified_time + timedelta(milliseconds=1))
+
+    def rows(self, title):
+        """Current cell values of a worksheet, without counting API calls"""
+        with self.lock:
+            return [list(row) for row in self.spreadsheet.worksheets[title].rows]
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    @contextmanager
+    def recording(self):
+        """Record the API calls made inside the block (also those of other threads)"""
+        recorded = CallRecording(self)
+        try:
+            yield recorded
+        finally:
+            with self.lock:
+                recorded.end = len(self.log)
+
+    def api_call(self, operation, worksheet=None):
+        """Count and log one API call, then apply the configured latency and failure rate"""
+        with self._random_lock:
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            fails = self._random.random() < self.error_rate
+            code = 429 if self._random.random() < self.quota_error_share else 500
+        entry = CallLogEntry(operation, worksheet)
+        with self.lock:
+            self.calls[operation] += 1
+            self.log.append(entry)
+            if fails:
+                self.errors[operation] += 1
+        if delay:
+            time.sleep(delay)
+        if fails:
+            raise FakeAPIError(operation, code)
+        return entry
+
+    def open(self, title):
+        self.api_call("open")
+        return self.spreadsheet
@@ -0,0 +1,116 @@
+"""
+Import-time report for app.py cold starts.
+
+Runs ``python -X importtime -c "import app"`` in a clean interpreter, then
+measures each lazily imported dependency on its own, so startup latency can
+be tracked per release:
+
+    python startup_report.py --release v3.4 --json reports/startup_v3.4.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+# Dependencies app.py defers to first use (see _LazyModule in app.py)
+DEFERRED_MODULES = ["pandas", "gspread", "google.oauth2.service_account", "requests"]
+
+# Dummy mail settings so app.py can be imported outside of Streamlit
+IMPORT_ENV = {
+    "MAIL_API_URL": "http://localhost/mail",
+    "MAIL_API_TOKEN": "startup-report",
+    "MAIL_FROM_EMAIL": "startup@localhost",
+    "MAIL_FROM_NAME": "Startup Report",
+}
+
+
+def run_importtime(statement):
+    """Run a statement under -X importtime and return [(module, self_us, cumulative_us)]"""
+    env = dict(os.environ, **IMPORT_ENV)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"'{statement}' failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line.split("|", 2)
+            self_us = int(self_us.replace("import time:", "").strip())
+            rows.append((name, self_us, int(cumulative_us.strip())))
+        except ValueError:
+            continue
+    return rows
+
+
+def top_level_total(rows):
+    """Sum of cumulative time of the top-level (non-nested) imports"""
+    # Nested imports are indented by two extra spaces per level
+    return sum(cumulative for name, _, cumulative in rows if not name[1:].startswith(" "))
+
+
+def build_report(release, top):
+    """Collect the app import profile and the cost of each deferred dependency"""
+    app_rows = run_importtime("import app")
+    slowest = sorted(app_rows, key=lambda row: row[2], reverse=True)[:top]
+
+    deferred = {}
+    for module_name in DEFERRED_MODULES:
+        rows = run_importtime(f"import {module_name}")
+        deferred[module_name] = round(top_level_total(rows) / 1000, 1)
+
+    return {
+        "release": release,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "app_import_ms": round(top_level_total(app_rows) / 1000, 1),
+        "deferred_import_ms": deferred,
+        "slowest_imports": [
+            {"module": name.strip(), "self_ms": round(self_us / 1000, 1),
+             "cumulative_ms": round(cumulative_us / 1000, 1)}
+            for name, self_us, cumulative_us in slowest
+        ],
+    }
+
+
+def print_report(report):
+    print(f"Release: {report['release']}  (Python {report['python']})")
+    print(f"import app: {report['app_import_ms']} ms")
+    print()
+    print("Deferred to first use:")
+    for module_name, ms in report["deferred_import_ms"].items():
+        print(f"  {module_name:<35} {ms:>8} ms")
+    print()
+    print("Slowest imports while loading app.py (cumulative):")
+    for row in report["slowest_imports"]:
+        print(f"  {row['module']:<35} {row['cumulative_ms']:>8} ms  (self {row['self_ms']} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report app.py cold-start import times")
+    parser.add_argument("--release", default="dev", help="Release label stored in the report")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = build_report(args.release, args.top)
+    print_report(report)
+
+    if args.json_path:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n📝 Report saved to: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Hora cells in the legacy ("9:00:00, 9:20:00") and compact ("9:00+40") formats.
+
+Both formats must read as the same intervals, convert into each other without
+loss, and migrate_hora.py must rewrite only the cells it can convert:
+
+    python -m pytest -q test_hora_format.py
+"""
+import pytest
+
+import load_test
+import migrate_hora
+from sheets_fake import FakeSheetsClient
+
+RESERVAS = "proveedor_reservas"
+
+# (legacy cell, compact cell, intervals) for 1, 2 and 3 slots
+HORAS = [
+    ("9:00:00", "9:00+20", [(540, 20)]),
+    ("9:00:00, 9:20:00", "9:00+40", [(540, 40)]),
+    ("15:20:00, 15:40:00, 16:00:00", "15:20+60", [(920, 60)]),
+]
+
+BAD_HORAS = ["9:00+", "abc", "+20", "9:00+abc", ""]
+
+
+@pytest.mark.parametrize("legacy, compact, intervals", HORAS)
+def test_legacy_and_compact_round_trip(app, legacy, compact, intervals):
+    assert app.compact_hora(legacy) == compact
+    assert app.legacy_hora(compact) == legacy
+    assert app.compact_hora(app.legacy_hora(compact)) == compact
+
+
+@pytest.mark.parametrize("legacy, compact, intervals", HORAS)
+def test_both_formats_read_as_the_same_intervals(app, legacy, compact, intervals):
+    assert app.booking_intervals(legacy) == intervals
+    assert app.booking_intervals(compact) == intervals
+
+
+@pytest.mark.parametrize("numero_bultos, legacy, compact", [
+    (1, "9:00:00", "9:00+20"),
+    (5, "9:00:00, 9:20:00", "9:00+40"),
+    (9, "9:00:00, 9:20:00, 9:40:00", "9:00+60"),
+])
+def test_new_bookings_follow_hora_format(app, monkeypatch, numero_bultos, legacy, compact):
+    monkeypatch.setattr(app, "HORA_FORMAT", "legacy")
+    assert app.get_duration_and_slots_info(numero_bultos, "9:00")[0] == legacy
+    monkeypatch.setattr(app, "HORA_FORMAT", "compact")
+    assert app.get_duration_and_slots_info(numero_bultos, "9:00")[0] == compact
+
+
+def test_parse_compact_hora(app):
+    assert app.parse_compact_hora("9:00+60") == (540, 60)
+    assert app.parse_compact_hora(" 9:00:00 + 20 ") == (540, 20)
+    assert app.parse_compact_hora("9:00:00, 9:20:00") is None
+    assert app.compact_hora(" 9:00:00 + 20 ") == "9:00+20"
+
+
+@pytest.mark.parametrize("hora", BAD_HORAS)
+def test_bad_hora_is_not_converted(app, hora):
+    assert app.parse_compact_hora(hora) is None
+    assert app.compact_hora(hora) is None
+    assert app.legacy_hora(hora) == hora
+    assert app.booking_intervals(hora) == []
+
+
+def test_non_consecutive_slots_stay_legacy(app):
+    assert app.compact_hora("9:00:00, 9:40:00") is None
+
+
+def seeded_reservas(horas):
+    client = FakeSheetsClient()
+    client.seed_worksheet(RESERVAS, [load_test.RESERVAS_HEADER] + [
+        ["2025-07-14 0:00:00", hora, load_test.supplier_name(i), "2", f"OC-{i}", "1"] for i, hora in enumerate(horas)
+    ])
+    return client
+
+
+MIGRATED_COLUMN = [
+    ("9:00:00", "9:00+20"),
+    ("10:00:00, 10:20:00", "10:00+40"),
+    ("11:00+60", "11:00+60"),
+    ("9:00:00, 9:40:00", "9:00:00, 9:40:00"),
+    ("", ""),
+]
+
+
+def test_convert_column(app):
+    values = [old for old, _ in MIGRATED_COLUMN]
+    converted, changed, skipped = migrate_hora.convert_column(values, app.compact_hora)
+    assert converted == [new for _, new in MIGRATED_COLUMN]
+    assert (changed, skipped) == (2, 1)
+
+
+def test_migration_dry_run_writes_nothing(app, capsys):
+    client = seeded_reservas([old for old, _ in MIGRATED_COLUMN])
+    before = client.rows(RESERVAS)
+    with client.recording() as recorded:
+        migrate_hora.migrate_column(app, client.spreadsheet, RESERVAS, "Hora", "compact", apply=False)
+    assert client.rows(RESERVAS) == before
+    assert recorded.calls["update"] == 0
+    output = capsys.readouterr().out
+    assert "2 of 5 cells to convert, 1 left as they are" in output
+    assert "'10:00:00, 10:20:00' -> '10:00+40'" in output
+
+
+def test_migration_apply_rewrites_the_column(app):
+    client = seeded_reservas([old for old, _ in MIGRATED_COLUMN])
+    migrate_hora.migrate_column(app, client.spreadsheet, RESERVAS, "Hora", "compact", apply=True)
+    assert [row[1] for row in client.rows(RESERVAS)[1:]] == [new for _, new in MIGRATED_COLUMN]
+
+
+def test_migration_back_to_legacy(app):
+    client = seeded_reservas([new for _, new in MIGRATED_COLUMN])
+    migrate_hora.migrate_column(app, client.spreadsheet, RESERVAS, "Hora", "legacy", apply=True)
+    assert [row[1] for row in client.rows(RESERVAS)[1:]] == [
+        "9:00:00", "10:00:00, 10:20:00", "11:00:00, 11:20:00, 11:40:00", "9:00:00, 9:40:00", ""
+    ]
@@ -0,0 +1,103 @@
+"""
+The per-dock interval index that decides whether a booking can be written.
+
+DayIntervals answers "does [start, start + duration) overlap anything on this
+dock" with a bisect over the starts and the running maximum end; these cases
+pin down the edges and compare it with a brute-force check:
+
+    python -m pytest -q test_interval_index.py
+"""
+import random
+
+import pytest
+
+import load_test
+
+
+def day_with(app, *bookings):
+    """DayIntervals holding (dock, start, duration) bookings"""
+    day = app.DayIntervals()
+    for dock, start, duration in bookings:
+        day.add(dock, start, duration)
+    return day
+
+
+def minutes(hhmm):
+    hours, mins = hhmm.split(":")
+    return int(hours) * 60 + int(mins)
+
+
+def test_touching_intervals_do_not_conflict(app):
+    day = day_with(app, (1, minutes("9:00"), 20))
+    assert not day.overlaps(1, minutes("9:20"), 20)
+    assert not day.overlaps(1, minutes("8:40"), 20)
+    assert day.overlaps(1, minutes("9:00"), 20)
+
+
+@pytest.mark.parametrize("start, duration, expected", [
+    ("9:20", 20, True),    # nested in the existing booking
+    ("8:40", 120, True),   # contains it
+    ("8:40", 40, True),    # overlaps its start
+    ("9:40", 40, True),    # overlaps its end
+    ("8:00", 60, False),
+    ("10:00", 20, False),
+])
+def test_nested_and_overlapping_intervals(app, start, duration, expected):
+    day = day_with(app, (1, minutes("9:00"), 60))
+    assert day.overlaps(1, minutes(start), duration) is expected
+
+
+def test_long_booking_covers_later_short_ones(app):
+    # 9:00-11:00 plus short bookings starting after it: the latest start before
+    # 10:20 ends at 9:40, so only the running maximum end shows the conflict
+    day = day_with(app, (1, minutes("9:00"), 120), (1, minutes("9:20"), 20), (1, minutes("9:40"), 20))
+    assert day.overlaps(1, minutes("10:20"), 20)
+    assert not day.overlaps(1, minutes("11:00"), 20)
+
+
+def test_long_booking_added_after_short_ones(app):
+    day = day_with(app, (1, minutes("9:40"), 20), (1, minutes("10:20"), 20), (1, minutes("9:00"), 120))
+    assert day.overlaps(1, minutes("10:40"), 20)
+    assert not day.overlaps(1, minutes("11:00"), 20)
+
+
+def test_docks_are_kept_separate(app, monkeypatch):
+    monkeypatch.setattr(app, "NUM_DOCKS", 2)
+    day = day_with(app, (1, minutes("9:00"), 60))
+    window = [(minutes("9:20"), 20)]
+    assert not day.is_free(1, window)
+    assert day.is_free(2, window)
+    assert day.free_dock(window) == 2
+    day.add_booking(2, window)
+    assert day.free_dock(window) is None
+    assert day.free_dock([(minutes("10:00"), 20)]) == 1
+
+
+def test_index_from_sheet_values(app, monkeypatch):
+    monkeypatch.setattr(app, "NUM_DOCKS", 2)
+    all_values = [load_test.RESERVAS_HEADER] + [
+        ["2025-07-14 0:00:00", "9:00:00, 9:20:00", "P1", "2", "OC-1", "1"],
+        ["2025-07-14 0:00:00", "9:00+60", "P2", "5", "OC-2", "2"],
+        ["2025-07-14 0:00:00", "10:00+20", "P3", "1", "OC-3", ""],  # before docks: dock 1
+        ["2025-07-15 0:00:00", "9:00+20", "P4", "1", "OC-4", "1"],
+    ]
+    index = app.interval_index_from_values(all_values, {"2025-07-14"})
+    assert set(index) == {"2025-07-14"}
+    day = index["2025-07-14"]
+    assert not day.is_free(1, [(minutes("9:20"), 20)])
+    assert day.is_free(1, [(minutes("9:40"), 20)])
+    assert not day.is_free(2, [(minutes("9:40"), 20)])
+    assert not day.is_free(1, [(minutes("10:00"), 20)])
+    assert day.is_free(2, [(minutes("10:00"), 20)])
+
+
+def test_matches_brute_force(app):
+    rng = random.Random(7)
+    for _ in range(200):
+        bookings = [(rng.randint(1, 2), rng.randrange(480, 960, 20), rng.choice([20, 40, 60, 120]))
+                    for _ in range(rng.randint(0, 12))]
+        day = day_with(app, *bookings)
+        for _ in range(20):
+            dock, start, duration = rng.randint(1, 2), rng.randrange(460, 980, 20), rng.choice([20, 40, 60])
+            expected = any(d == dock and s < start + duration and start < s + length for d, s, length in bookings)
+            assert day.overlaps(dock, start, duration) is expected, (bookings, dock, start, duration)
@@ -1,35 +1,138 @@
+"""
+Booking log output: JSON lines, booking context, queue overflow and rotation.
+
+Each test configures the booking logger against its own temporary log
+directory and restores the process-wide setup afterwards:
+
+    python -m pytest -q test_logging.py
+"""
+import atexit
+import gzip
+import json
 import logging
-import time
-from datetime import datetime
 import os
+import time
+
+import pytest
+
+import booking_logging
+from booking_logging import (
+    ACTIVE_LOG_NAME, CompressingRotatingFileHandler, JsonLineFormatter, booking_context, dropped_record_count,
+    setup_booking_logging,
+)
+
+
+@pytest.fixture
+def configure(tmp_path, monkeypatch):
+    """setup_booking_logging() as on a fresh process, writing under tmp_path"""
+    logger = logging.getLogger(booking_logging.LOGGER_NAME)
+    handlers, level, propagate = logger.handlers[:], logger.level, logger.propagate
+    monkeypatch.setattr(booking_logging, "_listener", None)
+    logger.handlers = []
+
+    def configure(**kwargs):
+        return setup_booking_logging(log_dir=str(tmp_path), console=False, **kwargs)
+
+    yield configure
+    if booking_logging._listener is not None:
+        stop_listener()
+    logger.handlers, logger.level, logger.propagate = handlers, level, propagate
+
+
+def stop_listener():
+    """Drain the queue into the handlers, then stop the listener thread and close the files"""
+    listener = booking_logging._listener
+    listener.stop()
+    atexit.unregister(listener.stop)
+    for handler in listener.handlers:
+        handler.close()
+    booking_logging._listener = None
+
+
+def written_records(log_dir):
+    """Everything logged so far, parsed from the active log file"""
+    stop_listener()
+    with open(os.path.join(log_dir, ACTIVE_LOG_NAME), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_are_json_lines_with_booking_context(configure, tmp_path):
+    logger = configure()
+    booking_id = "TEST_2025-01-01 0:00:00_9:00:00"
+    with booking_context(booking_id=booking_id, supplier="TEST"):
+        logger.info("%s: %s", "SAVE_START", f"Booking ID: {booking_id}",
+                    extra={"action": "SAVE_START", "details": f"Booking ID: {booking_id}", "success": True})
+    logger.warning("⚠️ fuera de una reserva")
+
+    first, second = written_records(tmp_path)
+    assert first["level"] == "INFO"
+    assert first["message"] == f"SAVE_START: Booking ID: {booking_id}"
+    assert (first["action"], first["success"]) == ("SAVE_START", True)
+    assert (first["booking_id"], first["supplier"]) == (booking_id, "TEST")
+    assert second["message"] == "⚠️ fuera de una reserva"
+    assert "booking_id" not in second and "supplier" not in second
+
+
+def test_exceptions_are_logged(configure, tmp_path):
+    logger = configure()
+    try:
+        raise RuntimeError("sheet unavailable")
+    except RuntimeError:
+        logger.exception("SAVE_FAILED")
+
+    (record,) = written_records(tmp_path)
+    assert record["level"] == "ERROR"
+    assert "RuntimeError: sheet unavailable" in record["exception"]
+
+
+def test_setup_runs_once_per_process(configure):
+    logger = configure()
+    handlers = logger.handlers[:]
+    assert configure() is logger
+    assert logger.handlers == handlers
+
+
+def test_full_queue_drops_records_instead_of_blocking(configure):
+    logger = configure(queue_size=1)
+    # Nothing drains the queue any more: the first record fills it
+    stop_listener()
+    started = time.perf_counter()
+    for i in range(5):
+        logger.info("record %d", i)
+    assert time.perf_counter() - started < 1
+    assert dropped_record_count() == 4
+
+
+def emit(handler, count, message="x" * 200):
+    for _ in range(count):
+        handler.handle(logging.makeLogRecord({"msg": message, "levelname": "INFO", "levelno": logging.INFO}))
+
+
+def test_size_rotation_compresses_and_prunes(tmp_path):
+    handler = CompressingRotatingFileHandler(str(tmp_path / ACTIVE_LOG_NAME), max_bytes=1000, backup_count=2)
+    handler.setFormatter(JsonLineFormatter())
+    try:
+        emit(handler, 40)
+    finally:
+        handler.close()
+
+    rotated = sorted(tmp_path.glob("booking_*.log.gz"))
+    assert len(rotated) == 2
+    with gzip.open(rotated[-1], "rt", encoding="utf-8") as f:
+        assert all(json.loads(line)["message"] == "x" * 200 for line in f)
+    assert os.path.getsize(tmp_path / ACTIVE_LOG_NAME) <= 1000 + 300
+
+
+def test_age_rotation(tmp_path):
+    handler = CompressingRotatingFileHandler(str(tmp_path / ACTIVE_LOG_NAME), max_bytes=0, max_age_seconds=3600)
+    handler.setFormatter(JsonLineFormatter())
+    try:
+        emit(handler, 1)
+        handler.rollover_at = time.time() - 1
+        emit(handler, 1)
+    finally:
+        handler.close()
 
-def setup_file_logging():
-    if not os.path.exists("logs"):
-        os.makedirs("logs")
-        print("📁 Created logs folder")
-    
-    log_filename = f"logs/booking_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_filename, encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
-    
-    logger = logging.getLogger(__name__)
-    logger.info(f"📝 Logging started - saving to: {log_filename}")
-    
-    return logger
-
-# Test the logging
-logger = setup_file_logging()
-logger.info("🧪 Testing logging setup...")
-logger.info("📝 This should appear in both terminal and log file")
-logger.warning("⚠️ This is a warning message")
-logger.error("❌ This is an error message")
-logger.info("✅ Logging test completed")
-
-print("✅ Test completed! Check logs folder for the log file.")
\ No newline at end of file
+    assert len(list(tmp_path.glob("booking_*.log.gz"))) == 1
+    with open(tmp_path / ACTIVE_LOG_NAME, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
@@ -0,0 +1,178 @@
+"""
+Sheets API budget per user flow, measured on the recording fake.
+
+Performance regressions in this app show up as extra Sheets round trips
+(another get_all_values() in a loop) long before they show up as CPU time.
+Each flow runs against sheets_fake.FakeSheetsClient and must stay within its
+budget of API calls and full worksheet reads; bytes read are bounded by those
+reads. Raise a budget only together with the change that needs it:
+
+    python -m pytest -q test_sheets_api_calls.py
+"""
+from datetime import date, timedelta
+
+import pytest
+
+import load_test
+from sheets_fake import FakeSheetsClient
+
+RESERVAS = "proveedor_reservas"
+CREDENCIALES = "proveedor_credencial"
+GESTION = "proveedor_gestion"
+
+# Flow -> (max API calls, max full reads per worksheet)
+FLOW_BUDGETS = {
+    # open + revision check + 3 x (worksheet + get_all_records)
+    "login": (8, {CREDENCIALES: 1, RESERVAS: 1, GESTION: 1}),
+    # Another session on the same snapshot
+    "login_warm": (0, {}),
+    # Cache expired on every rerun, sheet unchanged: only the revision check
+    "browse_dates": (7, {}),
+    # Final check + save: row count, write-time conflict check, verification
+    "confirm_booking": (9, {RESERVAS: 3}),
+    # Another supplier wrote meanwhile: the check downloads the spreadsheet once more
+    "confirm_after_foreign_write": (12, {CREDENCIALES: 1, RESERVAS: 4, GESTION: 1}),
+    "verify": (2, {RESERVAS: 1}),
+}
+
+SUPPLIERS = 50
+RESERVATIONS = 600
+
+
+@pytest.fixture
+def client(app):
+    """Seeded fake spreadsheet with cold caches"""
+    today = date.today()
+    client = FakeSheetsClient()
+    client.seed_worksheet(CREDENCIALES, [load_test.CREDENTIALS_HEADER] + [
+        [load_test.supplier_name(i), "secret", f"proveedor{i}@localhost", ""] for i in range(SUPPLIERS)
+    ])
+    client.seed_worksheet(RESERVAS, [load_test.RESERVAS_HEADER] + [
+        [f"{today + timedelta(days=i % 21)} 0:00:00", f"{8 + i % 8}:00+20",
+         load_test.supplier_name(i % SUPPLIERS), "2", f"OC-{i:05d}", "1"]
+        for i in range(RESERVATIONS)
+    ])
+    client.seed_worksheet(GESTION, [load_test.GESTION_HEADER, ["OC-00000", load_test.supplier_name(0), "2"] + [""] * 9])
+    app.use_sheets_client(client)
+    app.get_sheet_snapshots.clear()
+    app.download_sheets_to_memory.clear()
+    yield client
+    app.use_sheets_client(None)
+    app.get_sheet_snapshots.clear()
+    app.download_sheets_to_memory.clear()
+
+
+def sheet_bytes(client, title):
+    """Bytes of one full read of a worksheet, as it is now"""
+    with client.recording() as recorded:
+        client.spreadsheet.worksheets[title].get_all_values()
+    return recorded.bytes_read
+
+
+def assert_within_budget(client, recorded, flow):
+    max_calls, max_reads = FLOW_BUDGETS[flow]
+    assert recorded.total_calls <= max_calls, f"{flow}: {recorded.summary()}"
+    for title in (CREDENCIALES, RESERVAS, GESTION):
+        reads = recorded.reads_of(title)
+        assert reads <= max_reads.get(title, 0), f"{flow}: {reads} reads of {title}; {recorded.summary()}"
+    max_bytes = sum(reads * sheet_bytes(client, title) for title, reads in max_reads.items())
+    assert recorded.bytes_read <= max_bytes, f"{flow}: {recorded.summary()}, budget {max_bytes} bytes"
+
+
+def booking_for(app, selected_date, slot, numero_bultos, supplier_index=1):
+    combined_hora, _, _ = app.get_duration_and_slots_info(numero_bultos, slot)
+    return {
+        "Fecha": f"{selected_date} 0:00:00",
+        "Hora": combined_hora,
+        "Proveedor": load_test.supplier_name(supplier_index),
+        "Numero_de_bultos": numero_bultos,
+        "Orden_de_compra": f"OC-TEST-{supplier_index}",
+    }
+
+
+def free_slot(app, selected_date, numero_bultos):
+    _, reservas_df, _ = app.download_sheets_to_memory()
+    return next(slot for slot, available in app.get_display_slots(reservas_df, selected_date, numero_bultos) if available)
+
+
+def test_login(app, client):
+    with client.recording() as recorded:
+        authenticated, message, _, _ = app.authenticate_user(load_test.supplier_name(3), "secret")
+    assert authenticated, message
+    assert_within_budget(client, recorded, "login")
+
+
+def test_second_login_reuses_snapshot(app, client):
+    app.authenticate_user(load_test.supplier_name(3), "secret")
+    with client.recording() as recorded:
+        authenticated, message, _, _ = app.authenticate_user(load_test.supplier_name(4), "secret")
+    assert authenticated, message
+    assert_within_budget(client, recorded, "login_warm")
+
+
+def test_browse_dates(app, client):
+    app.authenticate_user(load_test.supplier_name(3), "secret")
+    first_day = date.today() + timedelta(days=1)
+    with client.recording() as recorded:
+        for offset in range(7):
+            # Each rerun after the cache TTL: reload, then render the date's grid
+            app.download_sheets_to_memory.clear()
+            _, reservas_df, _ = app.download_sheets_to_memory()
+            app.get_display_slots(reservas_df, first_day + timedelta(days=offset), 5)
+    assert recorded.calls.keys() <= {"get_lastUpdateTime"}, recorded.summary()
+    assert_within_budget(client, recorded, "browse_dates")
+
+
+def test_confirm_booking(app, client):
+    selected_date = date.today() + timedelta(days=2)
+    slot = free_slot(app, selected_date, 5)
+    booking = booking_for(app, selected_date, slot, 5)
+    errors = []
+    with client.recording() as recorded:
+        available, message = app.check_slot_availability(selected_date, slot, 5)
+        assert available, message
+        saved, message = app.save_booking_to_sheets_enhanced(booking, notify_error=errors.append)
+    assert saved, (message, errors)
+    assert recorded.calls["update"] == 1, recorded.summary()
+    assert_within_budget(client, recorded, "confirm_booking")
+
+
+def test_final_check_redownloads_aged_snapshot(app, client, monkeypatch):
+    selected_date = date.today() + timedelta(days=2)
+    slot = free_slot(app, selected_date, 5)
+    # Revision unchanged, but the snapshot is older than a forced check accepts
+    monkeypatch.setattr(app, "FRESH_SNAPSHOT_MAX_AGE_SECONDS", 0)
+    with client.recording() as recorded:
+        available, message = app.check_slot_availability(selected_date, slot, 5)
+    assert available, message
+    assert recorded.reads_of(RESERVAS) == 1, recorded.summary()
+
+
+def test_confirm_booking_after_foreign_write(app, client):
+    selected_date = date.today() + timedelta(days=2)
+    slot = free_slot(app, selected_date, 5)
+    # Another supplier books elsewhere on the same day, outside this process
+    client.spreadsheet.worksheets[RESERVAS].update(
+        range_name=f"A{RESERVATIONS + 2}:F{RESERVATIONS + 2}",
+        values=[[f"{selected_date} 0:00:00", "17:00+20", load_test.supplier_name(9), "1", "OC-OTHER", "1"]],
+    )
+    booking = booking_for(app, selected_date, slot, 5)
+    errors = []
+    with client.recording() as recorded:
+        available, message = app.check_slot_availability(selected_date, slot, 5)
+        assert available, message
+        saved, message = app.save_booking_to_sheets_enhanced(booking, notify_error=errors.append)
+    assert saved, (message, errors)
+    assert_within_budget(client, recorded, "confirm_after_foreign_write")
+
+
+def test_verify_booking_saved(app, client):
+    selected_date = date.today() + timedelta(days=2)
+    booking = booking_for(app, selected_date, free_slot(app, selected_date, 1), 1)
+    saved, message = app.save_booking_to_sheets_enhanced(booking, notify_error=lambda text: None)
+    assert saved, message
+    spreadsheet = client.spreadsheet
+    with client.recording() as recorded:
+        verified, message = app.verify_booking_saved(spreadsheet, booking)
+    assert verified, message
+    assert_within_budget(client, recorded, "verify")